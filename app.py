@@ -1,297 +1,195 @@
 import os
+import time
+import uuid
 import streamlit as st
-from typing import Dict, List, Any
-import json
-from openai import OpenAI
+from typing import Dict, Any, Iterator
 from dotenv import load_dotenv
-import pandas as pd
-import matplotlib.pyplot as plt
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from health_assistant import HealthAssistant, DEFAULT_BASE_URL, HOUSEHOLD_MAX_MEMBERS, plan_version
+from plan_cache import PlanCache
+from plan_library import PlanLibrary, LOCATIONS, DIET_TYPES, GOALS, BUDGETS
+from semantic_cache import SemanticCache
+from chat_history import ChatHistory
+from session_store import SessionStore
+from charts import render_macro_chart, chart_html, MACRO_CHART_FORMAT
+import metrics
 
 # Load environment variables
 load_dotenv()
 
 # Get API key from environment variable with a default message
 API_KEY = os.getenv('API_KEY')
-BASE_URL = os.getenv('BASE_URL', 'https://api.aimlapi.com/v1')
-
-# Initialize session state
-if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
-
-class HealthAssistant:
-    def __init__(self):
-        self.client = OpenAI(
-            base_url=BASE_URL,
-            api_key=API_KEY
-        )
-        self.nutrition_db = self._load_nutrition_db()
-        self.regional_foods = self._load_regional_foods()
-        
-    def _load_nutrition_db(self) -> Dict:
-        """Load comprehensive nutrition database"""
-        return {
-            "global_foods": {
-                "chicken_breast": {"protein": 31, "carbs": 0, "fat": 3.6, "fiber": 0, "calories": 165, "cost": "medium"},
-                "salmon": {"protein": 20, "carbs": 0, "fat": 13, "fiber": 0, "calories": 208, "cost": "high"},
-                "tofu": {"protein": 8, "carbs": 2, "fat": 4, "fiber": 0.3, "calories": 76, "cost": "low"},
-                "brown_rice": {"protein": 2.6, "carbs": 23, "fat": 0.9, "fiber": 1.8, "calories": 112, "cost": "low"},
-                "quinoa": {"protein": 4.4, "carbs": 21.3, "fat": 1.9, "fiber": 2.8, "calories": 120, "cost": "medium"},
-                "sweet_potato": {"protein": 1.6, "carbs": 20.1, "fat": 0.1, "fiber": 3, "calories": 86, "cost": "low"},
-                "spinach": {"protein": 2.9, "carbs": 3.6, "fat": 0.4, "fiber": 2.2, "calories": 23, "cost": "low"},
-                "chickpeas": {"protein": 8.9, "carbs": 27.4, "fat": 2.6, "fiber": 7.6, "calories": 164, "cost": "low"},
-                "eggs": {"protein": 12.6, "carbs": 0.7, "fat": 9.5, "fiber": 0, "calories": 143, "cost": "low"},
-                "greek_yogurt": {"protein": 10, "carbs": 3.6, "fat": 0.4, "fiber": 0, "calories": 59, "cost": "medium"},
-                "avocado": {"protein": 2, "carbs": 8.5, "fat": 15, "fiber": 6.7, "calories": 160, "cost": "medium"},
-                "almonds": {"protein": 21.2, "carbs": 21.7, "fat": 49.4, "fiber": 12.2, "calories": 579, "cost": "medium"},
-                "oats": {"protein": 13.2, "carbs": 67.7, "fat": 6.9, "fiber": 10.1, "calories": 381, "cost": "low"},
-                "banana": {"protein": 1.1, "carbs": 22.8, "fat": 0.3, "fiber": 2.6, "calories": 89, "cost": "low"},
-                "beef": {"protein": 26.1, "carbs": 0, "fat": 11.8, "fiber": 0, "calories": 217, "cost": "high"},
-                "lentils": {"protein": 9, "carbs": 20, "fat": 0.4, "fiber": 7.9, "calories": 116, "cost": "low"},
-            },
-            "nutrition_goals": {
-                "weight_loss": {"protein": 30, "carbs": 40, "fat": 30, "calories_modifier": -300},
-                "muscle_gain": {"protein": 40, "carbs": 40, "fat": 20, "calories_modifier": 300},
-                "maintenance": {"protein": 30, "carbs": 45, "fat": 25, "calories_modifier": 0},
-                "heart_health": {"protein": 25, "carbs": 50, "fat": 25, "focus": "omega3"},
-                "diabetes_management": {"protein": 30, "carbs": 35, "fat": 35, "focus": "low_GI"},
-                "anti_aging": {"protein": 30, "carbs": 40, "fat": 30, "focus": "antioxidants"},
-                "athletic_performance": {"protein": 35, "carbs": 55, "fat": 10, "focus": "complex_carbs"},
-            },
-            "medical_considerations": {
-                "diabetes": {"avoid": ["refined_sugar", "white_bread"], "prefer": ["low_GI_foods"]},
-                "hypertension": {"avoid": ["excess_sodium"], "prefer": ["potassium_rich_foods"]},
-                "celiac": {"avoid": ["gluten"], "prefer": ["gluten_free_grains"]},
-                "lactose_intolerance": {"avoid": ["dairy"], "prefer": ["plant_based_alternatives"]},
-                "gout": {"avoid": ["red_meat", "seafood"], "prefer": ["plant_proteins"]},
-                "ibs": {"avoid": ["trigger_foods"], "prefer": ["fodmap_friendly_foods"]}
-            }
-        }
-    
-    def _load_regional_foods(self) -> Dict:
-        """Load regional food availability database"""
-        return {
-            "North America": ["chicken_breast", "beef", "salmon", "sweet_potato", "kale", "quinoa", "almonds"],
-            "South America": ["beans", "corn", "quinoa", "plantains", "cassava", "beef"],
-            "Europe": ["chicken", "pork", "potatoes", "dairy", "rye_bread", "olive_oil"],
-            "East Asia": ["rice", "tofu", "fish", "bok_choy", "seaweed", "mushrooms"],
-            "South Asia": ["lentils", "rice", "chickpeas", "spinach", "yogurt", "chicken"],
-            "Middle East": ["chickpeas", "lamb", "bulgur", "dates", "olive_oil", "yogurt"],
-            "Africa": ["cassava", "plantains", "beans", "fish", "millet", "peanuts"],
-            "Australia/Oceania": ["beef", "lamb", "fish", "sweet_potato", "macadamia_nuts"]
-        }
-
-    def diet_chatbot(self, message: str) -> str:
-        """Interactive diet planning chatbot"""
-        st.session_state.chat_history.append({"role": "user", "content": message})
-        
-        try:
-            response = self.client.chat.completions.create(
-                model="o1",
-                messages=[
-                    {"role": "system", "content": """You are a nutrition expert chatbot. Provide:
-                    - Personalized meal advice considering location, medical conditions, and taste preferences
-                    - Nutritional facts and calculations
-        - Budget-friendly options
-                    - Cultural food considerations
-                    Be specific, helpful, and consider the user's region when suggesting foods."""},
-                    *[{"role": msg["role"], "content": msg["content"]} 
-                      for msg in st.session_state.chat_history[-6:]]
-                ]
-            )
-            bot_message = response.choices[0].message.content
-            st.session_state.chat_history.append({"role": "assistant", "content": bot_message})
-            return bot_message
-        except Exception as e:
-            error_message = str(e)
-            if "403" in error_message and "resource limit" in error_message:
-                return "⚠️ API usage limit reached. Please update your payment method at https://aimlapi.com/app/billing to continue using the service."
-            return f"Error: {error_message}"
-
-    def generate_meal_plan(self, profile: Dict) -> Dict:
-        """Generate meal plan with nutrition analysis"""
-        try:
-            # Adjust prompt based on user's region, medical conditions and preferences
-            region_foods = self.regional_foods.get(profile.get("location", "North America"), [])
-            region_foods_str = ", ".join(region_foods)
-            
-            medical_considerations = ""
-            if profile.get("medical_conditions"):
-                for condition in profile.get("medical_conditions", []):
-                    if condition in self.nutrition_db["medical_considerations"]:
-                        avoid = ", ".join(self.nutrition_db["medical_considerations"][condition]["avoid"])
-                        prefer = ", ".join(self.nutrition_db["medical_considerations"][condition]["prefer"])
-                        medical_considerations += f"\n- For {condition}: Avoid {avoid}. Prefer {prefer}."
-            
-            system_prompt = f"""Create a detailed 7-day meal plan considering:
-            - Location: {profile.get('location', 'Not specified')} (common foods: {region_foods_str})
-            - Age: {profile.get('age')} years
-            - Diet type: {profile.get('diet_type')}
-            - Goal: {profile.get('goal')}
-            - Budget preference: {profile.get('budget', 'Medium')}
-            - Taste preferences: {profile.get('taste_preferences', 'Not specified')}
-            - Medical conditions: {', '.join(profile.get('medical_conditions', ['None']))}
-            {medical_considerations}
-            
-            Format the meal plan day by day, with breakfast, lunch, dinner and 1-2 snacks.
-            Include specific portion sizes and preparation methods.
-            Focus on practical, easy-to-follow meals that align with the user's preferences.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="o1",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": json.dumps(profile)}
-                ]
-            )
-            meal_plan = response.choices[0].message.content
-            
-            # Calculate estimated nutrition facts
-            nutrition = self._analyze_meal_plan(meal_plan, profile.get("goal", "maintenance"))
-            cost = self._estimate_cost(meal_plan)
-        
-            return {
-                "plan": meal_plan,
-                "nutrition": nutrition,
-                "cost": cost
-            }
-        except Exception as e:
-            return {"error": str(e)}
-
-    def _analyze_meal_plan(self, meal_plan: str, goal: str = "maintenance") -> Dict[str, Any]:
-        """Calculate detailed nutrition facts for the meal plan"""
-        nutrients = {
-            "protein": 0, "carbs": 0, "fat": 0, "fiber": 0, "calories": 0,
-            "estimated_daily": {
-                "protein": 0, "carbs": 0, "fat": 0, "fiber": 0, "calories": 0
-            }
-        }
-        
-        # Count matches for foods in the nutrition database
-        food_matches = 0
-        for food, data in self.nutrition_db["global_foods"].items():
-            count = meal_plan.lower().count(food)
-            if count > 0:
-                food_matches += count
-                nutrients["protein"] += data["protein"] * count
-                nutrients["carbs"] += data["carbs"] * count
-                nutrients["fat"] += data["fat"] * count
-                nutrients["fiber"] += data.get("fiber", 0) * count
-                nutrients["calories"] += data["calories"] * count
-        
-        # Calculate daily estimates (assuming 7-day plan)
-        if "day" in meal_plan.lower():
-            days = 7
-        else:
-            days = 1
-            
-        for key in nutrients["estimated_daily"]:
-            if key != "calories" and days > 0:
-                nutrients["estimated_daily"][key] = round(nutrients[key] / days, 1)
-        
-        # Adjust based on goal
-        goal_data = self.nutrition_db["nutrition_goals"].get(goal.lower().replace(" ", "_"), 
-                                                          {"calories_modifier": 0})
-        base_calories = 2000  # Default base
-        if days > 0:
-            nutrients["estimated_daily"]["calories"] = round((nutrients["calories"] / days) + 
-                                                         goal_data.get("calories_modifier", 0), 0)
-        
-        # Add goal alignment data
-        nutrients["goal_alignment"] = self._calculate_goal_alignment(nutrients["estimated_daily"], goal)
-        
-        return nutrients
+BASE_URL = os.getenv('BASE_URL', DEFAULT_BASE_URL)
+
+# On-disk meal plan cache settings
+PLAN_CACHE_PATH = os.getenv('PLAN_CACHE_PATH', os.path.join('.cache', 'meal_plans.sqlite3'))
+PLAN_CACHE_TTL = float(os.getenv('PLAN_CACHE_TTL', 24 * 3600))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv('PLAN_CACHE_MAX_ENTRIES', 10000))
+
+# Pre-generated plans for profiles without free-text preferences (filled by `python plan_library.py`)
+PLAN_LIBRARY_PATH = os.getenv('PLAN_LIBRARY_PATH', os.path.join('.cache', 'plan_library.sqlite3'))
+PLAN_LIBRARY_MAX_AGE = float(os.getenv('PLAN_LIBRARY_MAX_AGE', 7 * 24 * 3600))
+
+# Semantic answer cache for standalone chat questions; CHAT_CACHE=0 disables it
+CHAT_CACHE = os.getenv('CHAT_CACHE', '1') == '1'
+CHAT_CACHE_TTL = float(os.getenv('CHAT_CACHE_TTL', 24 * 3600))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', 2000))
+CHAT_CACHE_THRESHOLD = float(os.getenv('CHAT_CACHE_THRESHOLD', 0.85))
+
+# Durable chat histories and plans, shared by every worker on the host; empty keeps them in memory only
+CHAT_DB_PATH = os.getenv('CHAT_DB_PATH', os.path.join('.cache', 'conversations.sqlite3'))
+CHAT_DB_RETENTION = float(os.getenv('CHAT_DB_RETENTION', 30 * 24 * 3600))
+
+# Seconds between refreshes of the live plan figures in the sidebar
+LIVE_METRICS_INTERVAL = 0.5
+
+# Port for the Prometheus /metrics endpoint; unset disables it
+METRICS_PORT = os.getenv('METRICS_PORT')
+
+@st.cache_resource
+def get_reference_data() -> Dict[str, Any]:
+    """Nutrition tables and food matcher, built once per process and shared read-only"""
+    return HealthAssistant.build_reference_data()
+
+def plan_cache_version(reference_data: Dict[str, Any]) -> str:
+    """Version tag covering the prompt template and the nutrition database"""
+    return plan_version(reference_data["nutrition_db"])
+
+@st.cache_resource
+def get_plan_cache() -> PlanCache:
+    """Meal plan cache shared by all sessions in the process"""
+    return PlanCache(
+        PLAN_CACHE_PATH,
+        version=plan_cache_version(get_reference_data()),
+        max_entries=PLAN_CACHE_MAX_ENTRIES,
+        ttl=PLAN_CACHE_TTL
+    )
 
-    def _calculate_goal_alignment(self, daily_nutrients: Dict[str, float], goal: str) -> Dict[str, Any]:
-        """Calculate how well the meal plan aligns with the nutrition goal"""
-        goal_key = goal.lower().replace(" ", "_")
-        if goal_key in self.nutrition_db["nutrition_goals"]:
-            goal_data = self.nutrition_db["nutrition_goals"][goal_key]
-            
-            # Calculate macronutrient percentages from the meal plan
-            total_calories = daily_nutrients["calories"]
-            if total_calories > 0:
-                protein_pct = (daily_nutrients["protein"] * 4 / total_calories) * 100
-                carbs_pct = (daily_nutrients["carbs"] * 4 / total_calories) * 100
-                fat_pct = (daily_nutrients["fat"] * 9 / total_calories) * 100
-                
-                # Calculate alignment scores (0-100%)
-                protein_alignment = float(100 - min(abs(protein_pct - goal_data["protein"]) * 2, 100))
-                carbs_alignment = float(100 - min(abs(carbs_pct - goal_data["carbs"]) * 2, 100))
-                fat_alignment = float(100 - min(abs(fat_pct - goal_data["fat"]) * 2, 100))
-                
-                overall_alignment = float((protein_alignment + carbs_alignment + fat_alignment) / 3)
-                
-                return {
-                    "protein_alignment": round(protein_alignment, 1),
-                    "carbs_alignment": round(carbs_alignment, 1),
-                    "fat_alignment": round(fat_alignment, 1),
-                    "overall_alignment": round(overall_alignment, 1),
-                    "macros_actual": {
-                        "protein": round(protein_pct, 1),
-                        "carbs": round(carbs_pct, 1),
-                        "fat": round(fat_pct, 1)
-                    },
-                    "macros_target": {
-                        "protein": goal_data["protein"],
-                        "carbs": goal_data["carbs"],
-                        "fat": goal_data["fat"]
-                    }
-                }
-        
-        # Default return if goal not found
-        return {"overall_alignment": "N/A"}
+@st.cache_resource
+def get_plan_library() -> PlanLibrary:
+    """Pre-generated plan library shared by all sessions in the process"""
+    return PlanLibrary(
+        PLAN_LIBRARY_PATH,
+        version=plan_cache_version(get_reference_data()),
+        max_age=PLAN_LIBRARY_MAX_AGE
+    )
 
-    def _estimate_cost(self, meal_plan: str) -> Dict[str, Any]:
-        """Estimate cost category and breakdown"""
-        costs = []
-        cost_breakdown = {"low": 0, "medium": 0, "high": 0}
-        
-        for food, data in self.nutrition_db["global_foods"].items():
-            count = meal_plan.lower().count(food)
-            if count > 0:
-                costs.extend([data["cost"]] * count)
-                cost_breakdown[data["cost"]] += count
-        
-        if not costs:
-            return {"category": "Unknown", "breakdown": cost_breakdown}
-        
-        avg = sum(1 if c == "low" else 2 if c == "medium" else 3 for c in costs)/len(costs)
-        category = ["Low", "Medium", "High"][int(avg)-1]
-        
-        total = sum(cost_breakdown.values())
-        if total > 0:
-            percentage_breakdown = {
-                k: round((v / total) * 100, 1) for k, v in cost_breakdown.items()
-            }
-        else:
-            percentage_breakdown = cost_breakdown
-            
-        return {
-            "category": category,
-            "breakdown": cost_breakdown,
-            "percentages": percentage_breakdown
-        }
-        
-    def get_specialized_advice(self, module: str, profile: Dict) -> str:
-        """Get specialized health advice based on module"""
+@st.cache_resource
+def get_chat_cache() -> SemanticCache:
+    """FAQ answer cache shared by all sessions in the process"""
+    return SemanticCache(
+        max_entries=CHAT_CACHE_MAX_ENTRIES,
+        ttl=CHAT_CACHE_TTL,
+        threshold=CHAT_CACHE_THRESHOLD
+    )
+
+@st.cache_resource
+def get_session_store() -> SessionStore:
+    """Conversation and plan store shared by all sessions in the process"""
+    return SessionStore(CHAT_DB_PATH, retention=CHAT_DB_RETENTION)
+
+# Cookie holding the conversation id, so a reload or another worker resumes the same history
+CONVERSATION_COOKIE = 'diet_planner_conversation'
+
+def conversation_key() -> str:
+    """Stable id for this browser's conversation, kept in session state and a same-site cookie
+
+    The id is the only credential for the stored health chat, so it never
+    goes into the URL, where shared links, browser history and proxy logs
+    would expose it.
+    """
+    if "sid" in st.query_params:
+        # Earlier versions put the id in the URL; it is no longer honoured
+        del st.query_params["sid"]
+    key = st.session_state.get("conversation_key")
+    if key is None:
         try:
-            module_prompts = {
-                "Women's Health": f"Provide personalized women's health advice for a {profile.get('age')}-year-old with cycle length {profile.get('cycle')} days, pregnancy status: {profile.get('pregnancy')}. Address these concerns: {profile.get('concerns')}",
-                "Child Health": f"Provide pediatric health advice for a {profile.get('age')}-year-old child weighing {profile.get('weight')}kg with these concerns: {profile.get('concerns')}",
-                "Elderly Health": f"Provide geriatric health advice for a {profile.get('age')}-year-old with these health conditions: {profile.get('conditions')} and concerns: {profile.get('concerns')}"
-            }
-            
-            response = self.client.chat.completions.create(
-                model="o1",
-                messages=[
-                    {"role": "system", "content": module_prompts.get(module, "Provide health advice")},
-                    {"role": "user", "content": json.dumps(profile)}
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"Error generating advice: {str(e)}"
+            key = uuid.UUID(st.context.cookies.get(CONVERSATION_COOKIE, "")).hex
+        except ValueError:
+            key = uuid.uuid4().hex
+            set_conversation_cookie(key)
+        st.session_state.conversation_key = key
+    return key
+
+def set_conversation_cookie(key: str) -> None:
+    """Store the conversation id in a first-party cookie from the browser side"""
+    import streamlit.components.v1 as components
+    max_age = int(CHAT_DB_RETENTION)
+    components.html(
+        "<script>window.parent.document.cookie = "
+        f"'{CONVERSATION_COOKIE}={key}; path=/; max-age={max_age}; SameSite=Strict'"
+        " + (window.parent.location.protocol === 'https:' ? '; Secure' : '');</script>",
+        height=0
+    )
+
+def init_session_state() -> None:
+    if "chat_history" not in st.session_state:
+        if CHAT_DB_PATH:
+            st.session_state.chat_history = ChatHistory.load(get_session_store(), conversation_key())
+        else:
+            st.session_state.chat_history = ChatHistory()
+    if "chat_pages" not in st.session_state:
+        st.session_state.chat_pages = 1
+
+@st.cache_resource
+def get_health_assistant(api_key: str, base_url: str) -> HealthAssistant:
+    """Process-wide assistant reused across reruns and sessions
+
+    It owns one lazily created AsyncOpenAI client (and HTTP keep-alive pool)
+    per credentials, shared by every session.
+    """
+    assistant = HealthAssistant(
+        api_key=api_key,
+        base_url=base_url,
+        reference_data=get_reference_data(),
+        plan_cache=get_plan_cache(),
+        chat_cache=get_chat_cache() if CHAT_CACHE else None,
+        plan_library=get_plan_library()
+    )
+    # Importing openai is the slowest part of startup; do it off the render path
+    assistant.warm_up()
+    return assistant
+
+@st.cache_resource
+def get_metrics_server():
+    """Prometheus endpoint for LLM and analysis metrics, one per process"""
+    return metrics.start_metrics_server(int(METRICS_PORT))
+
+def session_liveness() -> Dict[str, Any]:
+    """Current Streamlit session id and a check that turns False once it disconnects"""
+    ctx = get_script_run_ctx()
+    if ctx is None or not runtime.exists():
+        return {"session_id": None, "is_alive": None}
+    session_id = ctx.session_id
+    instance = runtime.get_instance()
+    return {"session_id": session_id, "is_alive": lambda: instance.is_active_session(session_id)}
+
+def render_live_metrics(panel, snapshot: Dict[str, Any]) -> None:
+    """Running figures for a plan that is still streaming"""
+    daily = snapshot["estimated_daily"]
+    with panel.container():
+        st.markdown("### 📈 Live plan analysis")
+        st.caption(f"Day {max(snapshot['days'], 1)} of the plan so far")
+        st.metric("Calories per day", f"{daily['calories']:.0f} kcal")
+        col_a, col_b = st.columns(2)
+        col_a.metric("Protein", f"{daily['protein']}g")
+        col_a.metric("Carbs", f"{daily['carbs']}g")
+        col_b.metric("Fat", f"{daily['fat']}g")
+        col_b.metric("Fiber", f"{daily['fiber']}g")
+        costs = snapshot["cost_counts"]
+        st.caption(f"Foods by cost: {costs['low']} low, {costs['medium']} medium, {costs['high']} high")
+
+def with_live_metrics(stream, panel) -> Iterator[str]:
+    """Pass the stream through, refreshing the live figures every LIVE_METRICS_INTERVAL seconds"""
+    analyzer = stream.analyzer
+    shown = 0.0
+    for chunk in stream:
+        yield chunk
+        if analyzer is not None and time.monotonic() - shown >= LIVE_METRICS_INTERVAL:
+            render_live_metrics(panel, analyzer.snapshot())
+            shown = time.monotonic()
+    panel.empty()
 
 # Streamlit UI
 def main():
@@ -300,6 +198,7 @@ def main():
         page_icon="🍏",
         layout="wide"
     )
+    init_session_state()
     
     # Custom CSS
     st.markdown("""
@@ -656,11 +555,14 @@ def main():
         </div>
         """, unsafe_allow_html=True)
     
-    assistant = HealthAssistant()
+    if METRICS_PORT:
+        get_metrics_server()
+    assistant = get_health_assistant(os.getenv("API_KEY"), BASE_URL).for_session(**session_liveness())
     
     st.title("🍏 Health & Nutrition Assistant")
     
-    tab1, tab2, tab3 = st.tabs(["🍽️ Diet Planner", "💬 Chat Assistant", "🏥 Health Modules"])
+    tab1, tab2, tab3, tab4 = st.tabs(["🍽️ Diet Planner", "👪 Household Planner", "💬 Chat Assistant",
+                                      "🏥 Health Modules"])
     
     with tab1:
         st.markdown("""
@@ -682,14 +584,10 @@ def main():
                 
             with col2:
                 gender = st.radio("Gender", ["Male", "Female", "Other"])
-                location = st.selectbox("Location", 
-                    ["North America", "South America", "Europe", "East Asia", 
-                     "South Asia", "Middle East", "Africa", "Australia/Oceania"])
+                location = st.selectbox("Location", LOCATIONS)
                 
             with col3:
-                diet_type = st.selectbox(
-                    "Diet Type",
-                    ["Omnivore", "Vegetarian", "Vegan", "Pescatarian", "Flexitarian", "Keto", "Paleo"])
+                diet_type = st.selectbox("Diet Type", DIET_TYPES)
                 medical_conditions = st.multiselect(
                     "Medical Conditions",
                     ["None", "Diabetes", "Hypertension", "Celiac", "Lactose Intolerance", 
@@ -704,147 +602,269 @@ def main():
                 activity = st.select_slider(
                     "Activity Level",
                     ["Sedentary", "Light", "Moderate", "Active", "Very Active"])
-                goal = st.selectbox(
-                    "Primary Goal",
-                    ["Weight Loss", "Muscle Gain", "Maintenance", "Heart Health", 
-                     "Diabetes Management", "Anti-Aging", "Athletic Performance"])
-                budget = st.select_slider(
-                    "Budget Preference",
-                    ["Low", "Medium", "High"])
+                goal = st.selectbox("Primary Goal", GOALS)
+                budget = st.select_slider("Budget Preference", BUDGETS)
                 
             with col2:
                 taste_preferences = st.text_area("Taste Preferences (e.g., spicy, sweet, savory)", height=80)
                 food_dislikes = st.text_area("Foods You Dislike", height=80)
+            parallel_days = st.checkbox(
+                "⚡ Fast mode (generate the seven days in parallel)",
+                help="Each day is written by a separate request, so the plan arrives much sooner.")
             st.markdown('</div>', unsafe_allow_html=True)
             
             submit = st.form_submit_button("Generate Meal Plan")
             
         if submit:
-            with st.spinner("🔮 Creating your personalized nutrition plan... Please wait while we analyze your preferences..."):
-                profile = {
-                    "age": age,
-                    "weight": weight,
-                    "height": height,
-                    "gender": gender,
-                    "location": location,
-                    "diet_type": diet_type,
-                    "activity": activity,
-                    "goal": goal,
-                    "budget": budget,
-                    "taste_preferences": taste_preferences,
-                    "food_dislikes": food_dislikes,
-                    "medical_conditions": [c for c in medical_conditions if c != "None"]
-                }
-                result = assistant.generate_meal_plan(profile)
+            profile = {
+                "age": age,
+                "weight": weight,
+                "height": height,
+                "gender": gender,
+                "location": location,
+                "diet_type": diet_type,
+                "activity": activity,
+                "goal": goal,
+                "budget": budget,
+                "taste_preferences": taste_preferences,
+                "food_dislikes": food_dislikes,
+                "medical_conditions": [c for c in medical_conditions if c != "None"]
+            }
+            status = st.empty()
+            status.info("🔮 Creating your personalized nutrition plan... Please wait while we analyze your preferences...")
+            
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.markdown('<div class="card">', unsafe_allow_html=True)
+                st.subheader("📋 Meal Plan")
+                stream = assistant.stream_meal_plan(profile, parallel_days=parallel_days)
+                st.write_stream(with_live_metrics(stream, st.sidebar.empty()))
+                st.markdown('</div>', unsafe_allow_html=True)
+            
+            if stream.error:
+                status.markdown(f"""
+                    <div class="error-msg">
+                        {stream.error}
+                    </div>
+                """, unsafe_allow_html=True)
+            else:
+                result = stream.result
+                status.markdown("""
+                    <div class="success-msg">
+                        Your personalized meal plan is ready!
+                    </div>
+                """, unsafe_allow_html=True)
+                
+                with col1:
+                    if result.get("cached"):
+                        st.caption("⚡ Served from the meal plan cache")
+                    elif result.get("library"):
+                        st.caption("⚡ Ready-made plan for your location, diet, goal and budget. "
+                                   "Add taste preferences or dislikes for a plan written just for you.")
+                    elif stream.time_to_first_token is not None:
+                        st.caption(f"First token after {stream.time_to_first_token:.1f}s, "
+                                   f"complete after {stream.elapsed:.1f}s")
+                    if result.get("route", {}).get("tier"):
+                        st.caption(f"Written by fallback model {result['route']['model']} "
+                                   "because the primary model was slow or unavailable")
+                    st.download_button(
+                        label="📥 Download Meal Plan",
+                        data=result["plan"],
+                        file_name="my_meal_plan.txt"
+                    )
+                if CHAT_DB_PATH:
+                    get_session_store().save_plan(conversation_key(), profile, result)
                 
-                if "error" in result:
-                    st.markdown(f"""
-                        <div class="error-msg">
-                            {result["error"]}
-                        </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown("""
-                        <div class="success-msg">
-                            Your personalized meal plan is ready!
-                        </div>
-                    """, unsafe_allow_html=True)
+                with col2:
+                    st.markdown('<div class="card">', unsafe_allow_html=True)
+                    st.subheader("📊 Nutrition Analysis")
+                
+                    if "estimated_daily" in result["nutrition"]:
+                        daily = result["nutrition"]["estimated_daily"]
                     
-                    col1, col2 = st.columns([2, 1])
-                    with col1:
-                        st.markdown('<div class="card">', unsafe_allow_html=True)
-                        st.subheader("📋 Meal Plan")
-                        st.markdown(result["plan"])
+                        # Display metrics in styled containers
+                        st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+                        st.markdown(f"""
+                        <div class="metric-value">{daily.get('calories', 0)} kcal</div>
+                        <div class="metric-label">Daily Calories</div>
+                        """, unsafe_allow_html=True)
                         st.markdown('</div>', unsafe_allow_html=True)
-                        
-                        st.download_button(
-                            label="📥 Download Meal Plan",
-                            data=result["plan"],
-                            file_name="my_meal_plan.txt"
-                        )
                     
-                    with col2:
-                        st.markdown('<div class="card">', unsafe_allow_html=True)
-                        st.subheader("📊 Nutrition Analysis")
-                        
-                        if "estimated_daily" in result["nutrition"]:
-                            daily = result["nutrition"]["estimated_daily"]
-                            
-                            # Display metrics in styled containers
+                        col_a, col_b = st.columns(2)
+                        with col_a:
                             st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-                            st.markdown(f"""
-                            <div class="metric-value">{daily.get('calories', 0)} kcal</div>
-                            <div class="metric-label">Daily Calories</div>
-                            """, unsafe_allow_html=True)
+                            st.metric("Protein", f"{daily.get('protein', 0)}g")
+                            st.metric("Carbs", f"{daily.get('carbs', 0)}g")
                             st.markdown('</div>', unsafe_allow_html=True)
+                        with col_b:
+                            st.markdown('<div class="metric-container">', unsafe_allow_html=True)
+                            st.metric("Fat", f"{daily.get('fat', 0)}g")
+                            st.metric("Fiber", f"{daily.get('fiber', 0)}g")
+                            st.markdown('</div>', unsafe_allow_html=True)
+                    
+                        st.metric("Cost", result["cost"].get("category", "Unknown"))
+                    
+                        if result["nutrition"].get("goal_alignment"):
+                            alignment = result["nutrition"]["goal_alignment"]
+                        
+                            if isinstance(alignment, dict) and alignment.get("overall_alignment") != "N/A":
+                                st.markdown("### 🎯 Goal Alignment")
+                                st.progress(float(alignment["overall_alignment"])/100)
+                                st.write(f"Overall: {alignment['overall_alignment']}%")
                             
-                            col_a, col_b = st.columns(2)
-                            with col_a:
-                                st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-                                st.metric("Protein", f"{daily.get('protein', 0)}g")
-                                st.metric("Carbs", f"{daily.get('carbs', 0)}g")
-                                st.markdown('</div>', unsafe_allow_html=True)
-                            with col_b:
-                                st.markdown('<div class="metric-container">', unsafe_allow_html=True)
-                                st.metric("Fat", f"{daily.get('fat', 0)}g")
-                                st.metric("Fiber", f"{daily.get('fiber', 0)}g")
-                                st.markdown('</div>', unsafe_allow_html=True)
-                            
-                            st.metric("Cost", result["cost"].get("category", "Unknown"))
-                            
-                            if result["nutrition"].get("goal_alignment"):
-                                alignment = result["nutrition"]["goal_alignment"]
+                                if "macros_actual" in alignment and "macros_target" in alignment:
+                                    st.markdown('<div class="plot-container">', unsafe_allow_html=True)
+                                    actual = alignment["macros_actual"]
+                                    target = alignment["macros_target"]
                                 
-                                if isinstance(alignment, dict) and alignment.get("overall_alignment") != "N/A":
-                                    st.markdown("### 🎯 Goal Alignment")
-                                    st.progress(float(alignment["overall_alignment"])/100)
-                                    st.write(f"Overall: {alignment['overall_alignment']}%")
-                                    
-                                    if "macros_actual" in alignment and "macros_target" in alignment:
-                                        st.markdown('<div class="plot-container">', unsafe_allow_html=True)
-                                        actual = alignment["macros_actual"]
-                                        target = alignment["macros_target"]
-                                        
-                                        plt.style.use('dark_background')
-                                        fig, ax = plt.subplots(figsize=(5, 3))
-                                        ax.set_facecolor('#2D2D2D')
-                                        fig.patch.set_facecolor('#2D2D2D')
-                                        
-                                        comparison_df = pd.DataFrame({
-                                            'Macronutrient': ['Protein', 'Carbs', 'Fat'],
-                                            'Your Plan': [actual.get("protein", 0), actual.get("carbs", 0), actual.get("fat", 0)],
-                                            'Target': [target.get("protein", 0), target.get("carbs", 0), target.get("fat", 0)]
-                                        })
-                                        
-                                        comparison_df.plot(x='Macronutrient', kind='bar', ax=ax)
-                                        plt.ylabel('Percentage')
-                                        plt.title('Macronutrient Distribution')
-                                        st.pyplot(fig)
-                                        st.markdown('</div>', unsafe_allow_html=True)
-                                else:
-                                    st.write("Goal alignment could not be calculated")
-                        st.markdown('</div>', unsafe_allow_html=True)
+                                    chart = render_macro_chart(actual, target)
+                                    if MACRO_CHART_FORMAT == "png":
+                                        st.image(chart)
+                                    else:
+                                        st.markdown(chart_html(chart), unsafe_allow_html=True)
+                                    st.markdown('</div>', unsafe_allow_html=True)
+                            else:
+                                st.write("Goal alignment could not be calculated")
+                    st.markdown('</div>', unsafe_allow_html=True)
+        elif CHAT_DB_PATH and (saved := get_session_store().latest_plan(conversation_key())):
+            result = saved["result"]
+            generated = time.strftime("%d %b %Y %H:%M", time.localtime(saved["created_at"]))
+            with st.expander(f"📋 Your last meal plan ({generated})"):
+                daily = result["nutrition"].get("estimated_daily", {})
+                st.caption(f"{daily.get('calories', 0)} kcal per day · "
+                           f"cost {result['cost'].get('category', 'Unknown')}")
+                st.markdown(result["plan"])
+                st.download_button(
+                    label="📥 Download Meal Plan",
+                    data=result["plan"],
+                    file_name="my_meal_plan.txt",
+                    key="download_last_plan"
+                )
     
     with tab2:
+        st.markdown("""
+            <div class="card">
+                <h2>Household Meal Planner</h2>
+                <p>Coordinated plans for the whole family: shared meals, adapted to each member.</p>
+            </div>
+        """, unsafe_allow_html=True)
+        
+        count = st.number_input("Household members", 2, HOUSEHOLD_MAX_MEMBERS, 3)
+        with st.form("household_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                household_location = st.selectbox("Location", LOCATIONS, key="household_location")
+            with col2:
+                household_budget = st.select_slider("Budget Preference", BUDGETS, key="household_budget")
+            
+            members = []
+            for number in range(1, int(count) + 1):
+                with st.expander(f"👤 Member {number}", expanded=number == 1):
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        name = st.text_input("Name", f"Member {number}", key=f"member_{number}_name")
+                        member_age = st.number_input("Age", 1, 120, 30, key=f"member_{number}_age")
+                        member_weight = st.number_input("Weight (kg)", 5, 200, 70, key=f"member_{number}_weight")
+                        member_height = st.number_input("Height (cm)", 50, 250, 170, key=f"member_{number}_height")
+                    with col2:
+                        member_gender = st.radio("Gender", ["Male", "Female", "Other"], key=f"member_{number}_gender")
+                        member_activity = st.select_slider(
+                            "Activity Level",
+                            ["Sedentary", "Light", "Moderate", "Active", "Very Active"],
+                            value="Moderate", key=f"member_{number}_activity")
+                    with col3:
+                        member_diet = st.selectbox("Diet Type", DIET_TYPES, key=f"member_{number}_diet")
+                        member_goal = st.selectbox("Primary Goal", GOALS, index=GOALS.index("Maintenance"),
+                                                   key=f"member_{number}_goal")
+                        member_conditions = st.multiselect(
+                            "Medical Conditions",
+                            ["Diabetes", "Hypertension", "Celiac", "Lactose Intolerance",
+                             "Gout", "IBS", "Food Allergies"], key=f"member_{number}_conditions")
+                    member_dislikes = st.text_input("Foods They Dislike", key=f"member_{number}_dislikes")
+                members.append({
+                    "name": name,
+                    "age": member_age,
+                    "weight": member_weight,
+                    "height": member_height,
+                    "gender": member_gender,
+                    "activity": member_activity,
+                    "diet_type": member_diet,
+                    "goal": member_goal,
+                    "medical_conditions": member_conditions,
+                    "food_dislikes": member_dislikes
+                })
+            
+            household_submit = st.form_submit_button("Generate Household Plan")
+        
+        if household_submit:
+            household = {"location": household_location, "budget": household_budget, "members": members}
+            with st.spinner("🔮 Planning meals for the whole household in one go..."):
+                st.session_state.household_result = assistant.generate_household_plan(household)
+        
+        result = st.session_state.get("household_result")
+        if result and "error" in result:
+            st.markdown(f"""
+                <div class="error-msg">
+                    {result["error"]}
+                </div>
+            """, unsafe_allow_html=True)
+        elif result:
+            if result.get("route", {}).get("tier"):
+                st.caption(f"Written by fallback model {result['route']['model']} "
+                           "because the primary model was slow or unavailable")
+            member_tabs = st.tabs([member["name"] for member in result["members"]])
+            for number, (tab, member) in enumerate(zip(member_tabs, result["members"]), start=1):
+                with tab:
+                    col1, col2 = st.columns([2, 1])
+                    with col1:
+                        st.markdown(member["plan"])
+                        st.download_button(
+                            label="📥 Download Meal Plan",
+                            data=member["plan"],
+                            file_name=f"meal_plan_{member['name'].lower().replace(' ', '_')}.txt",
+                            key=f"download_household_{number}"
+                        )
+                    with col2:
+                        daily = member["nutrition"].get("estimated_daily", {})
+                        st.metric("Daily Calories", f"{daily.get('calories', 0)} kcal")
+                        col_a, col_b = st.columns(2)
+                        col_a.metric("Protein", f"{daily.get('protein', 0)}g")
+                        col_a.metric("Carbs", f"{daily.get('carbs', 0)}g")
+                        col_b.metric("Fat", f"{daily.get('fat', 0)}g")
+                        col_b.metric("Fiber", f"{daily.get('fiber', 0)}g")
+                        st.metric("Cost", member["cost"].get("category", "Unknown"))
+    
+    with tab3:
         st.subheader("Nutrition Chat Assistant")
         
-        for message in st.session_state.chat_history:
+        history = st.session_state.chat_history
+        if history.has_older(st.session_state.chat_pages):
+            if st.button("⬆️ Show earlier messages"):
+                st.session_state.chat_pages += 1
+                st.rerun()
+        
+        for message in history.visible(st.session_state.chat_pages):
             with st.chat_message(message["role"]):
                 st.write(message["content"])
+                if message.get("cached"):
+                    st.caption("⚡ Answered from the FAQ cache")
+                elif message.get("tier"):
+                    st.caption(f"Answered by fallback model {message['model']}")
         
         if prompt := st.chat_input("Ask about nutrition..."):
             with st.chat_message("user"):
                 st.write(prompt)
             
             with st.chat_message("assistant"):
-                with st.spinner("🤔 Thinking deeply about nutrition..."):
-                    response = assistant.diet_chatbot(prompt)
-                    if response.startswith("⚠️"):
-                        st.error(response)  # Display as error message
+                stream = assistant.stream_diet_chatbot(prompt, st.session_state.chat_history)
+                st.write_stream(stream)
+                if stream.error:
+                    if stream.error.startswith("⚠️"):
+                        st.error(stream.error)  # Display as error message
                     else:
-                        st.write(response)
+                        st.write(stream.error)
     
-    with tab3:
+    with tab4:
         st.subheader("Specialized Health Modules")
         
         module = st.radio(
@@ -867,16 +887,17 @@ def main():
                 submit_button = st.form_submit_button("Get Advice")
                 
             if submit_button:
-                with st.spinner("📊 Analyzing health data and generating personalized recommendations..."):
-                    profile = {
-                        "age": age,
-                        "cycle": cycle,
-                        "pregnancy": pregnancy,
-                        "concerns": concerns
-                    }
-                    advice = assistant.get_specialized_advice(module, profile)
-                    st.success("Here's your personalized health guidance:")
-                    st.write(advice)
+                profile = {
+                    "age": age,
+                    "cycle": cycle,
+                    "pregnancy": pregnancy,
+                    "concerns": concerns
+                }
+                st.success("Here's your personalized health guidance:")
+                stream = assistant.stream_specialized_advice(module, profile)
+                st.write_stream(stream)
+                if stream.error:
+                    st.write(stream.error)
         
         elif module == "Child Health":
             with st.form("child_health_form"):
@@ -893,16 +914,17 @@ def main():
                 submit_button = st.form_submit_button("Get Child Health Advice")
                 
             if submit_button:
-                with st.spinner("📊 Analyzing health data and generating personalized recommendations..."):
-                    profile = {
-                        "age": age,
-                        "weight": weight,
-                        "development": development,
-                        "concerns": concerns
-                    }
-                    advice = assistant.get_specialized_advice(module, profile)
-                    st.success("Child Health Recommendations:")
-                    st.write(advice)
+                profile = {
+                    "age": age,
+                    "weight": weight,
+                    "development": development,
+                    "concerns": concerns
+                }
+                st.success("Child Health Recommendations:")
+                stream = assistant.stream_specialized_advice(module, profile)
+                st.write_stream(stream)
+                if stream.error:
+                    st.write(stream.error)
         
         elif module == "Elderly Health":
             with st.form("elderly_health_form"):
@@ -922,16 +944,17 @@ def main():
                 submit_button = st.form_submit_button("Get Senior Health Advice")
                 
             if submit_button:
-                with st.spinner("📊 Analyzing health data and generating personalized recommendations..."):
-                    profile = {
-                        "age": age,
-                        "conditions": ", ".join(conditions),
-                        "mobility": mobility,
-                        "concerns": concerns
-                    }
-                    advice = assistant.get_specialized_advice(module, profile)
-                    st.success("Senior Health Recommendations:")
-                    st.write(advice)
+                profile = {
+                    "age": age,
+                    "conditions": ", ".join(conditions),
+                    "mobility": mobility,
+                    "concerns": concerns
+                }
+                st.success("Senior Health Recommendations:")
+                stream = assistant.stream_specialized_advice(module, profile)
+                st.write_stream(stream)
+                if stream.error:
+                    st.write(stream.error)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
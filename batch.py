@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from typing import Dict, List, Any, Set, Tuple
+from plan_cache import PlanCache
+from plan_library import PlanLibrary
+
+
+class RateLimiter:
+    """Token bucket over upstream calls per minute, shared by every batch worker
+
+    The assistant acquires a token before each upstream request, so plans
+    served from the cache or the library are not charged. Callers queue in
+    arrival order; a request for more tokens than are available runs into
+    debt and waits until it is paid off.
+    """
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens < 0:
+                await asyncio.sleep(-self._tokens / self.rate)
+
+
+def read_profiles(path: str) -> List[Tuple[str, Any]]:
+    """(row id, profile) per non-empty input line
+
+    A line is either a profile object or ``{"id": ..., "profile": {...}}``; a
+    top-level "id" is used as the row id and left out of the profile.
+    Without one the row id is ``line:<number>``. Lines that are not JSON
+    objects are kept, with the raw text as the profile, and fail when run.
+    """
+    rows = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = line.strip()
+            row_id = f"line:{number}"
+            profile = record
+            if isinstance(record, dict):
+                if record.get("id") is not None:
+                    row_id = str(record["id"])
+                profile = record["profile"] if "profile" in record else {
+                    key: value for key, value in record.items() if key != "id"}
+            if row_id in seen:
+                raise ValueError(f"{path}:{number}: duplicate id {row_id!r}")
+            seen.add(row_id)
+            rows.append((row_id, profile))
+    return rows
+
+
+def finished_ids(path: str) -> Set[str]:
+    """Row ids already written to the output without an error; the output doubles as the checkpoint"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if isinstance(record, dict) and "id" in record:
+                if "error" in record:
+                    done.discard(record["id"])
+                else:
+                    done.add(record["id"])
+    return done
+
+
+def open_output(path: str):
+    """Output file for appending, with any half-written last line terminated first"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    output = open(path, "a+b")
+    if output.tell() > 0:
+        output.seek(-1, os.SEEK_END)
+        if output.read(1) != b"\n":
+            output.write(b"\n")
+    return output
+
+
+async def run_batch(assistant: Any, rows: List[Tuple[str, Any]], output: Any, concurrency: int = 8,
+                    parallel_days: bool = False, progress_interval: float = 10.0) -> Dict[str, int]:
+    """Generate a plan per row with at most ``concurrency`` in flight, appending each result as it completes
+
+    Upstream pacing is the assistant's: give it a RateLimiter as ``rate_limiter``.
+    """
+    queue: "asyncio.Queue[Tuple[str, Any]]" = asyncio.Queue()
+    for row in rows:
+        queue.put_nowait(row)
+    counts = {"done": 0, "failed": 0}
+    started = time.perf_counter()
+
+    def write(record: Dict[str, Any]) -> None:
+        output.write(json.dumps(record).encode("utf-8") + b"\n")
+        output.flush()
+
+    async def worker() -> None:
+        while True:
+            try:
+                row_id, profile = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            row_started = time.perf_counter()
+            if not isinstance(profile, dict):
+                result = {"error": "profile must be a JSON object"}
+            else:
+                try:
+                    result = await assistant.generate_meal_plan(profile, parallel_days=parallel_days)
+                except Exception as e:
+                    result = {"error": str(e)}
+            counts["failed" if "error" in result else "done"] += 1
+            write({"id": row_id, **result, "elapsed": round(time.perf_counter() - row_started, 3)})
+
+    async def report() -> None:
+        while True:
+            await asyncio.sleep(progress_interval)
+            finished = counts["done"] + counts["failed"]
+            rate = finished / (time.perf_counter() - started)
+            remaining = len(rows) - finished
+            eta = f"{remaining / rate:.0f}s" if rate else "?"
+            print(f"{finished}/{len(rows)} finished, {counts['failed']} failed, "
+                  f"{rate * 60:.1f} plans/min, eta {eta}", file=sys.stderr)
+
+    reporter = asyncio.create_task(report())
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(rows))))))
+    finally:
+        reporter.cancel()
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from health_assistant import AsyncHealthAssistant, plan_version
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Generate meal plans for a JSONL file of profiles; rerun to resume")
+    parser.add_argument("input", help="JSONL profiles, one object per line")
+    parser.add_argument("output", help="JSONL results, appended as they complete; rows already there are skipped")
+    parser.add_argument("--concurrency", type=int, default=8, help="plans generated at the same time")
+    parser.add_argument("--rpm", type=float, default=float(os.getenv('BATCH_RPM', 0)),
+                        help="upstream calls per minute across the run (0 for no limit)")
+    parser.add_argument("--parallel-days", action="store_true", help="write each day with its own call")
+    parser.add_argument("--library", action="store_true",
+                        help="serve pre-generated plans for profiles the plan library covers; those rows are "
+                             "written for the bucket's representative profile and marked \"library\": true")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    rows = read_profiles(args.input)
+    done = finished_ids(args.output)
+    todo = [row for row in rows if row[0] not in done]
+    print(f"{len(rows)} profiles, {len(rows) - len(todo)} already finished, {len(todo)} to run", file=sys.stderr)
+
+    reference_data = AsyncHealthAssistant.build_reference_data()
+    version = plan_version(reference_data["nutrition_db"])
+    assistant = AsyncHealthAssistant(
+        reference_data=reference_data,
+        api_key=os.getenv('API_KEY'),
+        base_url=os.getenv('BASE_URL') or None,
+        plan_cache=PlanCache(os.getenv('PLAN_CACHE_PATH', os.path.join('.cache', 'meal_plans.sqlite3')),
+                             version=version),
+        plan_library=PlanLibrary(
+            os.getenv('PLAN_LIBRARY_PATH', os.path.join('.cache', 'plan_library.sqlite3')), version=version
+        ) if args.library else None,
+        rate_limiter=RateLimiter(args.rpm) if args.rpm > 0 else None
+    )
+
+    started = time.perf_counter()
+    with open_output(args.output) as output:
+        try:
+            counts = asyncio.run(run_batch(assistant, todo, output, args.concurrency,
+                                           args.parallel_days, args.progress_interval))
+        except KeyboardInterrupt:
+            print("interrupted; finished rows are saved, rerun the same command to resume", file=sys.stderr)
+            raise SystemExit(130)
+    elapsed = time.perf_counter() - started
+    print(f"finished {counts['done']} plans, {counts['failed']} failed in {elapsed:.1f}s "
+          f"({(counts['done'] + counts['failed']) / max(elapsed, 1e-9) * 60:.1f} plans/min)", file=sys.stderr)
+    raise SystemExit(1 if counts["failed"] else 0)
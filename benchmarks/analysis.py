@@ -0,0 +1,195 @@
+"""Microbenchmarks for the meal-plan analysis hot paths
+
+Times _analyze_meal_plan, _estimate_cost and _calculate_goal_alignment on
+synthetic plans from 1 KB to 1 MB and on food tables of growing size, and
+records throughput and allocations (tracemalloc). Runs offline: no client
+is created and no API key is needed.
+
+    python benchmarks/analysis.py                     # print results
+    python benchmarks/analysis.py --save base.json    # store a baseline
+    python benchmarks/analysis.py --compare base.json # fail on regressions
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from typing import Dict, List, Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from health_assistant import AsyncHealthAssistant  # noqa: E402
+
+PLAN_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+TABLE_SIZES = [16, 256, 4096]
+GOAL = "Muscle Gain"
+SEED = 1234
+
+FILLER = ("with", "and", "a", "side", "of", "grilled", "steamed", "fresh", "cup", "g",
+          "tablespoon", "serve", "warm", "lightly", "seasoned", "topped", "mixed", "bowl")
+MEALS = ("Breakfast", "Lunch", "Dinner", "Snack")
+
+
+def synthetic_foods(count: int, rng: random.Random) -> Dict[str, Dict]:
+    """The built-in foods padded with generated ones up to ``count`` entries"""
+    foods = dict(AsyncHealthAssistant._load_nutrition_db()["global_foods"])
+    syllables = ("ka", "ri", "mo", "la", "te", "su", "no", "vi", "pa", "do", "ze", "lu")
+    while len(foods) < count:
+        name = "_".join("".join(rng.choice(syllables) for _ in range(3)) for _ in range(rng.randint(1, 2)))
+        foods.setdefault(name, {
+            "protein": round(rng.uniform(0, 30), 1),
+            "carbs": round(rng.uniform(0, 70), 1),
+            "fat": round(rng.uniform(0, 50), 1),
+            "fiber": round(rng.uniform(0, 12), 1),
+            "calories": rng.randint(20, 600),
+            "cost": rng.choice(("low", "medium", "high")),
+        })
+    return dict(list(foods.items())[:count])
+
+
+def synthetic_plan(size: int, food_names: List[str], rng: random.Random) -> str:
+    """Markdown-ish meal plan text of roughly ``size`` bytes"""
+    parts: List[str] = []
+    length = 0
+    day = 0
+    while length < size:
+        day += 1
+        header = f"\n## Day {day}\n"
+        parts.append(header)
+        length += len(header)
+        for meal in MEALS:
+            words = [rng.choice(FILLER) if rng.random() < 0.7 else rng.choice(food_names).replace("_", rng.choice("_ "))
+                     for _ in range(rng.randint(8, 20))]
+            line = f"- **{meal}:** {' '.join(words)}\n"
+            parts.append(line)
+            length += len(line)
+    return "".join(parts)[:size]
+
+
+def _time(fn: Callable[[], Any], min_time: float, min_repeats: int) -> float:
+    """Best-of-N seconds per call, with N adapted so the case runs about ``min_time``"""
+    best = float("inf")
+    total = 0.0
+    repeats = 0
+    while repeats < min_repeats or total < min_time:
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        repeats += 1
+    return best
+
+
+def _allocations(fn: Callable[[], Any]) -> Dict[str, int]:
+    tracemalloc.start()
+    try:
+        fn()
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak, "retained_bytes": current, "retained_blocks": blocks}
+
+
+def run(plan_sizes: List[int], table_sizes: List[int], min_time: float) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(SEED)
+    results: Dict[str, Dict[str, Any]] = {}
+    for table_size in table_sizes:
+        foods = synthetic_foods(table_size, rng)
+        started = time.perf_counter()
+        assistant = AsyncHealthAssistant(reference_data=AsyncHealthAssistant.build_reference_data(foods))
+        build_seconds = time.perf_counter() - started
+        results[f"build_reference_data/foods={table_size}"] = {"seconds": build_seconds}
+
+        for plan_size in plan_sizes:
+            plan = synthetic_plan(plan_size, assistant.food_names, rng)
+            cases = {
+                "analyze_meal_plan": lambda: assistant._analyze_meal_plan(plan, GOAL),
+                "estimate_cost": lambda: assistant._estimate_cost(plan),
+            }
+            for name, fn in cases.items():
+                seconds = _time(fn, min_time, min_repeats=3)
+                results[f"{name}/foods={table_size}/plan={plan_size}"] = {
+                    "seconds": seconds,
+                    "mb_per_second": plan_size / seconds / 1e6,
+                    **_allocations(fn),
+                }
+
+    assistant = AsyncHealthAssistant(reference_data=AsyncHealthAssistant.build_reference_data())
+    daily = assistant._analyze_meal_plan(synthetic_plan(10_000, assistant.food_names, rng), GOAL)["estimated_daily"]
+    batch = 1000
+    fn = lambda: [assistant._calculate_goal_alignment(daily, GOAL) for _ in range(batch)]
+    seconds = _time(fn, min_time, min_repeats=3) / batch
+    results["calculate_goal_alignment"] = {"seconds": seconds, "calls_per_second": 1 / seconds,
+                                           **_allocations(lambda: assistant._calculate_goal_alignment(daily, GOAL))}
+    return results
+
+
+def environment() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+            "platform": platform.platform()}
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Cases slower than the baseline by more than ``tolerance`` (a fraction)"""
+    regressions = []
+    for case, measured in results.items():
+        reference = baseline.get(case)
+        if reference is None:
+            continue
+        ratio = measured["seconds"] / reference["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{case}: {ratio:.2f}x baseline "
+                               f"({measured['seconds'] * 1e3:.3f} ms vs {reference['seconds'] * 1e3:.3f} ms)")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="skip the 1 MB plans and the largest table")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to spend per case")
+    parser.add_argument("--save", help="write results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a case counts as a regression (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    plan_sizes = PLAN_SIZES[:-1] if args.quick else PLAN_SIZES
+    table_sizes = TABLE_SIZES[:-1] if args.quick else TABLE_SIZES
+    results = run(plan_sizes, table_sizes, args.min_time)
+
+    print(f"{'case':52} {'ms/call':>10} {'MB/s':>8} {'peak KiB':>9}")
+    for case, measured in results.items():
+        rate = measured.get("mb_per_second")
+        peak = measured.get("peak_bytes")
+        print(f"{case:52} {measured['seconds'] * 1e3:10.3f} "
+              f"{'' if rate is None else f'{rate:8.2f}':>8} {'' if peak is None else f'{peak / 1024:9.1f}':>9}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.compare} (commit {baseline['environment'].get('commit') or 'unknown'})")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Multi-session load harness for the planner, chat and health-module flows
+
+Drives N concurrent simulated users through the same streaming calls the
+Streamlit script makes (one thread and one session-bound HealthAssistant
+per user, as Streamlit runs one script thread per session) and reports
+p50/p95/p99 latency, time to first token and throughput per flow. By
+default it starts the local stub from stub_server.py, so no real o1 calls
+are made:
+
+    python benchmarks/load.py --users 50 --duration 60 --latency lognormal:2,0.6
+    python benchmarks/load.py --users 20 --error-rate 0.05 --output load.json
+    python benchmarks/load.py --base-url http://staging:8000/v1 --api-key ...   # no stub
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+from typing import Dict, List, Any, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from health_assistant import HealthAssistant  # noqa: E402
+from chat_history import ChatHistory  # noqa: E402
+from plan_library import LOCATIONS, DIET_TYPES, GOALS  # noqa: E402
+import metrics  # noqa: E402
+import stub_server  # noqa: E402
+
+FLOWS = ("planner", "chat", "health")
+CONDITIONS = ["Diabetes", "Hypertension", "Celiac", "Lactose Intolerance", "Gout", "IBS"]
+QUESTIONS = ["How much protein is in two eggs?", "What should I eat before a morning run?",
+             "Is quinoa better than brown rice?", "Give me a cheap high-fibre snack.",
+             "How many calories are in a banana?"]
+
+
+def random_profile(rng: random.Random) -> Dict[str, Any]:
+    """A planner form submission with the app's select options"""
+    return {
+        "age": rng.randint(18, 80),
+        "weight": rng.randint(45, 120),
+        "height": rng.randint(150, 200),
+        "gender": rng.choice(["Male", "Female", "Other"]),
+        "location": rng.choice(LOCATIONS),
+        "diet_type": rng.choice(DIET_TYPES),
+        "activity": rng.choice(["Sedentary", "Light", "Moderate", "Active", "Very Active"]),
+        "goal": rng.choice(GOALS),
+        "budget": rng.choice(["Low", "Medium", "High"]),
+        "taste_preferences": "",
+        "food_dislikes": "",
+        "medical_conditions": rng.sample(CONDITIONS, rng.randint(0, 2)),
+    }
+
+
+def random_module(rng: random.Random) -> Dict[str, Any]:
+    """A health-module form submission as (module, profile)"""
+    module = rng.choice(["Women's Health", "Child Health", "Elderly Health"])
+    if module == "Women's Health":
+        profile = {"age": rng.randint(18, 50), "cycle": rng.randint(24, 34),
+                   "pregnancy": rng.choice(["Not Pregnant", "Pregnant", "Postpartum"]), "concerns": "fatigue"}
+    elif module == "Child Health":
+        profile = {"age": rng.randint(1, 17), "weight": rng.randint(10, 60),
+                   "development": rng.choice(["Toddler", "Preschool", "School Age", "Teenager"]),
+                   "concerns": "picky eating"}
+    else:
+        profile = {"age": rng.randint(60, 95), "conditions": rng.choice(["None", "Hypertension", "Arthritis"]),
+                   "mobility": rng.choice(["Uses Cane", "Independent"]), "concerns": "appetite"}
+    return {"module": module, "profile": profile}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(round(pct / 100 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    """Thread-safe per-flow samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+
+    def add(self, flow: str, latency: float, ttft: Optional[float], outcome: str) -> None:
+        with self.lock:
+            self.samples[flow].append({"latency": latency, "ttft": ttft, "outcome": outcome})
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        flows = {}
+        for flow in FLOWS + ("all",):
+            samples = [s for f in FLOWS for s in self.samples[f]] if flow == "all" else self.samples[flow]
+            if not samples:
+                continue
+            ok = [s["latency"] for s in samples if s["outcome"] == "ok"]
+            ttft = [s["ttft"] for s in samples if s["outcome"] == "ok" and s["ttft"] is not None]
+            outcomes: Dict[str, int] = defaultdict(int)
+            for s in samples:
+                outcomes[s["outcome"]] += 1
+            flows[flow] = {
+                "requests": len(samples),
+                "throughput_rps": len(samples) / wall,
+                "outcomes": dict(outcomes),
+                "latency": {f"p{p}": percentile(ok, p) for p in (50, 95, 99)},
+                "ttft": {f"p{p}": percentile(ttft, p) for p in (50, 95, 99)},
+            }
+        return {"wall_seconds": wall, "flows": flows}
+
+
+def consume(stream) -> Dict[str, Any]:
+    """Drain a CompletionStream the way st.write_stream does"""
+    start = time.perf_counter()
+    for _ in stream:
+        pass
+    return {"latency": time.perf_counter() - start, "ttft": stream.time_to_first_token}
+
+
+def simulated_user(user: int, assistant: HealthAssistant, recorder: Recorder, args: argparse.Namespace,
+                   deadline: float) -> None:
+    rng = random.Random(args.seed * 1000 + user if args.seed is not None else None)
+    session = assistant.for_session(f"load-{user}")
+    history = ChatHistory()
+    weights = [args.planner_weight, args.chat_weight, args.health_weight]
+    done = 0
+    while time.monotonic() < deadline and (args.iterations is None or done < args.iterations):
+        flow = rng.choices(FLOWS, weights)[0]
+        if flow == "planner":
+            stream = session.stream_meal_plan(random_profile(rng), parallel_days=args.parallel_days)
+        elif flow == "chat":
+            stream = session.stream_diet_chatbot(rng.choice(QUESTIONS), history)
+        else:
+            stream = session.stream_specialized_advice(**random_module(rng))
+        timing = consume(stream)
+        if stream.error is None:
+            outcome = "ok"
+        elif str(stream.error).startswith("⚠️"):
+            outcome = "resource_limit"
+        else:
+            outcome = "error"
+        recorder.add(flow, timing["latency"], timing["ttft"], outcome)
+        done += 1
+        if args.think_time:
+            time.sleep(rng.expovariate(1 / args.think_time))
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def fmt(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.3f}"
+
+    print(f"{'flow':<8} {'reqs':>6} {'req/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'ttft50':>7} {'ttft95':>7}  outcomes")
+    for flow, stats in report["flows"].items():
+        latency, ttft = stats["latency"], stats["ttft"]
+        print(f"{flow:<8} {stats['requests']:>6} {stats['throughput_rps']:>7.2f} {fmt(latency['p50']):>7} "
+              f"{fmt(latency['p95']):>7} {fmt(latency['p99']):>7} {fmt(ttft['p50']):>7} {fmt(ttft['p95']):>7}  "
+              + ", ".join(f"{k}={v}" for k, v in sorted(stats["outcomes"].items())))
+    print(f"wall time {report['wall_seconds']:.1f}s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--iterations", type=int, help="stop each user after this many flows")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between a user's actions")
+    parser.add_argument("--planner-weight", type=float, default=1.0)
+    parser.add_argument("--chat-weight", type=float, default=3.0)
+    parser.add_argument("--health-weight", type=float, default=1.0)
+    parser.add_argument("--parallel-days", action="store_true", help="use the per-day planner")
+    parser.add_argument("--max-concurrency", type=int, help="upstream concurrency limit (LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--base-url", help="target an existing endpoint instead of starting the stub")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY", "stub"))
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--prometheus", help="write the collected LLM and analysis metrics in Prometheus format")
+    stub_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    base_url = args.base_url
+    if base_url is None:
+        server = stub_server.serve("127.0.0.1", 0, stub_server.config_from_args(args))
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    options = {"max_concurrency": args.max_concurrency} if args.max_concurrency else {}
+    assistant = HealthAssistant(api_key=args.api_key, base_url=base_url,
+                                reference_data=HealthAssistant.build_reference_data(), **options)
+
+    recorder = Recorder()
+    start = time.monotonic()
+    deadline = start + args.duration
+    users = [threading.Thread(target=simulated_user, args=(user, assistant, recorder, args, deadline),
+                              name=f"load-user-{user}", daemon=True)
+             for user in range(args.users)]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    report = recorder.report(time.monotonic() - start)
+    report["config"] = {key: value for key, value in vars(args).items() if key != "api_key"}
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.prometheus:
+        with open(args.prometheus, "w") as f:
+            f.write(metrics.REGISTRY.prometheus())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
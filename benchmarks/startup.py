@@ -0,0 +1,119 @@
+"""Cold-start benchmark for app.py: import time and time-to-first-render
+
+Each measurement runs in a fresh interpreter so nothing is cached between
+runs. Medians are compared with benchmarks/startup_budget.json and the exit
+status is non-zero when a budget is exceeded or a module that must stay lazy
+was imported at startup.
+
+    python benchmarks/startup.py [--runs 5] [--output results.json]
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List, Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_budget.json")
+
+IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+RENDER_PROBE = """
+import sys, time, json
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file(%r, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "errors": [str(e.value) for e in at.exception]}))
+""" % os.path.join(ROOT, "app.py")
+
+
+def _probe(code: str, env: Dict[str, str]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def measure(runs: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as scratch:
+        env = dict(os.environ)
+        # The first render must get past the API key prompt; no request is sent
+        env.setdefault("API_KEY", "startup-benchmark")
+        # Every store starts empty and nothing is written to the developer's .cache
+        env["PLAN_CACHE_PATH"] = os.path.join(scratch, "plans.sqlite3")
+        env["PLAN_LIBRARY_PATH"] = os.path.join(scratch, "plan_library.sqlite3")
+        env["CHAT_DB_PATH"] = os.path.join(scratch, "conversations.sqlite3")
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+
+        import_times: List[float] = []
+        render_times: List[float] = []
+        loaded = set()
+        errors: List[str] = []
+        for _ in range(runs):
+            result = _probe(IMPORT_PROBE, env)
+            import_times.append(result["seconds"])
+            loaded.update(result["modules"])
+            result = _probe(RENDER_PROBE, env)
+            render_times.append(result["seconds"])
+            errors.extend(result["errors"])
+
+    return {
+        "runs": runs,
+        "import_seconds": statistics.median(import_times),
+        "first_render_seconds": statistics.median(render_times),
+        "import_samples": import_times,
+        "first_render_samples": render_times,
+        "loaded_modules": sorted(loaded),
+        "render_errors": errors,
+    }
+
+
+def check(results: Dict[str, Any], budget: Dict[str, Any]) -> List[str]:
+    """Budget violations, empty when the startup is within budget"""
+    failures = []
+    for metric in ("import_seconds", "first_render_seconds"):
+        if results[metric] > budget[metric]:
+            failures.append(f"{metric}: {results[metric]:.3f}s exceeds budget {budget[metric]:.3f}s")
+    for module in budget.get("lazy_modules", []):
+        if module in results["loaded_modules"]:
+            failures.append(f"{module} is imported at startup but must stay lazy")
+    failures.extend(f"first render raised: {error}" for error in results["render_errors"])
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh-process samples per metric")
+    parser.add_argument("--budget", default=BUDGET_PATH, help="JSON file with the regression thresholds")
+    parser.add_argument("--output", help="write the raw measurements to this JSON file")
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    with open(args.budget) as f:
+        budget = json.load(f)
+
+    print(f"import app:        {results['import_seconds']:.3f}s (budget {budget['import_seconds']:.3f}s)")
+    print(f"first render:      {results['first_render_seconds']:.3f}s (budget {budget['first_render_seconds']:.3f}s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({k: v for k, v in results.items() if k != "loaded_modules"}, f, indent=2)
+
+    failures = check(results, budget)
+    for failure in failures:
+        print("FAIL", failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+"""Local OpenAI-compatible stub for load tests
+
+Serves POST /v1/chat/completions (streaming and non-streaming) with canned
+meal plans, chat answers and health advice, configurable latency, and
+injected failures, including the 403 "resource limit" reply that
+diet_chatbot special-cases. Point BASE_URL at it:
+
+    python benchmarks/stub_server.py --port 8765 --latency lognormal:1.0,0.5 --error-rate 0.02
+    BASE_URL=http://127.0.0.1:8765/v1 API_KEY=stub streamlit run app.py
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Callable, Optional
+
+MEALS = {
+    "Breakfast": ["Oats with banana and almonds", "Greek yogurt with oats and banana",
+                  "Scrambled eggs with spinach", "Tofu scramble with spinach and avocado"],
+    "Lunch": ["Chicken breast with brown rice and spinach", "Lentils and quinoa bowl",
+              "Chickpeas salad with avocado", "Salmon with quinoa"],
+    "Dinner": ["Salmon with sweet potato", "Beef stir-fry with brown rice",
+               "Tofu curry with lentils", "Chicken breast with sweet potato"],
+    "Snack": ["Almonds", "Banana", "Greek yogurt", "Avocado toast"],
+}
+
+CHAT_ANSWERS = [
+    "Eggs have about 12.6g of protein per 100g, so two large eggs give roughly 12g.",
+    "For a budget-friendly high-protein diet, lean on lentils, chickpeas, eggs and tofu.",
+    "Oats and sweet potato are good complex-carb sources before training.",
+]
+
+ADVICE = ("Focus on whole foods, regular meals and hydration. Include iron-rich foods such as "
+          "lentils and spinach, calcium from yogurt, and discuss any persistent concerns with your doctor.")
+
+RESOURCE_LIMIT = {
+    "error": {
+        "message": "You've reached your resource limit. Please update your payment method.",
+        "type": "forbidden", "code": "resource_limit",
+    }
+}
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """Latency sampler from ``kind:args``: constant:S, uniform:LO,HI, normal:MU,SD, lognormal:MEDIAN,SIGMA"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "constant":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        import math
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+def meal_plan_day(day: int, rng: random.Random) -> str:
+    lines = [f"## Day {day}", ""]
+    for meal, options in MEALS.items():
+        lines.append(f"- **{meal}:** {rng.choice(options)} (1 serving, about {rng.randint(150, 400)} g)")
+    return "\n".join(lines)
+
+
+def canned_reply(messages: List[Dict[str, Any]], rng: random.Random) -> str:
+    """Pick a reply shaped like what the real model returns for this prompt"""
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    single_day = re.search(r"Only write day (\d+)", system)
+    if single_day:
+        return meal_plan_day(int(single_day.group(1)), rng)
+    household = re.search(r"household of (\d+)", system)
+    if household:
+        return "\n\n".join(f"=== Member {number}: Member {number} ===\n\n"
+                           + "\n\n".join(meal_plan_day(day, rng) for day in range(1, 8))
+                           for number in range(1, int(household.group(1)) + 1))
+    if "meal plan" in system.lower():
+        return "\n\n".join(meal_plan_day(day, rng) for day in range(1, 8))
+    if "nutrition expert chatbot" in system:
+        return rng.choice(CHAT_ANSWERS)
+    return ADVICE
+
+
+class StubConfig:
+    def __init__(self, latency: str = "constant:0.05", chunk_delay: float = 0.005, chunk_size: int = 16,
+                 error_rate: float = 0.0, error_kinds: str = "500,429,403", hang_seconds: float = 120.0,
+                 seed: Optional[int] = None, model_latency: str = ""):
+        self.latency = parse_distribution(latency)
+        # "o1=lognormal:8,0.3;gpt-4o-mini=constant:0.3" overrides the latency per requested model
+        self.model_latency = {
+            model.strip(): parse_distribution(spec.strip())
+            for model, _, spec in (item.partition("=") for item in model_latency.split(";") if item.strip())
+        }
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.error_rate = error_rate
+        self.error_kinds = [kind.strip() for kind in error_kinds.split(",") if kind.strip()]
+        self.hang_seconds = hang_seconds
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def draw(self, model: str = None) -> Dict[str, Any]:
+        """Per-request latency, failure kind and reply RNG (random.Random is not thread-safe)"""
+        latency = self.model_latency.get(model, self.latency)
+        with self.lock:
+            self.requests += 1
+            error = None
+            if self.error_kinds and self.rng.random() < self.error_rate:
+                error = self.rng.choice(self.error_kinds)
+                self.errors += 1
+            return {"latency": latency(self.rng), "error": error, "rng": random.Random(self.rng.random())}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout, hedge lost or cancelled session)
+            pass
+
+    def do_GET(self) -> None:
+        if self.path.rstrip("/") in ("/health", "/v1/models"):
+            self._send_json(200, {"status": "ok", "requests": self.config.requests, "errors": self.config.errors})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        draw = self.config.draw(request.get("model"))
+        time.sleep(draw["latency"])
+        if draw["error"] == "403":
+            self._send_json(403, RESOURCE_LIMIT)
+            return
+        if draw["error"] == "hang":
+            time.sleep(self.config.hang_seconds)
+        elif draw["error"] is not None:
+            status = int(draw["error"])
+            self._send_json(status, {"error": {"message": f"injected upstream error {status}", "type": "stub"}})
+            return
+
+        text = canned_reply(request.get("messages", []), draw["rng"])
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(text) // 4,
+            "total_tokens": prompt_tokens + len(text) // 4,
+            "completion_tokens_details": {"reasoning_tokens": 0},
+        }
+        model = request.get("model", "stub")
+        if request.get("stream"):
+            self._stream(text, model, usage, request.get("stream_options") or {})
+        else:
+            self._send_json(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": usage,
+            })
+
+    def _stream(self, text: str, model: str, usage: Dict[str, Any], options: Dict[str, Any]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(body: Any) -> None:
+            data = f"data: {body if isinstance(body, str) else json.dumps(body)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        size = self.config.chunk_size
+        try:
+            for start in range(0, len(text), size):
+                event({**base, "choices": [{"index": 0, "finish_reason": None,
+                                            "delta": {"content": text[start:start + size]}}]})
+                time.sleep(self.config.chunk_delay)
+            event({**base, "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]})
+            if options.get("include_usage"):
+                event({**base, "choices": [], "usage": usage})
+            event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve(host: str, port: int, config: StubConfig) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread; returns the server (use server.server_address for the port)"""
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="openai-stub", daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", default="constant:0.05",
+                        help="time before the first byte: constant:S, uniform:LO,HI, normal:MU,SD, lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--model-latency", default="",
+                        help="per-model latency overrides, e.g. 'o1=lognormal:8,0.3;gpt-4o-mini=constant:0.3'")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-kinds", default="500,429,403",
+                        help="comma list drawn from on failure: HTTP status codes (403 = resource limit) or 'hang'")
+    parser.add_argument("--hang-seconds", type=float, default=120.0, help="how long a 'hang' failure stalls")
+    parser.add_argument("--seed", type=int, help="seed for reproducible latency and failures")
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(latency=args.latency, chunk_delay=args.chunk_delay, chunk_size=args.chunk_size,
+                      error_rate=args.error_rate, error_kinds=args.error_kinds,
+                      hang_seconds=args.hang_seconds, seed=args.seed, model_latency=args.model_latency)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(args.host, args.port, config_from_args(args))
+    host, port = server.server_address[:2]
+    print(f"stub listening on http://{host}:{port}/v1", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import io
+import os
+import base64
+import threading
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# "png"/"svg" render through matplotlib, "lite" draws the SVG directly
+MACRO_CHART_FORMAT = os.getenv('MACRO_CHART_FORMAT', 'png')
+MACRO_CHART_CACHE_SIZE = int(os.getenv('MACRO_CHART_CACHE_SIZE', 256))
+
+MACROS = ("protein", "carbs", "fat")
+LABELS = ("Protein", "Carbs", "Fat")
+# Card background and the first two colors of matplotlib's dark_background cycle
+BACKGROUND = "#2D2D2D"
+PLAN_COLOR = "#8DD3C7"
+TARGET_COLOR = "#FEFFB3"
+
+# Figures are independent of pyplot, but the Agg renderer is not re-entrant
+_render_lock = threading.Lock()
+
+
+def _macro_key(values: Dict[str, float]) -> Tuple[float, ...]:
+    return tuple(round(float(values.get(macro, 0)), 1) for macro in MACROS)
+
+
+def render_macro_chart(actual: Dict[str, float], target: Dict[str, float], fmt: str = None) -> bytes:
+    """Macronutrient comparison chart as image bytes, cached by the plotted values"""
+    return _render(_macro_key(actual), _macro_key(target), fmt or MACRO_CHART_FORMAT)
+
+
+def chart_html(image: bytes, fmt: str = None) -> str:
+    """<img> tag embedding a rendered chart"""
+    fmt = fmt or MACRO_CHART_FORMAT
+    mime = "image/png" if fmt == "png" else "image/svg+xml"
+    return f'<img src="data:{mime};base64,{base64.b64encode(image).decode("ascii")}" style="width:100%"/>'
+
+
+@lru_cache(maxsize=MACRO_CHART_CACHE_SIZE)
+def _render(actual: Tuple[float, ...], target: Tuple[float, ...], fmt: str) -> bytes:
+    if fmt == "lite":
+        return _render_lite(actual, target)
+    return _render_matplotlib(actual, target, fmt)
+
+
+def _render_matplotlib(actual: Tuple[float, ...], target: Tuple[float, ...], fmt: str) -> bytes:
+    """Render with matplotlib's object API so nothing is registered in pyplot's global state"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    with _render_lock:
+        fig = Figure(figsize=(5, 3), facecolor=BACKGROUND)
+        FigureCanvasAgg(fig)
+        try:
+            ax = fig.add_subplot()
+            ax.set_facecolor(BACKGROUND)
+            width = 0.25
+            positions = range(len(MACROS))
+            ax.bar([p - width / 2 for p in positions], actual, width, label="Your Plan", color=PLAN_COLOR)
+            ax.bar([p + width / 2 for p in positions], target, width, label="Target", color=TARGET_COLOR)
+            ax.set_xticks(list(positions), LABELS, rotation=90)
+            ax.set_xlabel("Macronutrient", color="white")
+            ax.set_ylabel("Percentage", color="white")
+            ax.set_title("Macronutrient Distribution", color="white")
+            ax.tick_params(colors="white")
+            for spine in ax.spines.values():
+                spine.set_color("white")
+            legend = ax.legend(facecolor=BACKGROUND, edgecolor="white")
+            for text in legend.get_texts():
+                text.set_color("white")
+            fig.tight_layout()
+
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, facecolor=BACKGROUND)
+            return buffer.getvalue()
+        finally:
+            fig.clear()
+
+
+def _render_lite(actual: Tuple[float, ...], target: Tuple[float, ...]) -> bytes:
+    """Hand-built SVG bar chart; no matplotlib import at all"""
+    width, height = 500, 300
+    left, right, top, bottom = 50, 20, 40, 50
+    plot_w, plot_h = width - left - right, height - top - bottom
+    peak = max(max(actual + target), 1.0)
+    scale = plot_h / (peak * 1.1)
+    group = plot_w / len(MACROS)
+    bar = group * 0.25
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'font-family="sans-serif" font-size="12" fill="white">',
+        f'<rect width="{width}" height="{height}" fill="{BACKGROUND}"/>',
+        f'<text x="{width / 2}" y="22" text-anchor="middle" font-size="14">Macronutrient Distribution</text>',
+        f'<text x="14" y="{top + plot_h / 2}" text-anchor="middle" '
+        f'transform="rotate(-90 14 {top + plot_h / 2})">Percentage</text>',
+        f'<line x1="{left}" y1="{top + plot_h}" x2="{left + plot_w}" y2="{top + plot_h}" stroke="white"/>',
+        f'<line x1="{left}" y1="{top}" x2="{left}" y2="{top + plot_h}" stroke="white"/>',
+    ]
+    for i, label in enumerate(LABELS):
+        center = left + group * (i + 0.5)
+        for offset, value, color in ((-bar, actual[i], PLAN_COLOR), (0, target[i], TARGET_COLOR)):
+            bar_h = value * scale
+            parts.append(
+                f'<rect x="{center + offset:.1f}" y="{top + plot_h - bar_h:.1f}" width="{bar:.1f}" '
+                f'height="{bar_h:.1f}" fill="{color}"><title>{value}%</title></rect>')
+        parts.append(f'<text x="{center:.1f}" y="{top + plot_h + 18}" text-anchor="middle">{label}</text>')
+    legend_x = left + plot_w - 110
+    for row, (name, color) in enumerate((("Your Plan", PLAN_COLOR), ("Target", TARGET_COLOR))):
+        y = top + 6 + row * 18
+        parts.append(f'<rect x="{legend_x}" y="{y}" width="12" height="12" fill="{color}"/>')
+        parts.append(f'<text x="{legend_x + 18}" y="{y + 11}">{name}</text>')
+    parts.append('</svg>')
+    return "".join(parts).encode("utf-8")
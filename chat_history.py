@@ -0,0 +1,173 @@
+import json
+import zlib
+from typing import Dict, List, Any, Callable, Optional
+
+# Rough chars-per-token ratio for English text, plus per-message framing overhead
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough for budgeting context"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    text = " ".join(text.split())
+    for end in (". ", "? ", "! "):
+        cut = text.find(end)
+        if 0 < cut < limit:
+            return text[:cut + 1]
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+def extractive_summary(summary: str, turns: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Default summarizer: keep the gist of each folded turn, oldest lines dropped first"""
+    lines = summary.splitlines() if summary else []
+    for turn in turns:
+        speaker = "User asked" if turn["role"] == "user" else "Assistant answered"
+        lines.append(f"- {speaker}: {_first_sentence(turn['content'])}")
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ChatHistory:
+    """Per-session chat history with a bounded working set and a rolling summary
+
+    The newest ``max_turns`` messages stay in memory as plain dicts. Older
+    messages are moved out a page at a time into zlib-compressed pages (at most
+    ``max_archived_pages``; beyond that only the summary remembers them) and are
+    decompressed only when the UI pages back to them. Turns that no longer fit
+    the prompt budget are folded into ``summary``, which is updated
+    incrementally and reused across requests.
+
+    With a ``store`` (a SessionStore) every message and summary update is
+    also written under ``session_key``; spilled pages are then dropped from
+    memory entirely and read back from the store when paged to, and
+    ``load()`` resumes the conversation on any worker.
+    """
+
+    def __init__(self, max_turns: int = 40, page_size: int = 20, max_archived_pages: int = 25,
+                 summary_tokens: int = 300,
+                 summarizer: Callable[[str, List[Dict[str, Any]], int], str] = extractive_summary,
+                 store: Any = None, session_key: Optional[str] = None):
+        self.max_turns = max_turns
+        self.page_size = page_size
+        self.max_archived_pages = max_archived_pages
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.store = store if session_key else None
+        self.session_key = session_key
+        self.turns: List[Dict[str, Any]] = []
+        self.summary = ""
+        self._archive: List[bytes] = []
+        self._archived_from = 0  # absolute index of the first archived turn
+        self._total = 0          # turns ever appended
+        self._summarized = 0     # turns [0, _summarized) are covered by the summary
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, Any]], **kwargs) -> "ChatHistory":
+        history = cls(**kwargs)
+        for message in messages:
+            history.append(**message)
+        return history
+
+    @classmethod
+    def load(cls, store: Any, session_key: str, **kwargs) -> "ChatHistory":
+        """A store-backed history holding the newest page of a stored conversation, or a new one"""
+        history = cls(store=store, session_key=session_key, **kwargs)
+        saved = store.conversation(session_key)
+        if saved:
+            history.summary = saved["summary"]
+            history._summarized = saved["summarized"]
+            history._total = saved["total"]
+            start = max(0, history._total - history.page_size)
+            # Everything left out of memory must already be covered by the summary
+            if history._summarized < start:
+                history._fold(store.messages(session_key, history._summarized, start))
+            history.turns = store.messages(session_key, start, history._total)
+        return history
+
+    def __len__(self) -> int:
+        return self._total
+
+    @property
+    def _first_in_memory(self) -> int:
+        return self._total - len(self.turns)
+
+    def append(self, role: str, content: str, **meta: Any) -> None:
+        """Add a message, spilling the oldest page out of memory when over capacity"""
+        self.turns.append({"role": role, "content": content, **meta})
+        if self.store:
+            self.store.add_message(self.session_key, self._total, role, content, meta)
+        self._total += 1
+        if len(self.turns) > self.max_turns:
+            self._spill(self.turns[:self.page_size])
+            del self.turns[:self.page_size]
+
+    def _spill(self, page: List[Dict[str, Any]]) -> None:
+        start = self._first_in_memory
+        # Anything leaving memory must be represented in the summary first
+        if self._summarized < start + len(page):
+            self._fold(page[max(0, self._summarized - start):])
+        if self.store:
+            return
+        self._archive.append(zlib.compress(json.dumps(page).encode("utf-8")))
+        if len(self._archive) > self.max_archived_pages:
+            self._archive.pop(0)
+            self._archived_from += self.page_size
+
+    def _fold(self, turns: List[Dict[str, Any]]) -> None:
+        if turns:
+            self.summary = self.summarizer(self.summary, turns, self.summary_tokens)
+            self._summarized += len(turns)
+            if self.store:
+                self.store.save_summary(self.session_key, self.summary, self._summarized)
+
+    def context(self, budget_tokens: int) -> List[Dict[str, str]]:
+        """Messages for the next request: running summary plus the newest turns within budget"""
+        window: List[Dict[str, Any]] = []
+        used = 0
+        for turn in reversed(self.turns):
+            cost = message_tokens(turn)
+            if window and used + cost > budget_tokens:
+                break
+            window.append(turn)
+            used += cost
+        window.reverse()
+
+        # Turns between the summary and the window are folded now, once
+        window_start = self._total - len(window)
+        if self._summarized < window_start:
+            start = max(self._summarized, self._first_in_memory)
+            self._fold(self.turns[start - self._first_in_memory:window_start - self._first_in_memory])
+
+        messages = [{"role": msg["role"], "content": msg["content"]} for msg in window]
+        if self.summary and window_start > 0:
+            messages.insert(0, {"role": "system",
+                                "content": "Summary of the earlier conversation:\n" + self.summary})
+        return messages
+
+    def visible(self, pages: int = 1) -> List[Dict[str, Any]]:
+        """The newest ``pages`` pages of messages, decompressing archived pages on demand"""
+        wanted = pages * self.page_size
+        if wanted <= len(self.turns):
+            return self.turns[-wanted:]
+        if self.store:
+            start = max(0, self._total - wanted)
+            return self.store.messages(self.session_key, start, self._first_in_memory) + self.turns
+        older: List[Dict[str, Any]] = []
+        for blob in reversed(self._archive):
+            older[:0] = json.loads(zlib.decompress(blob))
+            if len(older) + len(self.turns) >= wanted:
+                break
+        return (older + self.turns)[-wanted:]
+
+    def has_older(self, pages: int = 1) -> bool:
+        """Whether paging back further would show more messages"""
+        return pages * self.page_size < self._total - self._archived_from
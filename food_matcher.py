@@ -0,0 +1,256 @@
+import re
+from itertools import compress, count
+from typing import Container, Dict, List, Iterable, Mapping, Tuple
+import numpy as np
+
+# Letters and digits of any script; underscores, spaces and punctuation separate words
+_WORD = re.compile(r"[^\W_]+")
+# A word running up to the end of a chunk may continue in the next one
+_TRAILING_WORD = re.compile(r"[^\W_]+$")
+
+# Alternative names for the built-in foods, as LLM plans tend to write them. Only names that
+# mean one food: "steak" or "porridge" alone may be salmon or rice. A longer alias wins over
+# the words inside it, so "chana dal" counts chickpeas and not lentils as well.
+SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "chicken_breast": ("chicken fillet", "chicken breast fillet"),
+    "salmon": ("salmon fillet",),
+    "tofu": ("bean curd",),
+    "brown_rice": ("wholegrain rice", "whole grain rice"),
+    "sweet_potato": ("kumara",),
+    "chickpeas": ("garbanzo", "garbanzo bean", "chana", "chana dal", "chana dhal", "chana daal"),
+    "eggs": ("boiled egg", "scrambled egg", "poached egg"),
+    "greek_yogurt": ("greek yoghurt", "strained yogurt", "strained yoghurt"),
+    "oats": ("oatmeal", "rolled oat", "porridge oat"),
+    "beef": ("ground beef", "minced beef", "beef mince"),
+    "lentils": ("dal", "dhal", "daal"),
+    "spinach": ("palak",),
+}
+
+
+def singular(word: str) -> str:
+    """Crude English singular: berries -> berry, potatoes -> potato, eggs -> egg (not hummus, swiss)"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def food_key(text: str) -> str:
+    """Normalized token sequence used as the index key: "Sweet Potatoes" -> "sweet_potato" """
+    return "_".join(singular(word) for word in _WORD.findall(text.lower()))
+
+
+def alias_keys(index: Mapping[str, int], synonyms: Mapping[str, Iterable[str]]) -> Dict[str, int]:
+    """Normalized alias keys mapped to the row of their food, for foods present in ``index``"""
+    keys: Dict[str, int] = {}
+    for name, aliases in synonyms.items():
+        row = index.get(food_key(name))
+        if row is None:
+            continue
+        for alias in aliases:
+            keys.setdefault(food_key(alias), row)
+    return keys
+
+
+class AliasIndex:
+    """Mapping-style lookup: the base index first, then alias keys for names it lacks"""
+
+    def __init__(self, base: Mapping[str, int], aliases: Dict[str, int]):
+        self.base = base
+        self.aliases = aliases
+
+    def get(self, key: str, default: int = None) -> int:
+        row = self.base.get(key)
+        return self.aliases.get(key, default) if row is None else row
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+
+class KeyUnion:
+    """Membership in either of two key sets, without copying the (memory-mapped) first one"""
+
+    def __init__(self, first: Container[str], second: Container[str]):
+        self.first = first
+        self.second = second
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.second or key in self.first
+
+
+class FoodMatcher:
+    """Word-boundary food counter over a precompiled alias index
+
+    ``index`` maps normalized keys (see food_key) to food rows. Scanning
+    takes the plan's words once and, at each position, the longest run of
+    up to ``max_words`` words found in the index, so the cost per word stays
+    flat however many aliases are added. ``index`` may be a plain dict or
+    the memory-mapped name index of a NutritionStore, with SYNONYMS layered
+    in through from_index(). An opaque index scans as fast as a dict when
+    it comes with ``starts`` (the first words of its keys) and ``prefixes``
+    (their proper word prefixes); without them every window is probed.
+    """
+
+    def __init__(self, index: Mapping[str, int], size: int, max_words: int = None,
+                 starts: Container[str] = None, prefixes: Container[str] = None):
+        self.index = index
+        self.size = size
+        if isinstance(index, dict):
+            self.max_words = max_words or max((key.count("_") + 1 for key in index), default=1)
+            # Only words that can start a key need an index probe, and a match is
+            # only extended while the words so far are a proper prefix of some key
+            self._starts = frozenset(key.split("_", 1)[0] for key in index)
+            self._prefixes = frozenset(
+                "_".join(words[:n]) for words in (key.split("_") for key in index) for n in range(1, len(words))
+            )
+        else:
+            self.max_words = max_words or 1
+            self._starts = starts if prefixes is not None else None
+            self._prefixes = prefixes if starts is not None else None
+        self._singular: Dict[str, str] = {}
+
+    @classmethod
+    def from_names(cls, names: Iterable[str],
+                   synonyms: Mapping[str, Iterable[str]] = SYNONYMS) -> "FoodMatcher":
+        """Index every name (snake_case or spaced, singular or plural) plus its synonyms"""
+        index: Dict[str, int] = {}
+        size = 0
+        for row, name in enumerate(names):
+            index.setdefault(food_key(name), row)
+            size = row + 1
+        for key, row in alias_keys(index, synonyms).items():
+            index.setdefault(key, row)
+        return cls(index, size)
+
+    @classmethod
+    def from_index(cls, index: Mapping[str, int], size: int, max_words: int,
+                   starts: Container[str] = None, prefixes: Container[str] = None,
+                   synonyms: Mapping[str, Iterable[str]] = SYNONYMS) -> "FoodMatcher":
+        """Matcher over an opaque index (a NutritionStore's) with the synonyms of its foods layered in"""
+        aliases = alias_keys(index, synonyms)
+        if not aliases:
+            return cls(index, size, max_words, starts, prefixes)
+        split = [key.split("_") for key in aliases]
+        max_words = max(max_words, max(len(words) for words in split))
+        if starts is not None and prefixes is not None:
+            starts = frozenset(starts) | {words[0] for words in split}
+            prefixes = KeyUnion(prefixes, frozenset(
+                "_".join(words[:n]) for words in split for n in range(1, len(words))))
+        return cls(AliasIndex(index, aliases), size, max_words, starts, prefixes)
+
+    def _words(self, text: str) -> List[str]:
+        raw = _WORD.findall(text.lower())
+        # Memoized per distinct word; plans reuse a small vocabulary
+        words = list(map(self._singular.get, raw))
+        if None in words:
+            cache = self._singular
+            if len(cache) > 100_000:
+                cache.clear()
+            for i, word in enumerate(words):
+                if word is None:
+                    word = words[i] = cache[raw[i]] = singular(raw[i])
+        return words
+
+    def count(self, text: str) -> np.ndarray:
+        """Occurrence counts per food row; matches never overlap"""
+        hits, _ = self._scan(self._words(text))
+        return np.bincount(np.asarray(hits, dtype=np.int64), minlength=self.size)
+
+    def incremental(self) -> "IncrementalCount":
+        """Counter for text that arrives in chunks, giving the same counts as count() on the whole"""
+        return IncrementalCount(self)
+
+    def _scan(self, words: List[str], stop: int = None) -> Tuple[List[int], int]:
+        """Matches starting before ``stop`` (default: anywhere) and the position scanning resumes from"""
+        stop = len(words) if stop is None else stop
+        if self._prefixes is not None:
+            return self._scan_prefixes(words, stop)
+        return self._scan_windows(words, stop)
+
+    def _scan_prefixes(self, words: List[str], stop: int) -> Tuple[List[int], int]:
+        """Longest match grown one word at a time; most words cost a single probe"""
+        lookup = self.index.get
+        prefixes = self._prefixes
+        end = len(words)
+        hits = []
+        free = 0
+        for i in compress(count(), map(self._starts.__contains__, words[:stop])):
+            if i < free:
+                continue
+            key = words[i]
+            best = lookup(key)
+            width = 1
+            n = 1
+            while key in prefixes and i + n < end:
+                key += "_" + words[i + n]
+                n += 1
+                row = lookup(key)
+                if row is not None:
+                    best, width = row, n
+            if best is not None:
+                hits.append(best)
+                free = i + width
+        return hits, max(free, stop)
+
+    def _scan_windows(self, words: List[str], stop: int) -> Tuple[List[int], int]:
+        """Longest match probing windows of max_words down to one word (opaque indexes)"""
+        lookup = self.index.get
+        max_words = self.max_words
+        hits = []
+        i = 0
+        while i < stop:
+            for n in range(min(max_words, len(words) - i), 0, -1):
+                row = lookup(words[i] if n == 1 else "_".join(words[i:i + n]))
+                if row is not None:
+                    hits.append(row)
+                    i += n
+                    break
+            else:
+                i += 1
+        return hits, max(i, stop)
+
+
+class IncrementalCount:
+    """Food counts over streamed text; see FoodMatcher.incremental()
+
+    A word cut off at the end of a chunk waits for the next chunk, and a
+    match is settled only once ``max_words - 1`` complete words follow its
+    start, so no longer match can still appear. Counts therefore equal
+    FoodMatcher.count() over the joined text.
+    """
+
+    def __init__(self, matcher: FoodMatcher):
+        self.matcher = matcher
+        self.counts = np.zeros(matcher.size, dtype=np.int64)
+        self._partial = ""
+        self._words: List[str] = []
+
+    def feed(self, chunk: str) -> List[int]:
+        """Add a chunk; returns the food rows of the matches it settled"""
+        text = self._partial + chunk
+        tail = _TRAILING_WORD.search(text)
+        self._partial = tail.group() if tail else ""
+        if tail:
+            text = text[:tail.start()]
+        if text:
+            self._words += self.matcher._words(text)
+        return self._settle(len(self._words) - (self.matcher.max_words - 1))
+
+    def flush(self) -> List[int]:
+        """Settle everything left at the end of the text; ``counts`` is then final"""
+        if self._partial:
+            self._words += self.matcher._words(self._partial)
+            self._partial = ""
+        return self._settle(len(self._words))
+
+    def _settle(self, stop: int) -> List[int]:
+        if stop <= 0:
+            return []
+        hits, resume = self.matcher._scan(self._words, stop)
+        del self._words[:resume]
+        if hits:
+            np.add.at(self.counts, hits, 1)
+        return hits
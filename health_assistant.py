@@ -0,0 +1,1240 @@
+import os
+import re
+import json
+import time
+import hashlib
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Dict, List, Any, Callable, Iterator, AsyncIterator, Awaitable, Optional, TYPE_CHECKING
+import numpy as np
+from chat_history import ChatHistory
+from food_matcher import FoodMatcher
+from nutrient_table import NutrientTable, NUTRIENTS, COST_TIERS
+from plan_cache import PlanCache, profile_key
+from plan_library import PlanLibrary, bucket_of, bucket_profile
+from nutrition_store import open_store
+import metrics
+from resilience import CircuitOpenError
+from routing import ModelRouter, should_fall_back
+from singleflight import SingleFlight
+from semantic_cache import SemanticCache, is_standalone
+from plan_analyzer import PlanAnalyzer
+
+if TYPE_CHECKING:
+    # openai is imported on first use: it dominates cold-start import time
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger("diet_planner")
+
+DEFAULT_BASE_URL = 'https://api.aimlapi.com/v1'
+
+# Ask for token usage on streamed responses (needs an upstream that supports stream_options)
+LLM_STREAM_USAGE = os.getenv('LLM_STREAM_USAGE', '1') == '1'
+
+# Upper bound on concurrent upstream LLM calls per process
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 32))
+
+# Estimated-token budget for chat history sent with each question
+CHAT_CONTEXT_TOKENS = int(os.getenv('CHAT_CONTEXT_TOKENS', 3000))
+
+# Prompt template for meal plans; changing it invalidates cached plans
+MEAL_PLAN_PROMPT = """Create a detailed 7-day meal plan considering:
+            - Location: {location} (common foods: {region_foods})
+            - Age: {age} years
+            - Diet type: {diet_type}
+            - Goal: {goal}
+            - Budget preference: {budget}
+            - Taste preferences: {taste_preferences}
+            - Medical conditions: {medical_conditions}
+            {medical_considerations}
+            
+            Format the meal plan day by day, with breakfast, lunch, dinner and 1-2 snacks.
+            Include specific portion sizes and preparation methods.
+            Focus on practical, easy-to-follow meals that align with the user's preferences.
+            """
+
+# Appended to MEAL_PLAN_PROMPT when days are generated in parallel
+DAY_PLAN_PROMPT = """
+            Only write day {day} of the {days}-day plan, starting with the heading "## Day {day}".
+            The other days are written separately, so keep this day distinct: build it around
+            {anchors} where they suit the diet type, and avoid repeating the main dishes of
+            the other days ({other_days}).
+            """
+
+# Prompt for a household's coordinated plans, written in one request; each member is one HOUSEHOLD_MEMBER line
+HOUSEHOLD_PLAN_PROMPT = """Create coordinated 7-day meal plans for a household of {count} in {location}
+            (common foods: {region_foods}), with a {budget} budget.
+            
+            Household members:
+            {members}
+            
+            Cook once for the household wherever possible: share base dishes and ingredients across
+            members, and adapt portions, sides and preparation to each member's age, goal, diet type
+            and medical conditions. Never give a member a food their diet type or conditions rule out.
+            
+            Write one complete plan per member, in the order listed. Start each plan with the heading
+            line "=== Member <number>: <name> ===" and nothing else on that line, then format it day by
+            day, with breakfast, lunch, dinner and 1-2 snacks, specific portion sizes and preparation methods.
+            """
+HOUSEHOLD_MEMBER = ("{number}. {name}: {age} years, {gender}, {weight} kg, {height} cm, {activity} activity; "
+                    "diet type {diet_type}; goal {goal}; medical conditions {medical_conditions}; "
+                    "taste preferences {taste_preferences}; dislikes {food_dislikes}{medical_considerations}")
+HOUSEHOLD_MAX_MEMBERS = int(os.getenv('HOUSEHOLD_MAX_MEMBERS', 6))
+
+# "=== Member 2: Sam ===", also when the model wraps it in markdown heading marks or bold
+_MEMBER_HEADING = re.compile(r"^[ \t#*]*={2,}\s*member\s+(\d+)\b[^\n]*$", re.IGNORECASE | re.MULTILINE)
+
+# Days in a meal plan
+PLAN_DAYS = 7
+
+def split_household_plan(text: str, count: int) -> List[str]:
+    """Per-member sections of a household plan, in member order; raises ValueError when one is missing"""
+    headings = list(_MEMBER_HEADING.finditer(text))
+    sections: Dict[int, str] = {}
+    for heading, following in zip(headings, headings[1:] + [None]):
+        number = int(heading.group(1))
+        end = following.start() if following is not None else len(text)
+        # The first section for a number wins should the model repeat a heading
+        sections.setdefault(number, text[heading.end():end].strip())
+    missing = [number for number in range(1, count + 1) if not sections.get(number)]
+    if missing:
+        raise ValueError(f"household plan is missing member(s) {', '.join(map(str, missing))}")
+    return [sections[number] for number in range(1, count + 1)]
+
+# Bump when prompt building changes outside the templates, so cached and library plans are rebuilt
+# 2: medical-condition labels from the forms map to their considerations
+PROMPT_REVISION = 2
+
+def plan_version(nutrition_db: Dict[str, Any]) -> str:
+    """Version tag covering the prompt templates, PROMPT_REVISION and the nutrition database"""
+    fingerprint = (f"{PROMPT_REVISION}\n" + MEAL_PLAN_PROMPT + DAY_PLAN_PROMPT
+                   + json.dumps(nutrition_db, sort_keys=True))
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+class CompletionStream:
+    """Iterable over streamed completion text with timing and a post-stream result
+
+    Iterating starts the upstream request. When the stream ends, ``on_complete``
+    receives the full text and its return value becomes ``result``; on failure
+    ``on_error`` turns the exception into the user-facing ``error`` string.
+    Meal plan streams carry an ``analyzer`` (see PlanAnalyzer) fed with every
+    chunk, for live figures while the stream runs.
+    """
+
+    def __init__(self, open_stream: Callable[[], Iterator[str]],
+                 on_complete: Callable[[str], Any] = None,
+                 on_error: Callable[[Exception], str] = str):
+        self._open_stream = open_stream
+        self._on_complete = on_complete
+        self._on_error = on_error
+        self.analyzer = None
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.time_to_first_token = None
+        self.elapsed = None
+
+    def __iter__(self) -> Iterator[str]:
+        started = time.perf_counter()
+        parts = []
+        try:
+            for chunk in self._open_stream():
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - started
+                parts.append(chunk)
+                yield chunk
+            self.text = "".join(parts)
+            self.result = self._on_complete(self.text) if self._on_complete else self.text
+        except Exception as e:
+            self.text = "".join(parts)
+            self.error = self._on_error(e)
+        finally:
+            self.elapsed = time.perf_counter() - started
+            logger.info("stream finished: ttft=%s elapsed=%.3fs error=%s",
+                        None if self.time_to_first_token is None else round(self.time_to_first_token, 3),
+                        self.elapsed, self.error is not None)
+
+class AsyncCompletionStream:
+    """Async counterpart of CompletionStream for use on an event loop"""
+
+    def __init__(self, open_stream: Callable[[], AsyncIterator[str]],
+                 on_complete: Callable[[str], Awaitable[Any]] = None,
+                 on_error: Callable[[Exception], str] = str):
+        self._open_stream = open_stream
+        self._on_complete = on_complete
+        self._on_error = on_error
+        self.analyzer = None
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.time_to_first_token = None
+        self.elapsed = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        parts = []
+        try:
+            async for chunk in self._open_stream():
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = time.perf_counter() - started
+                parts.append(chunk)
+                yield chunk
+            self.text = "".join(parts)
+            self.result = await self._on_complete(self.text) if self._on_complete else self.text
+        except Exception as e:
+            self.text = "".join(parts)
+            self.error = self._on_error(e)
+        finally:
+            self.elapsed = time.perf_counter() - started
+
+class _SyncStream(CompletionStream):
+    """CompletionStream fed by an AsyncCompletionStream running on the background loop"""
+
+    def __init__(self, source: AsyncCompletionStream, runner: "EventLoopRunner",
+                 is_alive: Callable[[], bool] = None):
+        super().__init__(lambda: runner.iterate(source, is_alive))
+        self._source = source
+        # Fed on the loop as chunks pass through the source; snapshot() is safe from this thread
+        self.analyzer = source.analyzer
+
+    def __iter__(self) -> Iterator[str]:
+        yield from super().__iter__()
+        # The async side owns the outcome: analysis result, error and timings
+        if self.error is None:
+            self.result = self._source.result
+            self.error = self._source.error
+        if self._source.time_to_first_token is not None:
+            self.time_to_first_token = self._source.time_to_first_token
+
+class EventLoopRunner:
+    """Background event loop that lets synchronous callers await coroutines
+
+    Every sync HealthAssistant in the process shares one loop, so all upstream
+    calls multiplex over the same AsyncOpenAI connection pool instead of each
+    pinning a thread for its full duration.
+    """
+
+    # Seconds between liveness checks while a caller waits on a coroutine
+    POLL_INTERVAL = 0.25
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="health-assistant-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Awaitable, is_alive: Callable[[], bool] = None) -> Any:
+        """Run a coroutine on the loop and wait for it, cancelling it if the caller goes away"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            while True:
+                try:
+                    return future.result(timeout=self.POLL_INTERVAL)
+                except concurrent.futures.TimeoutError:
+                    if is_alive is not None and not is_alive():
+                        future.cancel()
+                        raise concurrent.futures.CancelledError("session ended")
+        except BaseException:
+            # Covers the caller being interrupted (e.g. a Streamlit rerun) too
+            future.cancel()
+            raise
+
+    def iterate(self, source: AsyncIterator[str], is_alive: Callable[[], bool] = None) -> Iterator[str]:
+        """Drive an async iterable from synchronous code, one chunk per round trip"""
+        async def step(iterator):
+            return await iterator.__anext__()
+
+        iterator = source.__aiter__()
+        try:
+            while True:
+                try:
+                    yield self.run(step(iterator), is_alive)
+                except StopAsyncIteration:
+                    return
+        finally:
+            if hasattr(iterator, "aclose"):
+                asyncio.run_coroutine_threadsafe(iterator.aclose(), self.loop)
+
+_runner: Optional[EventLoopRunner] = None
+_runner_lock = threading.Lock()
+
+def get_event_loop_runner() -> EventLoopRunner:
+    """Process-wide background loop, started on first use"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = EventLoopRunner()
+        return _runner
+
+class AsyncHealthAssistant:
+    """Asyncio-native assistant; every LLM entry point is a coroutine
+
+    ``rate_limiter``, when given, is any object with a coroutine
+    ``acquire()`` (see batch.RateLimiter); it is awaited before each
+    upstream request, retries and hedges included, so answers from the
+    caches cost nothing.
+    """
+
+    def __init__(self, client: "AsyncOpenAI" = None, reference_data: Dict[str, Any] = None,
+                 plan_cache: PlanCache = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 api_key: str = None, base_url: str = None, router: ModelRouter = None,
+                 chat_cache: SemanticCache = None, plan_library: PlanLibrary = None,
+                 rate_limiter: Any = None):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.api_key = api_key
+        self.base_url = base_url
+        if reference_data is None:
+            reference_data = self.build_reference_data()
+        self.nutrition_db = reference_data["nutrition_db"]
+        self.regional_foods = reference_data["regional_foods"]
+        # Compiled once so every plan is scanned a single time for all foods
+        self.food_names = reference_data["food_names"]
+        self.food_matcher = reference_data["food_matcher"]
+        self.nutrient_table = reference_data["nutrient_table"]
+        self.plan_cache = plan_cache
+        self.chat_cache = chat_cache
+        self.plan_library = plan_library
+        self._library_refreshes: Dict[str, asyncio.Task] = {}
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        # Each task runs on its primary model and falls back to faster tiers; every model has its own breaker
+        self.router = router or ModelRouter.from_env()
+        # Identical in-flight plan and advice requests share one upstream call
+        self.singleflight = SingleFlight()
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._session_tasks: Dict[str, set] = {}
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """Upstream client, created on first use so startup and offline analysis skip openai"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import AsyncOpenAI
+                    self._client = AsyncOpenAI(
+                        base_url=self.base_url or os.getenv('BASE_URL', DEFAULT_BASE_URL),
+                        api_key=self.api_key or os.getenv('API_KEY'),
+                        # Retries, timeouts and backoff are owned by the router's per-model policies
+                        max_retries=0
+                    )
+        return self._client
+
+    def warm_up(self) -> None:
+        """Create the client in a background thread so the first request does not pay for it"""
+        threading.Thread(target=lambda: self.client, name="openai-warm-up", daemon=True).start()
+
+    @classmethod
+    def build_reference_data(cls, global_foods: Dict[str, Dict] = None,
+                             nutrition_db_path: str = None) -> Dict[str, Any]:
+        """Build the read-only nutrition tables and food matcher
+
+        ``global_foods`` replaces the built-in food table. ``nutrition_db_path``
+        (default: the NUTRITION_DB_PATH environment variable) selects an
+        external table instead: a compiled store directory, or a CSV, Parquet
+        or FoodData Central export that is compiled once and memory-mapped.
+        """
+        nutrition_db = cls._load_nutrition_db()
+        nutrition_db_path = nutrition_db_path or os.getenv('NUTRITION_DB_PATH')
+        if global_foods is not None:
+            nutrition_db["global_foods"] = global_foods
+        elif nutrition_db_path:
+            store = open_store(nutrition_db_path)
+            # The foods live in the store; its metadata stands in for them in cache fingerprints
+            del nutrition_db["global_foods"]
+            nutrition_db["food_store"] = store.meta
+            nutrient_table = NutrientTable.from_store(store)
+            return {
+                "nutrition_db": nutrition_db,
+                "regional_foods": cls._load_regional_foods(),
+                "food_names": nutrient_table.names,
+                "food_matcher": FoodMatcher.from_index(store.index, len(store), store.max_words,
+                                                       store.starts, store.prefixes),
+                "nutrient_table": nutrient_table,
+            }
+        nutrient_table = NutrientTable.from_foods(nutrition_db["global_foods"])
+        return {
+            "nutrition_db": nutrition_db,
+            "regional_foods": cls._load_regional_foods(),
+            "food_names": nutrient_table.names,
+            "food_matcher": FoodMatcher.from_names(nutrient_table.names),
+            "nutrient_table": nutrient_table,
+        }
+
+    @staticmethod
+    def _load_nutrition_db() -> Dict:
+        """Load comprehensive nutrition database"""
+        return {
+            "global_foods": {
+                "chicken_breast": {"protein": 31, "carbs": 0, "fat": 3.6, "fiber": 0, "calories": 165, "cost": "medium"},
+                "salmon": {"protein": 20, "carbs": 0, "fat": 13, "fiber": 0, "calories": 208, "cost": "high"},
+                "tofu": {"protein": 8, "carbs": 2, "fat": 4, "fiber": 0.3, "calories": 76, "cost": "low"},
+                "brown_rice": {"protein": 2.6, "carbs": 23, "fat": 0.9, "fiber": 1.8, "calories": 112, "cost": "low"},
+                "quinoa": {"protein": 4.4, "carbs": 21.3, "fat": 1.9, "fiber": 2.8, "calories": 120, "cost": "medium"},
+                "sweet_potato": {"protein": 1.6, "carbs": 20.1, "fat": 0.1, "fiber": 3, "calories": 86, "cost": "low"},
+                "spinach": {"protein": 2.9, "carbs": 3.6, "fat": 0.4, "fiber": 2.2, "calories": 23, "cost": "low"},
+                "chickpeas": {"protein": 8.9, "carbs": 27.4, "fat": 2.6, "fiber": 7.6, "calories": 164, "cost": "low"},
+                "eggs": {"protein": 12.6, "carbs": 0.7, "fat": 9.5, "fiber": 0, "calories": 143, "cost": "low"},
+                "greek_yogurt": {"protein": 10, "carbs": 3.6, "fat": 0.4, "fiber": 0, "calories": 59, "cost": "medium"},
+                "avocado": {"protein": 2, "carbs": 8.5, "fat": 15, "fiber": 6.7, "calories": 160, "cost": "medium"},
+                "almonds": {"protein": 21.2, "carbs": 21.7, "fat": 49.4, "fiber": 12.2, "calories": 579, "cost": "medium"},
+                "oats": {"protein": 13.2, "carbs": 67.7, "fat": 6.9, "fiber": 10.1, "calories": 381, "cost": "low"},
+                "banana": {"protein": 1.1, "carbs": 22.8, "fat": 0.3, "fiber": 2.6, "calories": 89, "cost": "low"},
+                "beef": {"protein": 26.1, "carbs": 0, "fat": 11.8, "fiber": 0, "calories": 217, "cost": "high"},
+                "lentils": {"protein": 9, "carbs": 20, "fat": 0.4, "fiber": 7.9, "calories": 116, "cost": "low"},
+            },
+            "nutrition_goals": {
+                "weight_loss": {"protein": 30, "carbs": 40, "fat": 30, "calories_modifier": -300},
+                "muscle_gain": {"protein": 40, "carbs": 40, "fat": 20, "calories_modifier": 300},
+                "maintenance": {"protein": 30, "carbs": 45, "fat": 25, "calories_modifier": 0},
+                "heart_health": {"protein": 25, "carbs": 50, "fat": 25, "focus": "omega3"},
+                "diabetes_management": {"protein": 30, "carbs": 35, "fat": 35, "focus": "low_GI"},
+                "anti_aging": {"protein": 30, "carbs": 40, "fat": 30, "focus": "antioxidants"},
+                "athletic_performance": {"protein": 35, "carbs": 55, "fat": 10, "focus": "complex_carbs"},
+            },
+            "medical_considerations": {
+                "diabetes": {"avoid": ["refined_sugar", "white_bread"], "prefer": ["low_GI_foods"]},
+                "hypertension": {"avoid": ["excess_sodium"], "prefer": ["potassium_rich_foods"]},
+                "celiac": {"avoid": ["gluten"], "prefer": ["gluten_free_grains"]},
+                "lactose_intolerance": {"avoid": ["dairy"], "prefer": ["plant_based_alternatives"]},
+                "gout": {"avoid": ["red_meat", "seafood"], "prefer": ["plant_proteins"]},
+                "ibs": {"avoid": ["trigger_foods"], "prefer": ["fodmap_friendly_foods"]}
+            }
+        }
+    
+    @staticmethod
+    def _load_regional_foods() -> Dict:
+        """Load regional food availability database"""
+        return {
+            "North America": ["chicken_breast", "beef", "salmon", "sweet_potato", "kale", "quinoa", "almonds"],
+            "South America": ["beans", "corn", "quinoa", "plantains", "cassava", "beef"],
+            "Europe": ["chicken", "pork", "potatoes", "dairy", "rye_bread", "olive_oil"],
+            "East Asia": ["rice", "tofu", "fish", "bok_choy", "seaweed", "mushrooms"],
+            "South Asia": ["lentils", "rice", "chickpeas", "spinach", "yogurt", "chicken"],
+            "Middle East": ["chickpeas", "lamb", "bulgur", "dates", "olive_oil", "yogurt"],
+            "Africa": ["cassava", "plantains", "beans", "fish", "millet", "peanuts"],
+            "Australia/Oceania": ["beef", "lamb", "fish", "sweet_potato", "macadamia_nuts"]
+        }
+
+    def _upstream_slot(self) -> asyncio.Semaphore:
+        """Semaphore bounding concurrent upstream calls on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _track(self, session_id: Optional[str]) -> None:
+        """Register the current task so cancel_session() can reach it"""
+        if session_id is None:
+            return
+        task = asyncio.current_task()
+        tasks = self._session_tasks.setdefault(session_id, set())
+        tasks.add(task)
+
+        def forget(done):
+            tasks.discard(done)
+            if not tasks:
+                self._session_tasks.pop(session_id, None)
+        task.add_done_callback(forget)
+
+    async def _tracked(self, source: AsyncIterator[str], session_id: Optional[str]) -> AsyncIterator[str]:
+        """Re-register the consuming task with the session on every chunk of a shared stream"""
+        self._track(session_id)
+        try:
+            async for chunk in source:
+                yield chunk
+                self._track(session_id)
+        finally:
+            await source.aclose()
+
+    def cancel_session(self, session_id: str) -> int:
+        """Cancel every in-flight call started for a session; returns the number cancelled"""
+        tasks = list(self._session_tasks.get(session_id, ()))
+        for task in tasks:
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        return len(tasks)
+
+    async def _complete(self, messages: List[Dict[str, str]], session_id: str = None,
+                        method: str = "chat", route: Dict[str, Any] = None) -> str:
+        """Single non-streaming completion under the concurrency limit, routed across the task's model tiers
+
+        ``route``, when given, receives the model and tier that answered.
+        """
+        self._track(session_id)
+        # Resolve the lazy client up front so its import never eats into a timeout
+        client = self.client
+        plan = self.router.plan(method)
+        failed = []
+        for position, (tier, model, _) in enumerate(plan):
+            async def attempt(model: str = model) -> str:
+                with metrics.llm_call(method, model) as call:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=messages
+                    )
+                    call.usage = response.usage
+                return response.choices[0].message.content
+
+            try:
+                text = await self.router.resilience(model).call(
+                    method, attempt, slot=self._upstream_slot(), limiter=self.rate_limiter,
+                    observe=lambda seconds, model=model: self.router.observe(method, model, seconds))
+            except Exception as e:
+                if position == len(plan) - 1 or not should_fall_back(e):
+                    raise
+                failed.append((tier, model, "circuit_open" if isinstance(e, CircuitOpenError) else "error"))
+                continue
+            answered = self.router.answered(method, plan, position, failed)
+            if route is not None:
+                route.update(answered)
+            return text
+
+    async def _stream_completion(self, messages: List[Dict[str, str]], session_id: str = None,
+                                 method: str = "chat", route: Dict[str, Any] = None) -> AsyncIterator[str]:
+        """Yield content deltas from a streaming chat completion
+
+        A tier that fails before its first token hands over to the next one;
+        after that the stream is committed to it. ``route`` is filled in as
+        in _complete().
+        """
+        self._track(session_id)
+        options = {"stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {}
+        client = self.client
+        plan = self.router.plan(method)
+        failed = []
+        async with self._upstream_slot():
+            for position, (tier, model, _) in enumerate(plan):
+                answered = None
+                with metrics.llm_call(method, model, streaming=True) as call:
+                    policy = self.router.resilience(model)
+                    chunks = policy.stream(method, lambda model=model: client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        stream=True,
+                        **options
+                    ), limiter=self.rate_limiter,
+                        observe=lambda seconds, model=model: self.router.observe(method, model, seconds))
+                    try:
+                        async for chunk in chunks:
+                            if chunk.usage is not None:
+                                call.usage = chunk.usage
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                call.first_token()
+                                if answered is None:
+                                    answered = self.router.answered(method, plan, position, failed)
+                                    if route is not None:
+                                        route.update(answered)
+                                yield chunk.choices[0].delta.content
+                                # Synchronous consumers resume us from a new task per chunk
+                                self._track(session_id)
+                    except Exception as e:
+                        if answered is not None or position == len(plan) - 1 or not should_fall_back(e):
+                            raise
+                        call.outcome = "error"
+                        failed.append((tier, model, "circuit_open" if isinstance(e, CircuitOpenError) else "error"))
+                        continue
+                    finally:
+                        await chunks.aclose()
+                if answered is None:
+                    answered = self.router.answered(method, plan, position, failed)
+                    if route is not None:
+                        route.update(answered)
+                return
+
+    def _chat_messages(self, history: ChatHistory) -> List[Dict[str, str]]:
+        """System prompt plus as much recent history as the token budget allows"""
+        return [
+            {"role": "system", "content": """You are a nutrition expert chatbot. Provide:
+                    - Personalized meal advice considering location, medical conditions, and taste preferences
+                    - Nutritional facts and calculations
+        - Budget-friendly options
+                    - Cultural food considerations
+                    Be specific, helpful, and consider the user's region when suggesting foods."""},
+            *history.context(CHAT_CONTEXT_TOKENS)
+        ]
+
+    @staticmethod
+    def _chat_error(e: Exception) -> str:
+        """User-facing message for a failed chat request"""
+        error_message = str(e)
+        if "403" in error_message and "resource limit" in error_message:
+            return "⚠️ API usage limit reached. Please update your payment method at https://aimlapi.com/app/billing to continue using the service."
+        return f"Error: {error_message}"
+
+    def _cached_answer(self, message: str, history: ChatHistory) -> Optional[str]:
+        """Answer to a near-identical standalone question, appended to ``history``, or None"""
+        if self.chat_cache is None or not is_standalone(message):
+            return None
+        cached = self.chat_cache.get(message)
+        metrics.record_cache("chat", cached is not None)
+        if cached is None:
+            return None
+        history.append("assistant", cached["answer"], cached=True,
+                       model=cached.get("model"), tier=cached.get("tier"))
+        return cached["answer"]
+
+    def _remember_answer(self, message: str, messages: List[Dict[str, str]], answer: str,
+                         route: Dict[str, Any]) -> None:
+        # Only answers written without earlier turns in the prompt are valid for every user
+        if self.chat_cache is not None and len(messages) == 2 and is_standalone(message):
+            self.chat_cache.put(message, answer, **route)
+
+    async def diet_chatbot(self, message: str, history: ChatHistory, session_id: str = None) -> str:
+        """Interactive diet planning chatbot; appends both turns to ``history``"""
+        history.append("user", message)
+        cached = self._cached_answer(message, history)
+        if cached is not None:
+            return cached
+        
+        try:
+            route = {}
+            messages = self._chat_messages(history)
+            bot_message = await self._complete(messages, session_id, "chat", route)
+            history.append("assistant", bot_message, **route)
+            self._remember_answer(message, messages, bot_message, route)
+            return bot_message
+        except Exception as e:
+            return self._chat_error(e)
+
+    def stream_diet_chatbot(self, message: str, history: ChatHistory,
+                            session_id: str = None) -> AsyncCompletionStream:
+        """Streaming variant of diet_chatbot; the reply joins the history once complete"""
+        history.append("user", message)
+        cached = self._cached_answer(message, history)
+        if cached is not None:
+            async def replay():
+                yield cached
+            return AsyncCompletionStream(replay)
+        messages = self._chat_messages(history)
+        route = {}
+
+        async def on_complete(bot_message: str) -> str:
+            history.append("assistant", bot_message, **route)
+            self._remember_answer(message, messages, bot_message, route)
+            return bot_message
+
+        return AsyncCompletionStream(
+            lambda: self._stream_completion(messages, session_id, "chat", route),
+            on_complete=on_complete,
+            on_error=self._chat_error
+        )
+
+    def _medical_considerations(self, conditions: List[str], indent: str = "") -> str:
+        """One "- For <condition>: Avoid ... Prefer ..." line per condition the nutrition database knows"""
+        lines = ""
+        for condition in conditions or []:
+            # Forms use labels ("Lactose Intolerance"), the database uses keys ("lactose_intolerance")
+            considerations = self.nutrition_db["medical_considerations"].get(condition.lower().replace(" ", "_"))
+            if considerations:
+                avoid = ", ".join(considerations["avoid"])
+                prefer = ", ".join(considerations["prefer"])
+                lines += f"\n{indent}- For {condition}: Avoid {avoid}. Prefer {prefer}."
+        return lines
+
+    def _meal_plan_messages(self, profile: Dict) -> List[Dict[str, str]]:
+        """Prompt adjusted to the user's region, medical conditions and preferences"""
+        region_foods = self.regional_foods.get(profile.get("location", "North America"), [])
+        region_foods_str = ", ".join(region_foods)
+        medical_considerations = self._medical_considerations(profile.get("medical_conditions"))
+        
+        system_prompt = MEAL_PLAN_PROMPT.format(
+            location=profile.get('location', 'Not specified'),
+            region_foods=region_foods_str,
+            age=profile.get('age'),
+            diet_type=profile.get('diet_type'),
+            goal=profile.get('goal'),
+            budget=profile.get('budget', 'Medium'),
+            taste_preferences=profile.get('taste_preferences', 'Not specified'),
+            medical_conditions=', '.join(profile.get('medical_conditions', ['None'])),
+            medical_considerations=medical_considerations
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": json.dumps(profile)}
+        ]
+
+    def plan_analyzer(self) -> PlanAnalyzer:
+        """Incremental analyzer for a plan that is still streaming"""
+        return PlanAnalyzer(self.food_matcher, self.nutrient_table)
+
+    async def _analyzed(self, source: AsyncIterator[str], analyzer: PlanAnalyzer) -> AsyncIterator[str]:
+        """Feed every chunk of ``source`` to ``analyzer`` on its way through"""
+        try:
+            async for chunk in source:
+                analyzer.feed(chunk)
+                yield chunk
+        finally:
+            await source.aclose()
+
+    def _analyze_plan(self, profile: Dict, meal_plan: str, food_counts: np.ndarray = None) -> Dict:
+        """{"plan", "nutrition", "cost"} for a finished plan
+
+        ``food_counts`` from a PlanAnalyzer that saw the whole stream saves the scan.
+        """
+        if food_counts is None:
+            # Calculate estimated nutrition facts from a single scan of the plan
+            with metrics.timed("count_foods", plan_chars=len(meal_plan)):
+                food_counts = self._count_foods(meal_plan)
+        with metrics.timed("nutrition"):
+            nutrition = self._analyze_meal_plan(meal_plan, profile.get("goal", "maintenance"), food_counts)
+        with metrics.timed("cost"):
+            cost = self._estimate_cost(meal_plan, food_counts)
+    
+        return {
+            "plan": meal_plan,
+            "nutrition": nutrition,
+            "cost": cost
+        }
+
+    def _build_plan_result(self, profile: Dict, meal_plan: str, route: Dict[str, Any] = None,
+                           food_counts: np.ndarray = None) -> Dict:
+        """Analyze a finished plan and store it in the plan cache"""
+        result = self._analyze_plan(profile, meal_plan, food_counts)
+        if route:
+            result["route"] = route
+        if self.plan_cache is not None:
+            self.plan_cache.put(profile, result)
+        return result
+
+    async def _finish_plan(self, profile: Dict, meal_plan: str, route: Dict[str, Any] = None,
+                           analyzer: PlanAnalyzer = None) -> Dict:
+        """Run the remaining analysis and the cache write off the event loop"""
+        food_counts = analyzer.close() if analyzer is not None else None
+        return await asyncio.to_thread(self._build_plan_result, profile, meal_plan, route, food_counts)
+
+    @staticmethod
+    def _days_route(routes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One route for a plan written day by day: the furthest fallback tier any day used, plus each day's"""
+        routes = [route for route in routes if route]
+        if not routes:
+            return {}
+        worst = max(routes, key=lambda route: route["tier"])
+        return {**worst, "days": routes}
+
+    def _cached_plan(self, profile: Dict) -> Dict:
+        """Cached result for the profile, or None"""
+        if self.plan_cache is not None:
+            cached = self.plan_cache.get(profile)
+            metrics.record_cache("meal_plan", cached is not None)
+            if cached is not None:
+                return {**cached, "cached": True}
+        return None
+
+    def _library_plan(self, profile: Dict) -> Optional[tuple]:
+        """(bucket, result, stale) from the pre-generated library when the profile has no free text"""
+        bucket = bucket_of(profile) if self.plan_library is not None else None
+        if bucket is None:
+            return None
+        entry = self.plan_library.get(bucket)
+        metrics.record_cache("plan_library", entry is not None)
+        if entry is None:
+            return None
+        result, stale = entry
+        return bucket, {**result, "library": True, "stale": stale}, stale
+
+    def _refresh_later(self, bucket: Dict[str, Any]) -> None:
+        """Regenerate a stale library plan in the background, once at a time per bucket"""
+        key = self.plan_library.key(bucket)
+        if key in self._library_refreshes:
+            return
+        task = asyncio.ensure_future(self.refresh_library_plan(bucket))
+        self._library_refreshes[key] = task
+
+        def done(task: asyncio.Task) -> None:
+            self._library_refreshes.pop(key, None)
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning("refreshing library plan for %s failed: %s", bucket, task.exception())
+        task.add_done_callback(done)
+
+    async def refresh_library_plan(self, bucket: Dict[str, Any]) -> Dict:
+        """Generate, analyze and store the library plan for a bucket"""
+        profile = bucket_profile(bucket)
+
+        async def generate() -> Dict:
+            route = {}
+            meal_plan = await self._complete(self._meal_plan_messages(profile), None, "meal_plan", route)
+            result = await self._finish_plan(profile, meal_plan, route)
+            await asyncio.to_thread(self.plan_library.put, bucket, result)
+            return result
+
+        return await self.singleflight.do("plan_library", self.plan_library.key(bucket), generate)
+
+    def _day_messages(self, profile: Dict, day: int) -> List[Dict[str, str]]:
+        """Meal plan prompt narrowed to one day, with a rotation that keeps days distinct"""
+        messages = self._meal_plan_messages(profile)
+        region_foods = self.regional_foods.get(profile.get("location", "North America"), []) or self.food_names
+        anchors = [region_foods[(day - 1 + offset) % len(region_foods)] for offset in range(0, PLAN_DAYS, 3)]
+        other_days = "; ".join(
+            f"day {other}: {region_foods[(other - 1) % len(region_foods)]}"
+            for other in range(1, PLAN_DAYS + 1) if other != day
+        )
+        messages[0]["content"] += DAY_PLAN_PROMPT.format(
+            day=day,
+            days=PLAN_DAYS,
+            anchors=", ".join(dict.fromkeys(anchors)),
+            other_days=other_days
+        )
+        return messages
+
+    async def _generate_day(self, profile: Dict, day: int, session_id: str = None,
+                            route: Dict[str, Any] = None) -> str:
+        """Generate one day; retries are the router's, per day, so a failed day never reruns the others"""
+        messages = self._day_messages(profile, day)
+        text = (await self._complete(messages, session_id, "meal_plan_day", route)).strip()
+        if not text.lower().startswith(f"## day {day}"):
+            text = f"## Day {day}\n\n{text}"
+        return text
+
+    async def _stream_days(self, profile: Dict, session_id: str = None,
+                           routes: List[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Run every day concurrently and yield them in order as they become available
+
+        ``routes``, when given, receives the route of each day in day order.
+        """
+        self._track(session_id)
+        day_routes = [{} for _ in range(PLAN_DAYS)]
+        if routes is not None:
+            routes[:] = day_routes
+        tasks = [
+            asyncio.ensure_future(self._generate_day(profile, day, session_id, day_routes[day - 1]))
+            for day in range(1, PLAN_DAYS + 1)
+        ]
+        try:
+            for day, task in enumerate(tasks, start=1):
+                text = await task
+                yield text if day == 1 else "\n\n" + text
+                self._track(session_id)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_meal_plan(self, profile: Dict, session_id: str = None,
+                                 parallel_days: bool = False) -> Dict:
+        """Generate meal plan with nutrition analysis
+
+        With ``parallel_days`` the seven days are requested concurrently and
+        merged, so latency is roughly that of the slowest single day.
+        """
+        # Both lookups may read SQLite, and the library records demand; keep that disk I/O off the loop
+        cached = await asyncio.to_thread(self._cached_plan, profile)
+        if cached is not None:
+            return cached
+        library = await asyncio.to_thread(self._library_plan, profile)
+        if library is not None:
+            bucket, result, stale = library
+            if stale:
+                self._refresh_later(bucket)
+            return result
+        # The shared call belongs to no session; this caller waits on it from its own task
+        self._track(session_id)
+
+        async def generate() -> Dict:
+            if parallel_days:
+                # Days are analyzed as they arrive, while the later ones are still being written
+                routes = []
+                analyzer = self.plan_analyzer()
+                days = self._analyzed(self._stream_days(profile, routes=routes), analyzer)
+                meal_plan = "".join([chunk async for chunk in days])
+                return await self._finish_plan(profile, meal_plan, self._days_route(routes), analyzer)
+            route = {}
+            meal_plan = await self._complete(self._meal_plan_messages(profile), None, "meal_plan", route)
+            return await self._finish_plan(profile, meal_plan, route)
+
+        try:
+            return await self.singleflight.do("meal_plan", self._plan_flight_key(profile, parallel_days), generate)
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _plan_flight_key(profile: Dict, parallel_days: bool) -> str:
+        return profile_key(profile, namespace="meal_plan:days:" if parallel_days else "meal_plan:whole:")
+
+    def stream_meal_plan(self, profile: Dict, session_id: str = None,
+                         parallel_days: bool = False) -> AsyncCompletionStream:
+        """Streaming variant of generate_meal_plan
+
+        The plan is analyzed chunk by chunk as it streams, so the result is
+        ready with the last token, and the returned stream's ``analyzer``
+        gives live totals in the meantime. The cache and library lookups run
+        on the calling thread, which for the HealthAssistant facade is the
+        session's own thread rather than the event loop.
+        """
+        cached = self._cached_plan(profile)
+        if cached is not None:
+            async def replay():
+                yield cached["plan"]
+
+            async def keep(plan: str) -> Dict:
+                return cached
+            return AsyncCompletionStream(replay, on_complete=keep)
+        library = self._library_plan(profile)
+        if library is not None:
+            bucket, result, stale = library
+
+            async def replay_library():
+                if stale:
+                    self._refresh_later(bucket)
+                yield result["plan"]
+
+            async def keep_library(plan: str) -> Dict:
+                return result
+            return AsyncCompletionStream(replay_library, on_complete=keep_library)
+        # Only the flight's own analyzer feeds the shared result; each subscriber keeps a live one
+        analyzer = self.plan_analyzer()
+        if parallel_days:
+            routes = []
+            open_stream = lambda: self._analyzed(self._stream_days(profile, routes=routes), analyzer)
+            finish = lambda plan: self._finish_plan(profile, plan, self._days_route(routes), analyzer)
+        else:
+            messages = self._meal_plan_messages(profile)
+            route = {}
+            open_stream = lambda: self._analyzed(self._stream_completion(messages, None, "meal_plan", route), analyzer)
+            finish = lambda plan: self._finish_plan(profile, plan, route, analyzer)
+        shared = self.singleflight.stream(
+            "meal_plan",
+            self._plan_flight_key(profile, parallel_days),
+            open_stream,
+            on_complete=finish
+        )
+        live = self.plan_analyzer()
+        stream = AsyncCompletionStream(
+            lambda: self._analyzed(self._tracked(shared.chunks(), session_id), live),
+            on_complete=shared.result
+        )
+        stream.analyzer = live
+        return stream
+
+    def _household_members(self, household: Dict) -> List[Dict]:
+        """Each member's full planner profile, with the household's location and budget"""
+        members = household.get("members")
+        if not isinstance(members, list) or not members or not all(isinstance(m, dict) for m in members):
+            raise ValueError("a household needs a list of member profiles")
+        if len(members) > HOUSEHOLD_MAX_MEMBERS:
+            raise ValueError(f"a household has at most {HOUSEHOLD_MAX_MEMBERS} members")
+        shared = {"location": household.get("location", "North America"), "budget": household.get("budget", "Medium")}
+        return [{**member, **shared, "name": str(member.get("name") or f"Member {number}")}
+                for number, member in enumerate(members, start=1)]
+
+    def _household_messages(self, members: List[Dict]) -> List[Dict[str, str]]:
+        """One prompt covering every member, so the household shares a single upstream call"""
+        location = members[0]["location"]
+        lines = [
+            HOUSEHOLD_MEMBER.format(
+                number=number,
+                name=member["name"],
+                age=member.get('age'),
+                gender=member.get('gender', 'Not specified'),
+                weight=member.get('weight'),
+                height=member.get('height'),
+                activity=member.get('activity', 'Moderate'),
+                diet_type=member.get('diet_type'),
+                goal=member.get('goal'),
+                medical_conditions=', '.join(member.get('medical_conditions') or ['None']),
+                taste_preferences=member.get('taste_preferences') or 'Not specified',
+                food_dislikes=member.get('food_dislikes') or 'None',
+                medical_considerations=self._medical_considerations(member.get("medical_conditions"), " " * 16)
+            )
+            for number, member in enumerate(members, start=1)
+        ]
+        system_prompt = HOUSEHOLD_PLAN_PROMPT.format(
+            count=len(members),
+            location=location,
+            region_foods=", ".join(self.regional_foods.get(location, [])),
+            budget=members[0]["budget"],
+            members="\n            ".join(lines)
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": json.dumps(members)}
+        ]
+
+    def _build_household_result(self, members: List[Dict], text: str, route: Dict[str, Any]) -> Dict:
+        sections = split_household_plan(text, len(members))
+        result = {"members": [{"name": member["name"], **self._analyze_plan(member, section)}
+                              for member, section in zip(members, sections)]}
+        if route:
+            result["route"] = route
+        return result
+
+    async def generate_household_plan(self, household: Dict, session_id: str = None) -> Dict:
+        """Coordinated plans for every member of a household from one upstream call
+
+        ``household`` holds the shared "location" and "budget" and a list of
+        member profiles under "members". The reply is split back into one
+        {"name", "plan", "nutrition", "cost"} result per member, in order.
+        """
+        try:
+            members = self._household_members(household)
+        except ValueError as e:
+            return {"error": str(e)}
+        self._track(session_id)
+
+        async def generate() -> Dict:
+            route = {}
+            text = await self._complete(self._household_messages(members), None, "household", route)
+            return await asyncio.to_thread(self._build_household_result, members, text, route)
+
+        try:
+            # Keyed by position: list order is canonicalized away, but here it decides who gets which plan
+            key = profile_key({str(number): member for number, member in enumerate(members)}, namespace="household:")
+            return await self.singleflight.do("household", key, generate)
+        except Exception as e:
+            return {"error": str(e)}
+
+    def _count_foods(self, meal_plan: str) -> List[int]:
+        """Count occurrences of every known food, indexed like self.food_names"""
+        return self.food_matcher.count(meal_plan)
+
+    def _analyze_meal_plan(self, meal_plan: str, goal: str = "maintenance",
+                           food_counts: List[int] = None) -> Dict[str, Any]:
+        """Calculate detailed nutrition facts for the meal plan"""
+        if food_counts is None:
+            food_counts = self._count_foods(meal_plan)
+        # Count vector x nutrient matrix gives the plan totals in one product
+        totals = self.nutrient_table.totals(food_counts)
+        nutrients = {name: float(total) for name, total in zip(NUTRIENTS, totals)}
+        nutrients["estimated_daily"] = {
+            "protein": 0, "carbs": 0, "fat": 0, "fiber": 0, "calories": 0
+        }
+        
+        # Calculate daily estimates (assuming 7-day plan)
+        if "day" in meal_plan.lower():
+            days = 7
+        else:
+            days = 1
+            
+        for key in nutrients["estimated_daily"]:
+            if key != "calories" and days > 0:
+                nutrients["estimated_daily"][key] = round(nutrients[key] / days, 1)
+        
+        # Adjust based on goal
+        goal_data = self.nutrition_db["nutrition_goals"].get(goal.lower().replace(" ", "_"), 
+                                                          {"calories_modifier": 0})
+        base_calories = 2000  # Default base
+        if days > 0:
+            nutrients["estimated_daily"]["calories"] = round((nutrients["calories"] / days) + 
+                                                         goal_data.get("calories_modifier", 0), 0)
+        
+        # Add goal alignment data
+        nutrients["goal_alignment"] = self._calculate_goal_alignment(nutrients["estimated_daily"], goal)
+        
+        return nutrients
+
+    def analyze_meal_plans(self, meal_plans: List[str], goals: Any = "maintenance") -> Dict[str, Any]:
+        """Vectorized nutrition analysis for a batch of plans
+
+        ``goals`` is one goal for every plan or a list aligned with ``meal_plans``.
+        Returns plans x nutrients arrays (columns ordered like ``nutrients``) for
+        the totals and the daily estimates, rounded as in _analyze_meal_plan.
+        """
+        if isinstance(goals, str):
+            goals = [goals] * len(meal_plans)
+        with metrics.timed("batch_count_foods", plans=len(meal_plans)):
+            counts = np.array([self._count_foods(plan) for plan in meal_plans], dtype=np.float64)
+        counts = counts.reshape(len(meal_plans), len(self.nutrient_table))
+        totals = self.nutrient_table.batch_totals(counts)
+
+        days = np.array([7.0 if "day" in plan.lower() else 1.0 for plan in meal_plans])
+        goal_table = self.nutrition_db["nutrition_goals"]
+        modifiers = np.array([
+            goal_table.get(goal.lower().replace(" ", "_"), {}).get("calories_modifier", 0)
+            for goal in goals
+        ], dtype=np.float64)
+
+        daily = totals / days[:, None]
+        calories = NUTRIENTS.index("calories")
+        daily_calories = np.round(daily[:, calories] + modifiers, 0)
+        daily = np.round(daily, 1)
+        daily[:, calories] = daily_calories
+        return {
+            "nutrients": NUTRIENTS,
+            "totals": totals,
+            "estimated_daily": daily,
+            "days": days,
+            "food_counts": counts,
+        }
+
+    def _calculate_goal_alignment(self, daily_nutrients: Dict[str, float], goal: str) -> Dict[str, Any]:
+        """Calculate how well the meal plan aligns with the nutrition goal"""
+        goal_key = goal.lower().replace(" ", "_")
+        if goal_key in self.nutrition_db["nutrition_goals"]:
+            goal_data = self.nutrition_db["nutrition_goals"][goal_key]
+            
+            # Calculate macronutrient percentages from the meal plan
+            total_calories = daily_nutrients["calories"]
+            if total_calories > 0:
+                protein_pct = (daily_nutrients["protein"] * 4 / total_calories) * 100
+                carbs_pct = (daily_nutrients["carbs"] * 4 / total_calories) * 100
+                fat_pct = (daily_nutrients["fat"] * 9 / total_calories) * 100
+                
+                # Calculate alignment scores (0-100%)
+                protein_alignment = float(100 - min(abs(protein_pct - goal_data["protein"]) * 2, 100))
+                carbs_alignment = float(100 - min(abs(carbs_pct - goal_data["carbs"]) * 2, 100))
+                fat_alignment = float(100 - min(abs(fat_pct - goal_data["fat"]) * 2, 100))
+                
+                overall_alignment = float((protein_alignment + carbs_alignment + fat_alignment) / 3)
+                
+                return {
+                    "protein_alignment": round(protein_alignment, 1),
+                    "carbs_alignment": round(carbs_alignment, 1),
+                    "fat_alignment": round(fat_alignment, 1),
+                    "overall_alignment": round(overall_alignment, 1),
+                    "macros_actual": {
+                        "protein": round(protein_pct, 1),
+                        "carbs": round(carbs_pct, 1),
+                        "fat": round(fat_pct, 1)
+                    },
+                    "macros_target": {
+                        "protein": goal_data["protein"],
+                        "carbs": goal_data["carbs"],
+                        "fat": goal_data["fat"]
+                    }
+                }
+        
+        # Default return if goal not found
+        return {"overall_alignment": "N/A"}
+
+    def _estimate_cost(self, meal_plan: str, food_counts: List[int] = None) -> Dict[str, Any]:
+        """Estimate cost category and breakdown"""
+        if food_counts is None:
+            food_counts = self._count_foods(meal_plan)
+        cost_breakdown = dict(zip(COST_TIERS, self.nutrient_table.cost_counts(food_counts)))
+        
+        total = sum(cost_breakdown.values())
+        if not total:
+            return {"category": "Unknown", "breakdown": cost_breakdown}
+        
+        avg = (cost_breakdown["low"] + 2 * cost_breakdown["medium"] + 3 * cost_breakdown["high"]) / total
+        category = ["Low", "Medium", "High"][int(avg)-1]
+        percentage_breakdown = {
+            k: round((v / total) * 100, 1) for k, v in cost_breakdown.items()
+        }
+            
+        return {
+            "category": category,
+            "breakdown": cost_breakdown,
+            "percentages": percentage_breakdown
+        }
+        
+    def _advice_messages(self, module: str, profile: Dict) -> List[Dict[str, str]]:
+        """Prompt for a specialized health module"""
+        module_prompts = {
+            "Women's Health": f"Provide personalized women's health advice for a {profile.get('age')}-year-old with cycle length {profile.get('cycle')} days, pregnancy status: {profile.get('pregnancy')}. Address these concerns: {profile.get('concerns')}",
+            "Child Health": f"Provide pediatric health advice for a {profile.get('age')}-year-old child weighing {profile.get('weight')}kg with these concerns: {profile.get('concerns')}",
+            "Elderly Health": f"Provide geriatric health advice for a {profile.get('age')}-year-old with these health conditions: {profile.get('conditions')} and concerns: {profile.get('concerns')}"
+        }
+        return [
+            {"role": "system", "content": module_prompts.get(module, "Provide health advice")},
+            {"role": "user", "content": json.dumps(profile)}
+        ]
+
+    async def get_specialized_advice(self, module: str, profile: Dict, session_id: str = None) -> str:
+        """Get specialized health advice based on module"""
+        self._track(session_id)
+        messages = self._advice_messages(module, profile)
+        try:
+            return await self.singleflight.do(
+                "advice",
+                profile_key(profile, namespace=f"advice:{module}:"),
+                lambda: self._complete(messages, None, "advice")
+            )
+        except Exception as e:
+            return f"Error generating advice: {str(e)}"
+
+    def stream_specialized_advice(self, module: str, profile: Dict, session_id: str = None) -> AsyncCompletionStream:
+        """Streaming variant of get_specialized_advice"""
+        messages = self._advice_messages(module, profile)
+        shared = self.singleflight.stream(
+            "advice",
+            profile_key(profile, namespace=f"advice:{module}:"),
+            lambda: self._stream_completion(messages, None, "advice")
+        )
+        return AsyncCompletionStream(
+            lambda: self._tracked(shared.chunks(), session_id),
+            on_error=lambda e: f"Error generating advice: {str(e)}"
+        )
+
+class HealthAssistant:
+    """Synchronous facade over AsyncHealthAssistant
+
+    Calls are scheduled on the shared background loop. A facade bound to a
+    session through for_session() cancels its in-flight calls as soon as
+    ``is_alive`` reports that the session has gone away.
+    """
+
+    def __init__(self, client: "AsyncOpenAI" = None, reference_data: Dict[str, Any] = None,
+                 plan_cache: PlanCache = None, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 api_key: str = None, base_url: str = None, chat_cache: SemanticCache = None,
+                 plan_library: PlanLibrary = None,
+                 async_assistant: AsyncHealthAssistant = None, runner: EventLoopRunner = None):
+        self.async_assistant = async_assistant or AsyncHealthAssistant(
+            client=client,
+            reference_data=reference_data,
+            plan_cache=plan_cache,
+            max_concurrency=max_concurrency,
+            api_key=api_key,
+            base_url=base_url,
+            chat_cache=chat_cache,
+            plan_library=plan_library
+        )
+        self.runner = runner or get_event_loop_runner()
+        self.session_id = None
+        self.is_alive = None
+
+    build_reference_data = staticmethod(AsyncHealthAssistant.build_reference_data)
+
+    def __getattr__(self, name: str) -> Any:
+        # Data tables and analysis helpers live on the async assistant
+        if name == "async_assistant":
+            raise AttributeError(name)
+        return getattr(self.async_assistant, name)
+
+    def for_session(self, session_id: str, is_alive: Callable[[], bool] = None) -> "HealthAssistant":
+        """Lightweight view sharing this assistant, bound to one user session"""
+        bound = HealthAssistant(async_assistant=self.async_assistant, runner=self.runner)
+        bound.session_id = session_id
+        bound.is_alive = is_alive
+        return bound
+
+    def _run(self, coro: Awaitable) -> Any:
+        try:
+            return self.runner.run(coro, self.is_alive)
+        except concurrent.futures.CancelledError:
+            if self.session_id is not None:
+                self.async_assistant.cancel_session(self.session_id)
+            raise
+
+    def _wrap(self, stream: AsyncCompletionStream) -> CompletionStream:
+        """Expose an async stream to synchronous consumers"""
+        return _SyncStream(stream, self.runner, self.is_alive)
+
+    def diet_chatbot(self, message: str, history: ChatHistory) -> str:
+        """Interactive diet planning chatbot"""
+        return self._run(self.async_assistant.diet_chatbot(message, history, self.session_id))
+
+    def stream_diet_chatbot(self, message: str, history: ChatHistory) -> CompletionStream:
+        """Streaming variant of diet_chatbot"""
+        return self._wrap(self.async_assistant.stream_diet_chatbot(message, history, self.session_id))
+
+    def generate_meal_plan(self, profile: Dict, parallel_days: bool = False) -> Dict:
+        """Generate meal plan with nutrition analysis"""
+        return self._run(self.async_assistant.generate_meal_plan(profile, self.session_id, parallel_days))
+
+    def stream_meal_plan(self, profile: Dict, parallel_days: bool = False) -> CompletionStream:
+        """Streaming variant of generate_meal_plan"""
+        return self._wrap(self.async_assistant.stream_meal_plan(profile, self.session_id, parallel_days))
+
+    def generate_household_plan(self, household: Dict) -> Dict:
+        """Coordinated plans for every member of a household from one upstream call"""
+        return self._run(self.async_assistant.generate_household_plan(household, self.session_id))
+
+    def get_specialized_advice(self, module: str, profile: Dict) -> str:
+        """Get specialized health advice based on module"""
+        return self._run(self.async_assistant.get_specialized_advice(module, profile, self.session_id))
+
+    def stream_specialized_advice(self, module: str, profile: Dict) -> CompletionStream:
+        """Streaming variant of get_specialized_advice"""
+        return self._wrap(self.async_assistant.stream_specialized_advice(module, profile, self.session_id))
@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Tuple, Iterator, Optional, Sequence
+
+logger = logging.getLogger("diet_planner.metrics")
+
+# Latency buckets in seconds: sub-millisecond analysis up to multi-minute o1 calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in sorted(self.values.items())]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": dict(key), "value": value} for key, value in sorted(self.values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, Prometheus style"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Labels, Dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', f'{bound:g}'),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": dict(key), "count": series["count"], "sum": series["sum"],
+                 "buckets": dict(zip((f"{b:g}" for b in self.buckets), series["counts"]))}
+                for key, series in sorted(self.values.items())]
+
+
+class MetricsRegistry:
+    """Named counters and histograms, exportable as Prometheus text or a JSON snapshot"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+
+    def _get(self, cls, name: str, help: str, **kwargs) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def inc(self, name: str, amount: float = 1, **labels: Any) -> None:
+        metric = self.counter(name)
+        with self._lock:
+            metric.inc(amount, **labels)
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: Any) -> None:
+        metric = self.histogram(name, buckets=buckets)
+        with self._lock:
+            metric.observe(value, **labels)
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, metric in sorted(self._metrics.items()):
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: {"type": metric.kind, "series": metric.snapshot()}
+                    for name, metric in sorted(self._metrics.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+
+# Process-wide registry shared by every assistant and session
+REGISTRY = MetricsRegistry()
+REGISTRY.histogram("llm_request_seconds", "Wall time of upstream LLM calls")
+REGISTRY.histogram("llm_time_to_first_token_seconds", "Time to the first streamed token")
+REGISTRY.counter("llm_requests_total", "Upstream LLM calls by outcome")
+REGISTRY.counter("llm_tokens_total", "Tokens reported by the upstream, by kind")
+REGISTRY.histogram("llm_completion_tokens", "Completion tokens per call", buckets=TOKEN_BUCKETS)
+REGISTRY.histogram("analysis_seconds", "Wall time of meal plan analysis steps")
+REGISTRY.counter("cache_requests_total", "Cache lookups by cache and result")
+
+
+def log_event(event: str, **fields: Any) -> None:
+    """One structured JSON log line"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str))
+
+
+class LLMCall:
+    """Mutable record of one upstream call; filled in by the caller, emitted by llm_call()"""
+
+    def __init__(self, method: str, model: str, streaming: bool):
+        self.method = method
+        self.model = model
+        self.streaming = streaming
+        self.started = time.perf_counter()
+        self.time_to_first_token: Optional[float] = None
+        self.usage: Any = None
+        self.outcome = "ok"
+
+    def first_token(self) -> None:
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+    def tokens(self) -> Dict[str, int]:
+        """Prompt, completion and reasoning tokens from an OpenAI usage object"""
+        usage = self.usage
+        if usage is None:
+            return {}
+        details = getattr(usage, "completion_tokens_details", None)
+        return {
+            "prompt": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion": getattr(usage, "completion_tokens", 0) or 0,
+            "reasoning": (getattr(details, "reasoning_tokens", 0) or 0) if details is not None else 0,
+        }
+
+
+def record_llm_call(call: LLMCall, registry: MetricsRegistry = REGISTRY) -> None:
+    wall = time.perf_counter() - call.started
+    labels = {"method": call.method, "model": call.model}
+    registry.observe("llm_request_seconds", wall, outcome=call.outcome, **labels)
+    registry.inc("llm_requests_total", outcome=call.outcome, **labels)
+    if call.time_to_first_token is not None:
+        registry.observe("llm_time_to_first_token_seconds", call.time_to_first_token, **labels)
+    tokens = call.tokens()
+    for kind, count in tokens.items():
+        if count:
+            registry.inc("llm_tokens_total", count, kind=kind, **labels)
+    if tokens:
+        registry.observe("llm_completion_tokens", tokens["completion"], buckets=TOKEN_BUCKETS, **labels)
+    log_event("llm_call", method=call.method, model=call.model, streaming=call.streaming,
+              outcome=call.outcome, wall_seconds=round(wall, 4),
+              ttft_seconds=None if call.time_to_first_token is None else round(call.time_to_first_token, 4),
+              tokens=tokens or None)
+
+
+@contextmanager
+def llm_call(method: str, model: str, streaming: bool = False,
+             registry: MetricsRegistry = REGISTRY) -> Iterator[LLMCall]:
+    """Time an upstream call; the outcome becomes "error" or "cancelled" if the block raises"""
+    call = LLMCall(method, model, streaming)
+    try:
+        yield call
+    except (GeneratorExit, KeyboardInterrupt):
+        call.outcome = "cancelled"
+        raise
+    except BaseException as e:
+        call.outcome = "cancelled" if type(e).__name__ == "CancelledError" else "error"
+        raise
+    finally:
+        record_llm_call(call, registry)
+
+
+@contextmanager
+def timed(step: str, registry: MetricsRegistry = REGISTRY, **fields: Any) -> Iterator[None]:
+    """Record the wall time of an analysis step"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("analysis_seconds", elapsed, step=step)
+        log_event("analysis_step", step=step, wall_seconds=round(elapsed, 6), **fields)
+
+
+def record_cache(cache: str, hit: bool, registry: MetricsRegistry = REGISTRY) -> None:
+    registry.inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+    log_event("cache_lookup", cache=cache, result="hit" if hit else "miss")
+
+
+def configure_json_log(target: str) -> None:
+    """Send the structured events to ``target`` ("-" for stderr, otherwise a file path)"""
+    handler = logging.StreamHandler() if target == "-" else logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0",
+                         registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /metrics.json from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path == "/metrics":
+                body, content_type = registry.prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# Opt-in JSON event log, e.g. METRICS_LOG=- for stderr or METRICS_LOG=metrics.jsonl
+if os.getenv("METRICS_LOG"):
+    configure_json_log(os.getenv("METRICS_LOG"))
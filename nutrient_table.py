@@ -0,0 +1,57 @@
+from typing import Dict, List, Mapping, Sequence
+import numpy as np
+
+# Column order of NutrientTable.matrix
+NUTRIENTS = ("protein", "carbs", "fat", "fiber", "calories")
+# Cost tier codes stored in NutrientTable.cost_tiers
+COST_TIERS = ("low", "medium", "high")
+
+
+class NutrientTable:
+    """Foods x nutrients float matrix with a name-to-row index and per-food cost tier
+
+    The arrays may be read-only memory maps (see nutrition_store); nothing
+    here copies or writes them.
+    """
+
+    def __init__(self, names: Sequence[str], matrix: np.ndarray, cost_tiers: np.ndarray,
+                 index: Mapping[str, int] = None):
+        self.names = names if index is not None else list(names)
+        self.index = index if index is not None else {name: row for row, name in enumerate(self.names)}
+        self.matrix = matrix
+        self.cost_tiers = cost_tiers
+
+    @classmethod
+    def from_foods(cls, foods: Dict[str, Dict]) -> "NutrientTable":
+        """Build the table from the ``global_foods`` dict-of-dicts layout"""
+        names = list(foods)
+        matrix = np.array(
+            [[float(foods[name].get(nutrient, 0)) for nutrient in NUTRIENTS] for name in names],
+            dtype=np.float64
+        ).reshape(len(names), len(NUTRIENTS))
+        cost_tiers = np.array(
+            [COST_TIERS.index(foods[name].get("cost", "medium")) for name in names],
+            dtype=np.int8
+        )
+        return cls(names, matrix, cost_tiers)
+
+    @classmethod
+    def from_store(cls, store) -> "NutrientTable":
+        """Wrap a memory-mapped NutritionStore without materializing it"""
+        return cls(store.names, store.matrix, store.cost_tiers, index=store.index)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def totals(self, counts: Sequence[int]) -> np.ndarray:
+        """Nutrient totals for one count vector, ordered like NUTRIENTS"""
+        return np.asarray(counts, dtype=np.float64) @ self.matrix
+
+    def batch_totals(self, counts: np.ndarray) -> np.ndarray:
+        """Nutrient totals for a plans x foods count matrix"""
+        return np.asarray(counts, dtype=np.float64) @ self.matrix
+
+    def cost_counts(self, counts: Sequence[int]) -> List[int]:
+        """Occurrences per cost tier, ordered like COST_TIERS"""
+        weights = np.asarray(counts, dtype=np.int64)
+        return [int(v) for v in np.bincount(self.cost_tiers, weights=weights, minlength=len(COST_TIERS))]
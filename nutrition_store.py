@@ -0,0 +1,365 @@
+import os
+import csv
+import json
+import zlib
+import shutil
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from collections.abc import Sequence as SequenceABC
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Tuple
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: open mapped files cannot be replaced there anyway
+    fcntl = None
+from nutrient_table import NUTRIENTS, COST_TIERS
+from food_matcher import food_key
+
+# Bump when the on-disk layout changes; stores with another version are recompiled
+FORMAT_VERSION = 3
+
+# Wide-layout column names accepted for each nutrient, including USDA SR Legacy headers
+NUTRIENT_COLUMNS = {
+    "protein": ("protein", "protein_g", "protein (g)"),
+    "carbs": ("carbs", "carbohydrate", "carbohydrates", "carbohydrate_g",
+              "carbohydrate, by difference (g)"),
+    "fat": ("fat", "total_fat", "fat_g", "total lipid (fat) (g)"),
+    "fiber": ("fiber", "fibre", "fiber_g", "fiber, total dietary (g)"),
+    "calories": ("calories", "energy", "energy_kcal", "kcal", "energy (kcal)"),
+}
+NAME_COLUMNS = ("name", "food", "food_name", "description", "shrt_desc", "long_desc")
+COST_COLUMNS = ("cost", "cost_tier", "price_tier")
+
+# FoodData Central nutrient ids (food_nutrient.csv long layout); 2047 is the Atwater energy fallback
+FDC_NUTRIENT_IDS = {"1003": "protein", "1005": "carbs", "1004": "fat", "1079": "fiber",
+                    "1008": "calories", "2047": "calories"}
+
+
+def normalize_name(name: str) -> str:
+    """Canonical food key, the same normalization FoodMatcher applies to plan text"""
+    return food_key(name)
+
+
+def _hash(key: bytes) -> int:
+    return zlib.crc32(key)
+
+
+def _column(header: Sequence[str], candidates: Sequence[str]) -> Optional[int]:
+    lowered = [h.strip().lower() for h in header]
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered.index(candidate)
+    return None
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _cost_tier(value: Any) -> int:
+    value = str(value or "medium").strip().lower()
+    return COST_TIERS.index(value) if value in COST_TIERS else COST_TIERS.index("medium")
+
+
+def _iter_wide(header: Sequence[str], rows: Iterator[Sequence[Any]]) -> Iterator[Tuple[str, List[float], int]]:
+    name_col = _column(header, NAME_COLUMNS)
+    if name_col is None:
+        raise ValueError(f"no food name column; expected one of {', '.join(NAME_COLUMNS)}")
+    nutrient_cols = [_column(header, NUTRIENT_COLUMNS[nutrient]) for nutrient in NUTRIENTS]
+    cost_col = _column(header, COST_COLUMNS)
+    for row in rows:
+        values = [_number(row[col]) if col is not None else 0.0 for col in nutrient_cols]
+        yield str(row[name_col]), values, _cost_tier(row[cost_col] if cost_col is not None else None)
+
+
+def _iter_csv(path: str) -> Iterator[Tuple[str, List[float], int]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        yield from _iter_wide(next(reader), reader)
+
+
+def _iter_parquet(path: str) -> Iterator[Tuple[str, List[float], int]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("reading Parquet nutrition tables requires pyarrow (pip install pyarrow)") from e
+    source = pq.ParquetFile(path)
+    header = source.schema_arrow.names
+
+    def rows() -> Iterator[Sequence[Any]]:
+        for batch in source.iter_batches(batch_size=65536):
+            columns = [column.to_pylist() for column in batch.columns]
+            yield from zip(*columns)
+    yield from _iter_wide(header, rows())
+
+
+def _iter_fdc(directory: str) -> Iterator[Tuple[str, List[float], int]]:
+    """FoodData Central CSV export: food.csv (fdc_id, description) + food_nutrient.csv (long layout)"""
+    values: Dict[str, List[float]] = {}
+    with open(os.path.join(directory, "food_nutrient.csv"), newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        fdc_col, nutrient_col, amount_col = (_column(header, (name,)) for name in ("fdc_id", "nutrient_id", "amount"))
+        for row in reader:
+            nutrient = FDC_NUTRIENT_IDS.get(row[nutrient_col])
+            if nutrient is None:
+                continue
+            food = values.setdefault(row[fdc_col], [0.0] * len(NUTRIENTS))
+            slot = NUTRIENTS.index(nutrient)
+            # Prefer the measured energy (1008) over the Atwater estimate when both exist
+            if nutrient == "calories" and food[slot] and row[nutrient_col] == "2047":
+                continue
+            food[slot] = _number(row[amount_col])
+    with open(os.path.join(directory, "food.csv"), newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        fdc_col, name_col = _column(header, ("fdc_id",)), _column(header, ("description",))
+        cost_col = _column(header, COST_COLUMNS)
+        for row in reader:
+            if row[fdc_col] in values:
+                yield row[name_col], values[row[fdc_col]], _cost_tier(row[cost_col] if cost_col is not None else None)
+
+
+def iter_foods(source: str) -> Iterator[Tuple[str, List[float], int]]:
+    """(name, nutrient values ordered like NUTRIENTS, cost tier code) from a CSV, Parquet or FDC export"""
+    if os.path.isdir(source):
+        return _iter_fdc(source)
+    if source.lower().endswith((".parquet", ".pq")):
+        return _iter_parquet(source)
+    return _iter_csv(source)
+
+
+def compile_store(source: str, target: str) -> str:
+    """Compile a food table into a memory-mappable store directory at ``target``
+
+    Layout: ``matrix.npy`` (foods x NUTRIENTS float32), ``cost_tiers.npy``
+    (int8), ``names.bin`` with ``name_offsets.npy`` (normalized names,
+    UTF-8, in row order), ``name_hash.npy`` (open-addressing table of
+    rows keyed by crc32 of the name), the same three files for the proper
+    word prefixes of the names (``prefixes.bin``, ``prefix_offsets.npy``,
+    ``prefix_hash.npy``), the first words of the names (``starts.bin``,
+    ``start_offsets.npy``) and ``meta.json``. The prefixes and first words
+    let FoodMatcher dismiss most words of a plan with one lookup. Duplicate
+    names keep their first row. The directory is written next to ``target`` and renamed
+    into place, so readers never see a partial store. When another worker
+    has already published a store of the same source, that one is kept and
+    this copy is discarded; a different store is swapped in under a file
+    lock, so concurrent compiles never delete each other's output.
+    """
+    fingerprint = _source_fingerprint(source)
+    rows: Dict[str, int] = {}
+    names: List[bytes] = []
+    values: List[List[float]] = []
+    tiers: List[int] = []
+    prefixes: Dict[str, None] = {}
+    starts: Dict[str, None] = {}
+    max_words = 1
+    for name, nutrients, tier in iter_foods(source):
+        key = normalize_name(name)
+        if not key or key in rows:
+            continue
+        rows[key] = len(names)
+        names.append(key.encode("utf-8"))
+        values.append(nutrients)
+        tiers.append(tier)
+        words = key.split("_")
+        max_words = max(max_words, len(words))
+        starts[words[0]] = None
+        for n in range(1, len(words)):
+            prefixes["_".join(words[:n])] = None
+    count = len(names)
+
+    parent = os.path.dirname(os.path.abspath(target))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".nutrition-", dir=parent)
+    try:
+        np.save(os.path.join(staging, "matrix.npy"),
+                np.array(values, dtype=np.float32).reshape(count, len(NUTRIENTS)))
+        np.save(os.path.join(staging, "cost_tiers.npy"), np.array(tiers, dtype=np.int8))
+        _save_keys(staging, "names.bin", "name_offsets.npy", names, "name_hash.npy")
+        _save_keys(staging, "prefixes.bin", "prefix_offsets.npy", [key.encode("utf-8") for key in prefixes],
+                   "prefix_hash.npy")
+        _save_keys(staging, "starts.bin", "start_offsets.npy", [key.encode("utf-8") for key in starts])
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump({"format": FORMAT_VERSION, "foods": count, "nutrients": list(NUTRIENTS),
+                       "cost_tiers": list(COST_TIERS), "max_words": max_words,
+                       "source": os.path.abspath(source), "fingerprint": fingerprint}, f)
+        os.chmod(staging, 0o755)  # mkdtemp creates it private; other workers must read it
+        with _locked(target + ".lock"):
+            if _fingerprint_of(target) == fingerprint:
+                shutil.rmtree(staging)
+                return target
+            # Moved aside rather than deleted in place; workers that mapped the old
+            # files keep their pages until they close them
+            retired = tempfile.mkdtemp(prefix=".nutrition-old-", dir=parent) if os.path.isdir(target) else None
+            if retired:
+                os.replace(target, os.path.join(retired, "store"))
+            os.replace(staging, target)
+        if retired:
+            shutil.rmtree(retired, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return target
+
+
+def _save_keys(directory: str, blob_name: str, offsets_name: str, keys: List[bytes],
+               hash_name: str = None) -> None:
+    """Keys as one UTF-8 blob plus offsets, and optionally their open-addressing crc32 table"""
+    with open(os.path.join(directory, blob_name), "wb") as f:
+        f.write(b"".join(keys))
+    np.save(os.path.join(directory, offsets_name), np.cumsum([0] + [len(key) for key in keys], dtype=np.int64))
+    if hash_name is None:
+        return
+    size = 1 << max(4, (2 * len(keys) - 1).bit_length())
+    table = np.full(size, -1, dtype=np.int32)
+    for row, key in enumerate(keys):
+        slot = _hash(key) & (size - 1)
+        while table[slot] != -1:
+            slot = (slot + 1) & (size - 1)
+        table[slot] = row
+    np.save(os.path.join(directory, hash_name), table)
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """Exclusive advisory lock on ``path`` across processes (a no-op without fcntl)"""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _fingerprint_of(path: str) -> Optional[str]:
+    """Source fingerprint of the store compiled at ``path``, None when there is none"""
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta.get("fingerprint") if meta.get("format") == FORMAT_VERSION else None
+
+
+class NameList(SequenceABC):
+    """Read-only view of the store's names; decodes one entry at a time"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, row: int) -> bytes:
+        return self._blob[self._offsets[row]:self._offsets[row + 1]].tobytes()
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return self.raw(row).decode("utf-8")
+
+
+class NameIndex:
+    """Mapping-style name -> row lookup over the memory-mapped hash table"""
+
+    def __init__(self, names: NameList, table: np.ndarray):
+        self._names = names
+        self._table = table
+        self._mask = len(table) - 1
+
+    def get(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        key = name.encode("utf-8")
+        slot = _hash(key) & self._mask
+        while True:
+            row = int(self._table[slot])
+            if row == -1:
+                return default
+            if self._names.raw(row) == key:
+                return row
+            slot = (slot + 1) & self._mask
+
+    def __getitem__(self, name: str) -> int:
+        row = self.get(name)
+        if row is None:
+            raise KeyError(name)
+        return row
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class NutritionStore:
+    """A compiled food table opened with np.load(mmap_mode="r")
+
+    Arrays are mapped read-only, so worker processes share the page cache
+    instead of each holding its own copy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION or self.meta.get("nutrients") != list(NUTRIENTS):
+            raise ValueError(f"{path} was compiled for another store format; recompile it")
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.matrix = load("matrix.npy")
+        self.cost_tiers = load("cost_tiers.npy")
+        self.names = NameList(self._blob("names.bin"), load("name_offsets.npy"))
+        self.index = NameIndex(self.names, load("name_hash.npy"))
+        # Proper word prefixes of the names stay mapped; the first words are few and probed per word
+        self.prefixes = NameIndex(NameList(self._blob("prefixes.bin"), load("prefix_offsets.npy")),
+                                  load("prefix_hash.npy"))
+        self.starts = frozenset(NameList(self._blob("starts.bin"), load("start_offsets.npy")))
+        self.max_words = self.meta["max_words"]
+
+    def _blob(self, name: str) -> np.ndarray:
+        blob_path = os.path.join(self.path, name)
+        return (np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path)
+                else np.zeros(0, dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def _source_fingerprint(source: str) -> str:
+    """Cheap change detector for a source file or FDC directory: paths, sizes and mtimes"""
+    paths = ([os.path.join(source, name) for name in ("food.csv", "food_nutrient.csv")]
+             if os.path.isdir(source) else [source])
+    stamp = [(os.path.abspath(p), os.path.getsize(p), int(os.path.getmtime(p))) for p in paths]
+    return hashlib.sha256(json.dumps([FORMAT_VERSION, stamp]).encode("utf-8")).hexdigest()[:16]
+
+
+def open_store(path: str, cache_dir: str = os.path.join(".cache", "nutrition")) -> NutritionStore:
+    """Open a compiled store, compiling a CSV/Parquet/FDC source into ``cache_dir`` on first use"""
+    if os.path.isfile(os.path.join(path, "meta.json")):
+        return NutritionStore(path)
+    stem = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+    target = os.path.join(cache_dir, f"{stem}-{_source_fingerprint(path)}")
+    if not os.path.isfile(os.path.join(target, "meta.json")):
+        compile_store(path, target)
+    return NutritionStore(target)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Compile a food table into a memory-mapped nutrition store")
+    parser.add_argument("source", help="wide CSV/Parquet table or a FoodData Central CSV directory")
+    parser.add_argument("target", help="output store directory")
+    args = parser.parse_args()
+    store = NutritionStore(compile_store(args.source, args.target))
+    print(f"compiled {len(store)} foods into {args.target}")
@@ -0,0 +1,73 @@
+import re
+import threading
+from typing import Dict, List, Any
+import numpy as np
+from food_matcher import FoodMatcher
+from nutrient_table import NutrientTable, NUTRIENTS, COST_TIERS
+
+# "Day 3", "## DAY 3:", "day3"; the highest number seen so far is the running day count
+_DAY_HEADING = re.compile(r"\bday\s*(\d{1,2})\b", re.IGNORECASE)
+# Characters carried over between chunks so a heading split across them is still seen
+_CARRY = 12
+
+
+class PlanAnalyzer:
+    """Running nutrient totals, cost-tier counts and day count over a plan streamed in chunks
+
+    ``feed()`` costs a few microseconds per chunk, so it can run inline with
+    the stream. ``snapshot()`` may be called from another thread while the
+    stream is being fed. ``close()`` returns the final food counts, equal to
+    FoodMatcher.count() over the whole plan, so the final analysis skips
+    the scan.
+    """
+
+    def __init__(self, matcher: FoodMatcher, table: NutrientTable):
+        self.table = table
+        self.counter = matcher.incremental()
+        self.totals = np.zeros(len(NUTRIENTS), dtype=np.float64)
+        self.cost_counts = np.zeros(len(COST_TIERS), dtype=np.int64)
+        self.days = 0
+        self.chars = 0
+        self._carry = ""
+        self._lock = threading.Lock()
+
+    def feed(self, chunk: str) -> None:
+        hits = self.counter.feed(chunk)
+        with self._lock:
+            self._add(hits)
+            self._track_days(chunk)
+
+    def close(self) -> np.ndarray:
+        """Finish the text; returns the food counts per row"""
+        hits = self.counter.flush()
+        with self._lock:
+            self._add(hits)
+        return self.counter.counts
+
+    def _add(self, hits: List[int]) -> None:
+        if hits:
+            self.totals += np.asarray(self.table.matrix[hits], dtype=np.float64).sum(axis=0)
+            self.cost_counts += np.bincount(np.asarray(self.table.cost_tiers[hits], dtype=np.int64),
+                                            minlength=len(COST_TIERS))
+
+    def _track_days(self, chunk: str) -> None:
+        text = self._carry + chunk
+        self.chars += len(chunk)
+        for match in _DAY_HEADING.finditer(text):
+            self.days = max(self.days, int(match.group(1)))
+        self._carry = text[-_CARRY:]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Totals so far, per-day averages over the days seen so far, cost-tier counts and day count"""
+        with self._lock:
+            totals = self.totals.copy()
+            cost_counts = self.cost_counts.copy()
+            days = self.days
+        per_day = totals / max(days, 1)
+        return {
+            "totals": {name: round(float(value), 1) for name, value in zip(NUTRIENTS, totals)},
+            "estimated_daily": {name: round(float(value), 1) for name, value in zip(NUTRIENTS, per_day)},
+            "cost_counts": dict(zip(COST_TIERS, (int(v) for v in cost_counts))),
+            "days": days,
+            "chars": self.chars,
+        }
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+def _normalize(value: Any) -> Any:
+    """Normalize a profile value so equivalent submissions compare equal"""
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True))
+    return value
+
+
+def canonical_profile(profile: Dict) -> str:
+    """Canonical JSON for a profile: sorted keys and lists, whitespace/case-folded text"""
+    return json.dumps(_normalize(profile), sort_keys=True, separators=(",", ":"))
+
+
+def profile_key(profile: Dict, namespace: str = "") -> str:
+    """Stable hash of a canonicalized profile"""
+    return hashlib.sha256((namespace + canonical_profile(profile)).encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """Two-tier meal-plan cache: in-memory LRU with TTL in front of an SQLite store"""
+
+    def __init__(self, path: str, version: str, max_entries: int = 10000,
+                 memory_entries: int = 256, ttl: float = 86400):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS meal_plans (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS meal_plans_accessed ON meal_plans (accessed_at)")
+        self._db.commit()
+        # Entries written under an older prompt template or nutrition DB are useless
+        self.invalidate()
+
+    def _key(self, profile: Dict) -> str:
+        return profile_key(profile, self.version)
+
+    def get(self, profile: Dict) -> Optional[Dict[str, Any]]:
+        """Return the cached result for a profile, or None on a miss"""
+        key = self._key(profile)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return result
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT result, created_at FROM meal_plans WHERE key = ? AND version = ?",
+                (key, self.version)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                self.stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE meal_plans SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            result = json.loads(row[0])
+            self._remember(key, row[1], result)
+            self.stats["disk_hits"] += 1
+            return result
+
+    def put(self, profile: Dict, result: Dict[str, Any]) -> None:
+        """Store a plan together with its nutrition and cost analysis"""
+        key = self._key(profile)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, result)
+            self._db.execute(
+                "INSERT OR REPLACE INTO meal_plans (key, version, result, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, self.version, json.dumps(result), now, now))
+            self._evict()
+            self._db.commit()
+
+    def _remember(self, key: str, created_at: float, result: Dict[str, Any]) -> None:
+        self._memory[key] = (created_at, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        """Drop expired rows and the least recently used ones beyond max_entries"""
+        cursor = self._db.execute("DELETE FROM meal_plans WHERE created_at <= ?", (time.time() - self.ttl,))
+        self.stats["evictions"] += cursor.rowcount
+        (count,) = self._db.execute("SELECT COUNT(*) FROM meal_plans").fetchone()
+        if count > self.max_entries:
+            cursor = self._db.execute(
+                "DELETE FROM meal_plans WHERE key IN "
+                "(SELECT key FROM meal_plans ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,))
+            self.stats["evictions"] += cursor.rowcount
+
+    def invalidate(self, version: str = None) -> int:
+        """Delete entries not written under the current (or given) version; returns rows removed"""
+        if version is not None:
+            self.version = version
+        with self._lock:
+            self._memory.clear()
+            cursor = self._db.execute("DELETE FROM meal_plans WHERE version != ?", (self.version,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        """Remove every cached plan"""
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM meal_plans")
+            self._db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import sqlite3
+import itertools
+import threading
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+from plan_cache import profile_key
+
+# The planner form's select options; a bucket is one choice of each plus a set of medical conditions
+LOCATIONS = ["North America", "South America", "Europe", "East Asia",
+             "South Asia", "Middle East", "Africa", "Australia/Oceania"]
+DIET_TYPES = ["Omnivore", "Vegetarian", "Vegan", "Pescatarian", "Flexitarian", "Keto", "Paleo"]
+GOALS = ["Weight Loss", "Muscle Gain", "Maintenance", "Heart Health",
+         "Diabetes Management", "Anti-Aging", "Athletic Performance"]
+BUDGETS = ["Low", "Medium", "High"]
+
+# Fields a library plan is generated for, and free-text fields that must be empty to use one
+BUCKET_FIELDS = ("location", "diet_type", "goal", "budget", "medical_conditions")
+FREE_TEXT_FIELDS = ("taste_preferences", "food_dislikes")
+
+# Stand-in for the personal fields when generating a bucket's plan
+REPRESENTATIVE_PROFILE = {
+    "age": 30,
+    "weight": 70,
+    "height": 170,
+    "gender": "Other",
+    "activity": "Moderate",
+    "taste_preferences": "",
+    "food_dislikes": "",
+}
+
+
+def bucket_of(profile: Dict) -> Optional[Dict[str, Any]]:
+    """The library bucket for a planner submission, or None when it has free-text preferences"""
+    if any(str(profile.get(field) or "").strip() for field in FREE_TEXT_FIELDS):
+        return None
+    if any(profile.get(field) is None for field in BUCKET_FIELDS[:-1]):
+        return None
+    bucket = {field: profile[field] for field in BUCKET_FIELDS[:-1]}
+    bucket["medical_conditions"] = sorted(c for c in profile.get("medical_conditions") or [] if c != "None")
+    return bucket
+
+
+def bucket_profile(bucket: Dict[str, Any]) -> Dict[str, Any]:
+    """Full planner profile used to generate a bucket's plan"""
+    return {**REPRESENTATIVE_PROFILE, **bucket, "medical_conditions": list(bucket["medical_conditions"])}
+
+
+def all_buckets() -> Iterator[Dict[str, Any]]:
+    """Every bucket without medical conditions, in form order"""
+    for location, diet_type, goal, budget in itertools.product(LOCATIONS, DIET_TYPES, GOALS, BUDGETS):
+        yield {"location": location, "diet_type": diet_type, "goal": goal, "budget": budget,
+               "medical_conditions": []}
+
+
+class PlanLibrary:
+    """Pre-generated meal plans per profile bucket, stored in SQLite with their analysis
+
+    Entries never expire on their own: an entry older than ``max_age`` is
+    still served but reported as stale so the caller can regenerate it in
+    the background. Entries written under another ``version`` (prompt
+    template or nutrition database) are dropped on open. Lookups are
+    counted per bucket so the pre-warm job can start with the buckets
+    users actually ask for.
+    """
+
+    def __init__(self, path: str, version: str, max_age: float = 7 * 86400):
+        self.path = path
+        self.version = version
+        self.max_age = max_age
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS plan_library (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS bucket_demand (
+                key TEXT PRIMARY KEY,
+                bucket TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                last_requested REAL NOT NULL
+            )""")
+        self._db.execute("DELETE FROM plan_library WHERE version != ?", (self.version,))
+        self._db.commit()
+
+    @staticmethod
+    def key(bucket: Dict[str, Any]) -> str:
+        return profile_key(bucket, namespace="plan_library:")
+
+    def get(self, bucket: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """(result, stale) for a bucket, or None; every call counts as demand for the bucket"""
+        key = self.key(bucket)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO bucket_demand (key, bucket, requests, last_requested) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (key) DO UPDATE SET requests = requests + 1, last_requested = excluded.last_requested",
+                (key, json.dumps(bucket), now))
+            row = self._db.execute(
+                "SELECT result, created_at FROM plan_library WHERE key = ? AND version = ?",
+                (key, self.version)).fetchone()
+            self._db.commit()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            stale = now - row[1] >= self.max_age
+            self.stats["stale_hits" if stale else "hits"] += 1
+            return {**json.loads(row[0]), "generated_at": row[1]}, stale
+
+    def put(self, bucket: Dict[str, Any], result: Dict[str, Any]) -> None:
+        """Store the plan and analysis generated for a bucket"""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO plan_library (key, version, bucket, result, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.key(bucket), self.version, json.dumps(bucket), json.dumps(result), time.time()))
+            self._db.commit()
+
+    def popular(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Requested buckets, most requested first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bucket FROM bucket_demand ORDER BY requests DESC, last_requested DESC LIMIT ?",
+                (-1 if limit is None else limit,)).fetchall()
+        return [json.loads(bucket) for (bucket,) in rows]
+
+    def due(self, buckets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The buckets among ``buckets`` that are missing or stale"""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            fresh = {key for (key,) in self._db.execute(
+                "SELECT key FROM plan_library WHERE version = ? AND created_at > ?", (self.version, cutoff))}
+        return [bucket for bucket in buckets if self.key(bucket) not in fresh]
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._db.execute("SELECT COUNT(*) FROM plan_library").fetchone()
+        return count
+
+
+if __name__ == "__main__":
+    import asyncio
+    import argparse
+    from health_assistant import AsyncHealthAssistant, plan_version
+
+    parser = argparse.ArgumentParser(description="Pre-generate library plans for the most requested profile buckets")
+    parser.add_argument("--path", default=os.getenv('PLAN_LIBRARY_PATH', os.path.join('.cache', 'plan_library.sqlite3')))
+    parser.add_argument("--top", type=int, default=100,
+                        help="most requested buckets to generate (the first buckets in form order before any demand)")
+    parser.add_argument("--all", action="store_true", help="also generate every bucket without medical conditions")
+    parser.add_argument("--force", action="store_true", help="regenerate fresh entries too")
+    parser.add_argument("--concurrency", type=int, default=4, help="plans generated at the same time")
+    parser.add_argument("--max-age", type=float, default=float(os.getenv('PLAN_LIBRARY_MAX_AGE', 7 * 24 * 3600)))
+    args = parser.parse_args()
+
+    reference_data = AsyncHealthAssistant.build_reference_data()
+    library = PlanLibrary(args.path, plan_version(reference_data["nutrition_db"]), max_age=args.max_age)
+    buckets = library.popular(args.top) or list(itertools.islice(all_buckets(), args.top))
+    if args.all:
+        buckets += all_buckets()
+    buckets = list({PlanLibrary.key(bucket): bucket for bucket in buckets}.values())
+    if not args.force:
+        buckets = library.due(buckets)
+    assistant = AsyncHealthAssistant(reference_data=reference_data, plan_library=library)
+
+    async def prewarm() -> int:
+        slots = asyncio.Semaphore(args.concurrency)
+        failed = 0
+
+        async def one(number: int, bucket: Dict[str, Any]) -> None:
+            nonlocal failed
+            async with slots:
+                started = time.perf_counter()
+                try:
+                    await assistant.refresh_library_plan(bucket)
+                except Exception as e:
+                    failed += 1
+                    print(f"[{number}/{len(buckets)}] failed {bucket}: {e}")
+                else:
+                    print(f"[{number}/{len(buckets)}] {time.perf_counter() - started:.1f}s {bucket}")
+
+        await asyncio.gather(*(one(number, bucket) for number, bucket in enumerate(buckets, start=1)))
+        return failed
+
+    failed = asyncio.run(prewarm())
+    print(f"generated {len(buckets) - failed} plans, {failed} failed; the library holds {len(library)}")
+    raise SystemExit(1 if failed else 0)
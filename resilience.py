@@ -0,0 +1,305 @@
+import os
+import time
+import random
+import asyncio
+import contextlib
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Any, Callable, Awaitable, AsyncIterator, Optional, Deque, Tuple
+import metrics
+
+logger = logging.getLogger("diet_planner")
+
+# Per-method upper bound on one attempt (non-streaming) or on the wait for the first token (streaming).
+# o1 reasons before answering, so whole-week plans get the most room.
+DEFAULT_TIMEOUTS = {"chat": 60.0, "advice": 90.0, "meal_plan": 300.0, "meal_plan_day": 120.0, "household": 600.0}
+DEFAULT_TIMEOUT = 120.0
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and upstream failures
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _parse_timeouts(spec: str) -> Dict[str, float]:
+    """"chat=30,meal_plan=240" -> {"chat": 30.0, "meal_plan": 240.0}"""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        method, _, seconds = item.partition("=")
+        timeouts[method.strip()] = float(seconds)
+    return timeouts
+
+
+class LLMTimeoutError(TimeoutError):
+    """An upstream call exceeded its per-method timeout"""
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit breaker is open; the call was rejected without reaching the upstream"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient upstream failures: timeouts, connection errors, 408/409/429 and 5xx"""
+    if isinstance(error, (LLMTimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open after ``failure_threshold`` failures,
+    half-open after ``recovery_time`` seconds, closed again after a successful probe"""
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go ahead"""
+        with self._lock:
+            if self.state == "open":
+                remaining = self.opened_at + self.recovery_time - time.monotonic()
+                if remaining > 0:
+                    metrics.REGISTRY.inc("llm_circuit_rejections_total")
+                    raise CircuitOpenError(
+                        f"The AI service is temporarily unavailable, please try again in {int(remaining) + 1}s"
+                    )
+                self._transition("half_open")
+            if self.state == "half_open":
+                if self._probing:
+                    metrics.REGISTRY.inc("llm_circuit_rejections_total")
+                    raise CircuitOpenError("The AI service is recovering, please try again shortly")
+                self._probing = True
+
+    def available(self) -> bool:
+        """Whether allow() would let a call through right now, without claiming the probe"""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() >= self.opened_at + self.recovery_time
+            return self.state == "closed" or not self._probing
+
+    def release(self) -> None:
+        """Forget an abandoned half-open probe so another call can try"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != "closed":
+                self._transition("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != "open":
+                    self._transition("open")
+
+    def _transition(self, state: str) -> None:
+        logger.warning("circuit breaker %s -> %s", self.state, state)
+        metrics.REGISTRY.inc("llm_circuit_transitions_total", to=state)
+        self.state = state
+
+
+class LatencyWindow:
+    """Rolling per-method latencies of successful attempts, optionally limited to the last ``max_age`` seconds"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20, max_age: float = None):
+        self.size = size
+        self.min_samples = min_samples
+        self.max_age = max_age
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+
+    def add(self, method: str, seconds: float) -> None:
+        self._samples.setdefault(method, deque(maxlen=self.size)).append((time.monotonic(), seconds))
+
+    def percentile(self, method: str, pct: float) -> Optional[float]:
+        samples = self._samples.get(method)
+        if samples and self.max_age is not None:
+            cutoff = time.monotonic() - self.max_age
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(seconds for _, seconds in samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Resilience:
+    """Timeouts, jittered exponential backoff, a circuit breaker and optional hedging for LLM calls
+
+    ``call()`` runs a coroutine factory once per attempt. Each attempt is bounded
+    by the method's timeout. Retryable failures back off with full jitter,
+    ``random.uniform(0, min(max_delay, base_delay * 2 ** attempt))``. With
+    ``hedge`` enabled, a duplicate attempt is started once the first has run
+    longer than the method's observed p95, and the first answer wins.
+    """
+
+    def __init__(self, timeouts: Dict[str, float] = None, attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0, breaker: CircuitBreaker = None, hedge: bool = False,
+                 hedge_percentile: float = 95.0, stream_idle_timeout: float = 60.0):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.stream_idle_timeout = stream_idle_timeout
+        self.latency = LatencyWindow()
+
+    @classmethod
+    def from_env(cls) -> "Resilience":
+        """Policy configured through LLM_* and LLM_BREAKER_* environment variables"""
+        return cls(
+            timeouts=_parse_timeouts(os.getenv('LLM_TIMEOUTS', '')),
+            attempts=int(os.getenv('LLM_RETRY_ATTEMPTS', 3)),
+            base_delay=float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5)),
+            max_delay=float(os.getenv('LLM_RETRY_MAX_DELAY', 8.0)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', 5)),
+                recovery_time=float(os.getenv('LLM_BREAKER_RECOVERY', 30.0))
+            ),
+            hedge=os.getenv('LLM_HEDGE', '0') == '1',
+            stream_idle_timeout=float(os.getenv('LLM_STREAM_IDLE_TIMEOUT', 60.0))
+        )
+
+    def timeout(self, method: str) -> float:
+        return self.timeouts.get(method, DEFAULT_TIMEOUT)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _attempt(self, method: str, attempt: Callable[[], Awaitable[Any]],
+                       slot: asyncio.Semaphore = None, limiter: Any = None,
+                       observe: Callable[[float], None] = None) -> Any:
+        # Every upstream request is charged, retries and hedges included
+        if limiter is not None:
+            await limiter.acquire()
+        # Waiting for a concurrency slot does not count against the timeout
+        async with slot or contextlib.nullcontext():
+            timeout = self.timeout(method)
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(attempt(), timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"The AI service did not answer within {timeout:g}s") from None
+        elapsed = time.perf_counter() - started
+        self.latency.add(method, elapsed)
+        if observe is not None:
+            observe(elapsed)
+        return result
+
+    async def _hedged(self, method: str, attempt: Callable[[], Awaitable[Any]],
+                      slot: asyncio.Semaphore = None, limiter: Any = None,
+                      observe: Callable[[float], None] = None) -> Any:
+        delay = self.latency.percentile(method, self.hedge_percentile) if self.hedge else None
+        if delay is None:
+            return await self._attempt(method, attempt, slot, limiter, observe)
+        tasks = [asyncio.ensure_future(self._attempt(method, attempt, slot, limiter, observe))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                metrics.REGISTRY.inc("llm_hedges_total", method=method)
+                tasks.append(asyncio.ensure_future(self._attempt(method, attempt, slot, limiter, observe)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            metrics.REGISTRY.inc("llm_hedge_wins_total", method=method,
+                                                 winner="hedge" if task is tasks[1] else "primary")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, method: str, attempt: Callable[[], Awaitable[Any]], hedge: bool = True,
+                   slot: asyncio.Semaphore = None, limiter: Any = None,
+                   observe: Callable[[float], None] = None) -> Any:
+        """Run ``attempt()`` under the policy and return the first successful result
+
+        Each attempt (and each hedge) holds ``slot``, when given, only while it
+        runs, and first takes a token from ``limiter`` (anything with a
+        coroutine ``acquire()``, such as batch.RateLimiter). ``observe``
+        receives the upstream seconds of the successful attempt, without slot
+        waits or retry backoff.
+        """
+        for number in range(self.attempts):
+            self.breaker.allow()
+            try:
+                if hedge:
+                    result = await self._hedged(method, attempt, slot, limiter, observe)
+                else:
+                    result = await self._attempt(method, attempt, slot, limiter, observe)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # The upstream answered, just not with something worth retrying
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if number == self.attempts - 1:
+                    raise
+                delay = self.backoff(number)
+                metrics.REGISTRY.inc("llm_retries_total", method=method)
+                logger.warning("%s call failed (%s), retry %d in %.2fs", method, type(e).__name__, number + 1, delay)
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def stream(self, method: str, open_stream: Callable[[], Awaitable[Any]],
+                     limiter: Any = None, observe: Callable[[float], None] = None) -> AsyncIterator[Any]:
+        """Open a streaming response under the policy, then bound the first-token and inter-chunk waits
+
+        Only opening the stream is retried; once chunks have been handed out a
+        failure is final. ``observe`` receives the upstream seconds of a
+        completed stream: opening it plus the waits for chunks, not the time
+        the consumer spends between them.
+        """
+        opened: List[float] = []
+        response = await self.call(method, open_stream, hedge=False, limiter=limiter, observe=opened.append)
+        iterator = response.__aiter__()
+        timeout = self.timeout(method)
+        upstream = opened[-1]
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout)
+                except StopAsyncIteration:
+                    upstream += time.perf_counter() - started
+                    if observe is not None:
+                        observe(upstream)
+                    break
+                except asyncio.TimeoutError:
+                    self.breaker.record_failure()
+                    raise LLMTimeoutError(f"The AI service stopped responding for {timeout:g}s") from None
+                except Exception as e:
+                    if is_retryable(e):
+                        self.breaker.record_failure()
+                    raise
+                upstream += time.perf_counter() - started
+                timeout = self.stream_idle_timeout
+                yield chunk
+        finally:
+            close = getattr(response, "close", None)
+            if close is not None:
+                await close()
@@ -0,0 +1,132 @@
+import os
+import logging
+import threading
+from typing import Dict, List, Any, Tuple, Callable, Optional
+import metrics
+from resilience import Resilience, LatencyWindow, CircuitOpenError, is_retryable, _parse_timeouts
+
+logger = logging.getLogger("diet_planner")
+
+# Task -> models in tier order: the primary first, then its fallbacks.
+# Chat answers short questions and must feel interactive, so it never starts on a reasoning model.
+DEFAULT_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "chat": ("gpt-4o-mini", "gpt-4o"),
+    "advice": ("o1", "gpt-4o"),
+    "meal_plan": ("o1", "gpt-4o"),
+    "meal_plan_day": ("o1", "gpt-4o"),
+    "household": ("o1", "gpt-4o"),
+}
+DEFAULT_ROUTE: Tuple[str, ...] = ("o1", "gpt-4o")
+
+# Latency budget per task: a tier whose recent p95 is above it is passed over while a faster one is healthy
+DEFAULT_SLOS: Dict[str, float] = {"chat": 10.0, "advice": 45.0, "meal_plan": 150.0, "meal_plan_day": 60.0,
+                                 "household": 300.0}
+
+# Percentile checked against the SLO, and how long a latency sample counts as recent
+SLO_PERCENTILE = 95.0
+SLO_WINDOW_SECONDS = 300.0
+SLO_MIN_SAMPLES = 5
+
+
+def _parse_routes(spec: str) -> Dict[str, Tuple[str, ...]]:
+    """"chat=gpt-4o-mini>gpt-4o;meal_plan=o1>gpt-4o" -> {"chat": ("gpt-4o-mini", "gpt-4o"), ...}"""
+    routes = {}
+    for item in filter(None, (part.strip() for part in spec.split(";"))):
+        task, _, models = item.partition("=")
+        routes[task.strip()] = tuple(model.strip() for model in models.split(">") if model.strip())
+    return routes
+
+
+def should_fall_back(error: BaseException) -> bool:
+    """Move on to the next tier when a model is unavailable, not when the request itself was refused"""
+    return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+
+class ModelRouter:
+    """Per-task model choice with fallback tiers and latency SLOs
+
+    Every model gets its own Resilience policy, so one model's circuit
+    breaker opening does not stop the others. ``plan()`` orders a task's
+    tiers for the next call: tiers that are available and within the SLO
+    come first, in tier order, then tiers over the SLO, then tiers whose
+    circuit is open. Latency samples expire after ``window_seconds``, so a
+    primary that was passed over gets traffic again once its slow samples
+    have aged out.
+    """
+
+    def __init__(self, routes: Dict[str, Tuple[str, ...]] = None, slos: Dict[str, float] = None,
+                 resilience_factory: Callable[[], Resilience] = Resilience.from_env,
+                 window_seconds: float = SLO_WINDOW_SECONDS, min_samples: int = SLO_MIN_SAMPLES):
+        self.routes = {**DEFAULT_ROUTES, **(routes or {})}
+        self.slos = {**DEFAULT_SLOS, **(slos or {})}
+        self.resilience_factory = resilience_factory
+        self.latency = LatencyWindow(min_samples=min_samples, max_age=window_seconds)
+        self._policies: Dict[str, Resilience] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Routing configured through LLM_ROUTES and LLM_SLOS; LLM_MODEL pins every task to one model"""
+        routes = _parse_routes(os.getenv('LLM_ROUTES', ''))
+        pinned = os.getenv('LLM_MODEL')
+        if pinned:
+            routes = {task: (pinned,) for task in {**DEFAULT_ROUTES, **routes}}
+            routes["*"] = (pinned,)
+        return cls(routes=routes, slos=_parse_timeouts(os.getenv('LLM_SLOS', '')))
+
+    def models(self, task: str) -> Tuple[str, ...]:
+        return self.routes.get(task) or self.routes.get("*") or DEFAULT_ROUTE
+
+    def resilience(self, model: str) -> Resilience:
+        """The retry, timeout and circuit breaker policy of one model, created on first use"""
+        policy = self._policies.get(model)
+        if policy is None:
+            with self._lock:
+                policy = self._policies.setdefault(model, self.resilience_factory())
+        return policy
+
+    def p95(self, task: str, model: str) -> Optional[float]:
+        return self.latency.percentile(f"{task}:{model}", SLO_PERCENTILE)
+
+    def plan(self, task: str) -> List[Tuple[int, str, str]]:
+        """(tier, model, reason) in the order to try them; reason says why a tier was demoted"""
+        slo = self.slos.get(task)
+        ready, slow, open_ = [], [], []
+        for tier, model in enumerate(self.models(task)):
+            if not self.resilience(model).breaker.available():
+                open_.append((tier, model, "circuit_open"))
+                continue
+            p95 = self.p95(task, model)
+            if slo is not None and p95 is not None and p95 > slo:
+                slow.append((tier, model, "slo"))
+            else:
+                ready.append((tier, model, ""))
+        return ready + slow + open_
+
+    def observe(self, task: str, model: str, seconds: float) -> None:
+        """Record the upstream seconds of a successful attempt
+
+        Only the request itself counts: not waits for a local concurrency
+        slot, retry backoff, or a stream consumer's reading time, so a busy
+        process does not push a healthy model over its SLO.
+        """
+        self.latency.add(f"{task}:{model}", seconds)
+
+    def answered(self, task: str, plan: List[Tuple[int, str, str]], position: int,
+                 failed: List[Tuple[int, str, str]]) -> Dict[str, Any]:
+        """Count and log the tier at ``plan[position]`` answering; returns the route recorded with the response
+
+        ``failed`` lists the tiers tried before it. Higher-priority tiers that
+        were demoted and never tried count as skipped too.
+        """
+        tier, model, _ = plan[position]
+        skipped = failed + [entry for entry in plan[position + 1:] if entry[0] < tier]
+        metrics.REGISTRY.inc("llm_routed_total", method=task, model=model, tier=str(tier))
+        for _, skipped_model, reason in skipped:
+            metrics.REGISTRY.inc("llm_fallbacks_total", method=task, model=skipped_model, reason=reason)
+        if tier:
+            logger.warning("%s answered by fallback tier %d (%s): %s", task, tier, model,
+                           ", ".join(f"{m} {r}" for _, m, r in skipped))
+        metrics.log_event("llm_route", method=task, model=model, tier=tier,
+                          skipped=[{"model": m, "reason": r} for _, m, r in skipped] or None)
+        return {"model": model, "tier": tier}
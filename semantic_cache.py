@@ -0,0 +1,191 @@
+import re
+import time
+import zlib
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+import numpy as np
+from food_matcher import SYNONYMS, food_key, singular
+
+_WORD = re.compile(r"[^\W_]+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+_NOT = re.compile(r"\b(?:[^\W_]+n't|cannot)\b")
+
+# Words that carry no meaning for FAQ matching ("how much protein is in an egg" ~ "protein in eggs")
+STOPWORDS = frozenset("""
+    a an the is are was were be been do does did can could should would will shall may might
+    i me my we our you your of in on at to for from with by about as and or any some
+    please tell know much many what which how there here just really
+""".split())
+
+# Words that point back at the conversation; a question using them is not answered from the cache
+FOLLOW_UP_WORDS = frozenset("""
+    it its it's this that these those them they their he she him her his
+    more less also instead else other another same above previous earlier again
+    too then yes no ok okay
+""".split())
+
+# Negation and exclusion words; "what should I not eat" must not get the answer to "what should I eat"
+NEGATIONS = {
+    "not": "not", "no": "no", "nor": "no", "none": "no", "never": "never",
+    "without": "without", "avoid": "avoid", "avoids": "avoid", "avoided": "avoid", "avoiding": "avoid",
+    "except": "except", "excluding": "except", "exclude": "except",
+}
+
+# Diets, conditions, meals and foods; questions that name different ones ask different things
+# ("vegan" is not "vegetarian", "dinner" is not "breakfast"), however similar the rest reads
+TOPIC_TERMS = frozenset(singular(word) for word in """
+    vegan vegetarian pescatarian flexitarian omnivore keto ketogenic paleo carnivore mediterranean
+    halal kosher gluten dairy lactose nut peanut soy egg shellfish fish meat
+    diabetes diabetic hypertension cholesterol celiac coeliac gout ibs pcos kidney pregnancy pregnant
+    breastfeeding child children toddler baby elderly senior
+    breakfast lunch dinner snack dessert brunch pre post workout
+    protein carb carbohydrate fat fiber fibre sugar sodium salt calorie iron calcium vitamin
+    chicken turkey pork lamb beef salmon tuna shrimp tofu tempeh seitan bean lentil chickpea
+    rice quinoa oat bread pasta potato milk yogurt cheese almond walnut avocado banana apple berry
+    spinach kale broccoli
+""".split()) | frozenset(
+    word for name, aliases in SYNONYMS.items() for text in (name, *aliases) for word in food_key(text).split("_"))
+
+
+def question_words(text: str) -> List[str]:
+    return [singular(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def negations(text: str) -> Tuple[str, ...]:
+    """Negation and exclusion words in a question, normalized: "don't" -> "not", "avoiding" -> "avoid" """
+    text = _NOT.sub(" not ", text.lower().replace("\u2019", "'"))
+    return tuple(sorted({NEGATIONS[word] for word in _WORD.findall(text) if word in NEGATIONS}))
+
+
+def topics(text: str) -> Tuple[str, ...]:
+    """Diet, condition, meal and food terms in a question, singular: "vegan meals with lentils" -> ("lentil", "vegan")"""
+    return tuple(sorted(set(question_words(text)) & TOPIC_TERMS))
+
+
+def guards(text: str) -> Dict[str, Tuple[str, ...]]:
+    """What must be identical between two questions for one to get the other's answer"""
+    return {"numbers": tuple(_NUMBER.findall(text)), "negations": negations(text), "topics": topics(text)}
+
+
+def is_standalone(text: str) -> bool:
+    """Whether a question reads the same without the conversation before it"""
+    return not FOLLOW_UP_WORDS.intersection(_WORD.findall(text.lower().replace("'", "")))
+
+
+class HashingVectorizer:
+    """Stateless text embedding: hashed word unigrams, bigrams and character trigrams, L2-normalized
+
+    Words carry most of the weight; character trigrams make typos and
+    inflections land close together. No vocabulary, no network, no GPU.
+    """
+
+    def __init__(self, dim: int = 1024, word_weight: float = 1.0, bigram_weight: float = 0.7,
+                 char_weight: float = 0.25):
+        self.dim = dim
+        self.weights = {"w": word_weight, "b": bigram_weight, "c": char_weight}
+
+    def features(self, text: str) -> List[Tuple[str, str]]:
+        words = question_words(text)
+        features = [("w", word) for word in words]
+        features += [("b", first + " " + second) for first, second in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            features += [("c", padded[i:i + 3]) for i in range(len(padded) - 2)]
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for kind, feature in self.features(text):
+            digest = zlib.crc32(f"{kind}:{feature}".encode("utf-8"))
+            # The top bit picks the sign so colliding features tend to cancel rather than add up
+            vector[digest % self.dim] += self.weights[kind] if digest & 0x80000000 else -self.weights[kind]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """In-process nearest-neighbour answer cache for chat questions
+
+    Questions are embedded with HashingVectorizer into a fixed matrix of
+    ``max_entries`` rows; a lookup is one matrix-vector product. A cached
+    answer is returned when the best cosine similarity reaches
+    ``threshold`` and both questions mention the same numbers ("2 eggs" is
+    not "3 eggs"), the same negation words ("what should I not eat" is not
+    "what should I eat") and the same diet, meal and food terms (a vegan
+    dinner is not a vegetarian one); see guards(). Entries expire after ``ttl`` seconds; when full, the
+    least recently used entry is replaced.
+    """
+
+    def __init__(self, max_entries: int = 2000, ttl: float = 86400, threshold: float = 0.85,
+                 vectorizer: HashingVectorizer = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._vectors = np.zeros((max_entries, self.vectorizer.dim), dtype=np.float32)
+        self._created = np.full(max_entries, -np.inf)
+        self._used = np.full(max_entries, -np.inf)
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _nearest(self, vector: np.ndarray, required: Dict[str, Tuple[str, ...]], now: float) -> Tuple[int, float]:
+        if not self._size:
+            return -1, 0.0
+        scores = self._vectors[:self._size] @ vector
+        scores[self._created[:self._size] < now - self.ttl] = -1.0
+        for row in np.argsort(scores)[::-1][:5]:
+            if scores[row] < self.threshold:
+                break
+            entry = self._entries[row]
+            if all(entry[name] == value for name, value in required.items()):
+                return int(row), float(scores[row])
+        return -1, 0.0
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """{"answer", "question", "similarity", ...} for a close enough cached question, or None"""
+        vector = self.vectorizer.transform(question)
+        required = guards(question)
+        now = time.time()
+        with self._lock:
+            row, similarity = self._nearest(vector, required, now)
+            if row < 0:
+                self.stats["misses"] += 1
+                return None
+            self._used[row] = now
+            self.stats["hits"] += 1
+            return {**self._entries[row], "similarity": similarity}
+
+    def put(self, question: str, answer: str, **meta: Any) -> None:
+        """Cache an answer; a near-identical cached question is replaced rather than duplicated"""
+        vector = self.vectorizer.transform(question)
+        if not vector.any():
+            return
+        required = guards(question)
+        now = time.time()
+        with self._lock:
+            row, _ = self._nearest(vector, required, now)
+            if row < 0:
+                if self._size < self.max_entries:
+                    row = self._size
+                    self._size += 1
+                else:
+                    expired = self._created < now - self.ttl
+                    # Expired rows first, then the least recently used one
+                    row = int(np.argmax(expired) if expired.any() else np.argmin(self._used))
+                    self.stats["evictions"] += 1
+            self._vectors[row] = vector
+            self._created[row] = now
+            self._used[row] = now
+            self._entries[row] = {"question": question, "answer": answer, **required, **meta}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._created[:] = -np.inf
+            self._used[:] = -np.inf
+            self._entries = [None] * self.max_entries
+            self._size = 0
@@ -0,0 +1,456 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import select
+import socket
+import signal
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, Any, Callable, Optional, Iterator, Tuple
+from dotenv import load_dotenv
+from health_assistant import HealthAssistant, CompletionStream, DEFAULT_BASE_URL, HOUSEHOLD_MAX_MEMBERS, plan_version
+from plan_cache import PlanCache
+from plan_library import PlanLibrary
+from semantic_cache import SemanticCache
+from session_store import SessionStore
+from chat_history import ChatHistory
+import metrics
+
+logger = logging.getLogger("diet_planner")
+
+load_dotenv()
+
+# Listening address, request threads and how many further requests may wait for one
+SERVICE_HOST = os.getenv('SERVICE_HOST', '0.0.0.0')
+SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8080))
+SERVICE_WORKERS = int(os.getenv('SERVICE_WORKERS', 64))
+SERVICE_QUEUE_LIMIT = int(os.getenv('SERVICE_QUEUE_LIMIT', 256))
+# Largest accepted request body, and seconds an idle keep-alive connection may hold a worker
+SERVICE_MAX_BODY = int(os.getenv('SERVICE_MAX_BODY', 1 << 20))
+SERVICE_IDLE_TIMEOUT = float(os.getenv('SERVICE_IDLE_TIMEOUT', 5))
+# Bearer token every /v1 request must carry; unset leaves the API open but refuses stored conversations
+SERVICE_TOKEN = os.getenv('SERVICE_TOKEN', '')
+# Seconds between live analysis events in a streamed meal plan
+SERVICE_PROGRESS_INTERVAL = float(os.getenv('SERVICE_PROGRESS_INTERVAL', 1.0))
+
+# Same stores as the Streamlit app, so both front ends share caches and conversations
+PLAN_CACHE_PATH = os.getenv('PLAN_CACHE_PATH', os.path.join('.cache', 'meal_plans.sqlite3'))
+PLAN_CACHE_TTL = float(os.getenv('PLAN_CACHE_TTL', 24 * 3600))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv('PLAN_CACHE_MAX_ENTRIES', 10000))
+PLAN_LIBRARY_PATH = os.getenv('PLAN_LIBRARY_PATH', os.path.join('.cache', 'plan_library.sqlite3'))
+PLAN_LIBRARY_MAX_AGE = float(os.getenv('PLAN_LIBRARY_MAX_AGE', 7 * 24 * 3600))
+CHAT_CACHE = os.getenv('CHAT_CACHE', '1') == '1'
+CHAT_CACHE_TTL = float(os.getenv('CHAT_CACHE_TTL', 24 * 3600))
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', 2000))
+CHAT_CACHE_THRESHOLD = float(os.getenv('CHAT_CACHE_THRESHOLD', 0.85))
+CHAT_DB_PATH = os.getenv('CHAT_DB_PATH', os.path.join('.cache', 'conversations.sqlite3'))
+CHAT_DB_RETENTION = float(os.getenv('CHAT_DB_RETENTION', 30 * 24 * 3600))
+
+ADVICE_MODULES = ("Women's Health", "Child Health", "Elderly Health")
+ADVICE_ERROR_PREFIX = "Error generating advice:"
+
+metrics.REGISTRY.counter("service_requests_total", "Service requests by endpoint and status")
+metrics.REGISTRY.histogram("service_request_seconds", "Wall time of service requests")
+metrics.REGISTRY.counter("service_rejected_total", "Requests turned away because the queue was full")
+
+
+class BadRequest(Exception):
+    """Client error reported as 400"""
+
+
+class Unauthorized(Exception):
+    """Missing or wrong bearer token, reported as 401"""
+
+
+def build_assistant() -> Tuple[HealthAssistant, Optional[SessionStore]]:
+    """Assistant wired to the same caches and stores as the Streamlit app, plus the conversation store"""
+    reference_data = HealthAssistant.build_reference_data()
+    version = plan_version(reference_data["nutrition_db"])
+    assistant = HealthAssistant(
+        api_key=os.getenv('API_KEY'),
+        base_url=os.getenv('BASE_URL', DEFAULT_BASE_URL),
+        reference_data=reference_data,
+        plan_cache=PlanCache(PLAN_CACHE_PATH, version=version, max_entries=PLAN_CACHE_MAX_ENTRIES,
+                             ttl=PLAN_CACHE_TTL),
+        chat_cache=SemanticCache(max_entries=CHAT_CACHE_MAX_ENTRIES, ttl=CHAT_CACHE_TTL,
+                                 threshold=CHAT_CACHE_THRESHOLD) if CHAT_CACHE else None,
+        plan_library=PlanLibrary(PLAN_LIBRARY_PATH, version=version, max_age=PLAN_LIBRARY_MAX_AGE)
+    )
+    store = SessionStore(CHAT_DB_PATH, retention=CHAT_DB_RETENTION) if CHAT_DB_PATH else None
+    return assistant, store
+
+
+class AssistantService(HTTPServer):
+    """HTTP/JSON front end for HealthAssistant with a bounded worker pool
+
+    Each connection is handled by one of ``workers`` threads; up to
+    ``queue_limit`` more wait for a free thread, and beyond that requests
+    are answered 503 straight away. Worker threads only wait on the shared
+    assistant loop, so upstream concurrency is still bounded by
+    LLM_MAX_CONCURRENCY rather than by the pool size. With a ``token``,
+    every /v1 request must send it as ``Authorization: Bearer <token>``;
+    stored conversations are only served behind a token.
+    """
+
+    def __init__(self, address: Tuple[str, int], assistant: HealthAssistant, store: SessionStore = None,
+                 workers: int = SERVICE_WORKERS, queue_limit: int = SERVICE_QUEUE_LIMIT,
+                 token: str = SERVICE_TOKEN):
+        self.assistant = assistant
+        self.store = store
+        self.token = token
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.draining = False
+        self._pending_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service-worker")
+        super().__init__(address, ServiceHandler)
+
+    def process_request(self, request: socket.socket, client_address: Any) -> None:
+        with self._pending_lock:
+            admitted = not self.draining and self.pending < self.workers + self.queue_limit
+            if admitted:
+                self.pending += 1
+        if not admitted:
+            metrics.REGISTRY.inc("service_rejected_total")
+            self._reject(request)
+            return
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request: socket.socket, client_address: Any) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._pending_lock:
+                self.pending -= 1
+
+    def _reject(self, request: socket.socket) -> None:
+        # A liveness probe still passes while busy, so a saturated server is not restarted
+        alive = not self.draining and self._peek(request).startswith(b"GET /healthz")
+        status = b"200 OK" if alive else b"503 Service Unavailable"
+        body = json.dumps({"status": "ok"} if alive else {"error": "server busy, retry shortly"}).encode("utf-8")
+        try:
+            request.sendall(b"HTTP/1.1 " + status + b"\r\nContent-Type: application/json\r\n"
+                            b"Retry-After: 1\r\nConnection: close\r\n"
+                            + f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    @staticmethod
+    def _peek(request: socket.socket) -> bytes:
+        """Start of the request line if it has already arrived, without consuming it"""
+        try:
+            if select.select([request], [], [], 0.05)[0]:
+                return request.recv(16, socket.MSG_PEEK)
+        except OSError:
+            pass
+        return b""
+
+    def ready(self) -> bool:
+        return not self.draining and self.pending < self.workers + self.queue_limit
+
+    def drain(self) -> None:
+        """Fail readiness and refuse new requests, let running ones finish, then stop"""
+        self.draining = True
+        self.shutdown()
+        self._pool.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = SERVICE_IDLE_TIMEOUT
+    server: AssistantService
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    # Plumbing
+
+    def _send_json(self, status: int, body: Any) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_text(self, status: int, text: str, content_type: str) -> None:
+        payload = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> Dict[str, Any]:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise BadRequest("invalid Content-Length")
+        if length > SERVICE_MAX_BODY:
+            self.close_connection = True
+            raise BadRequest(f"request body over {SERVICE_MAX_BODY} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise BadRequest(f"invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise BadRequest("request body must be a JSON object")
+        return body
+
+    def _authorize(self) -> None:
+        if not self.server.token:
+            return
+        scheme, _, credentials = self.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip().encode("utf-8"),
+                                                                 self.server.token.encode("utf-8")):
+            raise Unauthorized("missing or invalid bearer token")
+
+    def _connected(self) -> bool:
+        """False once the client has closed its end of the connection"""
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        if not readable:
+            return True
+        try:
+            return self.connection.recv(1, socket.MSG_PEEK) != b""
+        except OSError:
+            return False
+
+    def _assistant(self) -> HealthAssistant:
+        """Assistant view whose calls are cancelled when this client disconnects"""
+        return self.server.assistant.for_session(uuid.uuid4().hex, self._connected)
+
+    def _stream_ndjson(self, events: Iterator[Dict[str, Any]]) -> None:
+        """Send one JSON object per line as each event is produced (chunked transfer)"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for event in events:
+                data = (json.dumps(event) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        finally:
+            # Stops the upstream stream too when the client went away mid-way
+            events.close()
+
+    @staticmethod
+    def _text_events(stream: CompletionStream, progress: bool = False) -> Iterator[Dict[str, Any]]:
+        """Chunk events, live plan figures at most every SERVICE_PROGRESS_INTERVAL, then the outcome"""
+        last_progress = time.monotonic()
+        for chunk in stream:
+            yield {"type": "chunk", "text": chunk}
+            if progress and stream.analyzer is not None and time.monotonic() - last_progress >= SERVICE_PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                yield {"type": "progress", **stream.analyzer.snapshot()}
+        if stream.error:
+            yield {"type": "error", "error": stream.error}
+        else:
+            yield {"type": "result", "result": stream.result}
+
+    # Endpoints
+
+    def do_GET(self) -> None:
+        path = self.path.split("?", 1)[0]
+        if path == "/healthz":
+            self._send_json(200, {"status": "ok"})
+        elif path == "/readyz":
+            ready = self.server.ready()
+            self._send_json(200 if ready else 503, {
+                "status": "ready" if ready else "unavailable",
+                "pending": self.server.pending,
+                "workers": self.server.workers,
+                "queue_limit": self.server.queue_limit,
+            })
+        elif path == "/metrics":
+            self._send_text(200, metrics.REGISTRY.prometheus(), "text/plain; version=0.0.4")
+        elif path == "/metrics.json":
+            self._send_json(200, metrics.REGISTRY.snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        path = self.path.split("?", 1)[0]
+        endpoint = ENDPOINTS.get(path)
+        if endpoint is None:
+            self._send_json(404, {"error": "not found"})
+            return
+        started = time.perf_counter()
+        status = 500
+        try:
+            self._authorize()
+            status = endpoint(self, self._read_json())
+        except Unauthorized as e:
+            status = 401
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            self._send_json(401, {"error": str(e)})
+        except BadRequest as e:
+            status = 400
+            self._send_json(400, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            status = 499
+            self.close_connection = True
+        except Exception:
+            logger.exception("service request to %s failed", path)
+            self._send_json(500, {"error": "internal error"})
+        finally:
+            metrics.REGISTRY.inc("service_requests_total", endpoint=path, status=str(status))
+            metrics.REGISTRY.observe("service_request_seconds", time.perf_counter() - started, endpoint=path)
+
+    def meal_plan(self, body: Dict[str, Any]) -> int:
+        profile = body.get("profile")
+        if not isinstance(profile, dict):
+            raise BadRequest("'profile' must be an object")
+        parallel_days = bool(body.get("parallel_days", False))
+        assistant = self._assistant()
+        if body.get("stream"):
+            stream = assistant.stream_meal_plan(profile, parallel_days=parallel_days)
+            self._stream_ndjson(self._text_events(stream, progress=True))
+            return 200
+        result = assistant.generate_meal_plan(profile, parallel_days=parallel_days)
+        if "error" in result:
+            self._send_json(502, result)
+            return 502
+        self._send_json(200, result)
+        return 200
+
+    def household(self, body: Dict[str, Any]) -> int:
+        members = body.get("members")
+        if not isinstance(members, list) or not members or not all(isinstance(m, dict) for m in members):
+            raise BadRequest("'members' must be a non-empty list of profile objects")
+        if len(members) > HOUSEHOLD_MAX_MEMBERS:
+            raise BadRequest(f"a household has at most {HOUSEHOLD_MAX_MEMBERS} members")
+        result = self._assistant().generate_household_plan(body)
+        if "error" in result:
+            self._send_json(502, result)
+            return 502
+        self._send_json(200, result)
+        return 200
+
+    def _history(self, body: Dict[str, Any]) -> ChatHistory:
+        """Stored conversation named by 'conversation', else one built from the 'history' messages"""
+        conversation = body.get("conversation")
+        if conversation is not None:
+            if self.server.store is None:
+                raise BadRequest("conversations are not stored on this server; send 'history' instead")
+            if not self.server.token:
+                # The id would be the only credential for someone's health chat
+                raise BadRequest("stored conversations need SERVICE_TOKEN on this server; send 'history' instead")
+            if not isinstance(conversation, str) or not conversation:
+                raise BadRequest("'conversation' must be a non-empty string")
+            return ChatHistory.load(self.server.store, conversation)
+        messages = body.get("history") or []
+        if not isinstance(messages, list) or not all(
+                isinstance(m, dict) and m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)
+                for m in messages):
+            raise BadRequest("'history' must be a list of {role: user|assistant, content} objects")
+        return ChatHistory.from_messages([{"role": m["role"], "content": m["content"]} for m in messages])
+
+    @staticmethod
+    def _reply(history: ChatHistory, turns_before: int) -> Optional[Dict[str, Any]]:
+        """The assistant turn this request added to ``history``, or None when it failed"""
+        if len(history) <= turns_before + 1:
+            return None
+        turn = history.turns[-1]
+        return {"reply": turn["content"], "model": turn.get("model"), "tier": turn.get("tier"),
+                "cached": bool(turn.get("cached"))}
+
+    def chat(self, body: Dict[str, Any]) -> int:
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise BadRequest("'message' must be a non-empty string")
+        history = self._history(body)
+        turns_before = len(history)
+        assistant = self._assistant()
+        if body.get("stream"):
+            stream = assistant.stream_diet_chatbot(message, history)
+
+            def events() -> Iterator[Dict[str, Any]]:
+                for event in self._text_events(stream):
+                    if event["type"] == "result":
+                        event = {"type": "result", **(self._reply(history, turns_before) or {"reply": stream.result})}
+                    yield event
+            self._stream_ndjson(events())
+            return 200
+        answer = assistant.diet_chatbot(message, history)
+        reply = self._reply(history, turns_before)
+        if reply is None:
+            self._send_json(502, {"error": answer})
+            return 502
+        self._send_json(200, reply)
+        return 200
+
+    def advice(self, body: Dict[str, Any]) -> int:
+        module = body.get("module")
+        profile = body.get("profile")
+        if module not in ADVICE_MODULES:
+            raise BadRequest(f"'module' must be one of {list(ADVICE_MODULES)}")
+        if not isinstance(profile, dict):
+            raise BadRequest("'profile' must be an object")
+        assistant = self._assistant()
+        if body.get("stream"):
+            self._stream_ndjson(self._text_events(assistant.stream_specialized_advice(module, profile)))
+            return 200
+        advice = assistant.get_specialized_advice(module, profile)
+        if advice.startswith(ADVICE_ERROR_PREFIX):
+            self._send_json(502, {"error": advice})
+            return 502
+        self._send_json(200, {"advice": advice})
+        return 200
+
+
+ENDPOINTS: Dict[str, Callable[[ServiceHandler, Dict[str, Any]], int]] = {
+    "/v1/meal-plan": ServiceHandler.meal_plan,
+    "/v1/household": ServiceHandler.household,
+    "/v1/chat": ServiceHandler.chat,
+    "/v1/advice": ServiceHandler.advice,
+}
+
+
+def serve(host: str = SERVICE_HOST, port: int = SERVICE_PORT, assistant: HealthAssistant = None,
+          store: SessionStore = None, workers: int = SERVICE_WORKERS,
+          queue_limit: int = SERVICE_QUEUE_LIMIT, token: str = SERVICE_TOKEN) -> AssistantService:
+    """Start the service in a daemon thread; returns the server (use server.server_address for the port)"""
+    if assistant is None:
+        assistant, store = build_assistant()
+    server = AssistantService((host, port), assistant, store, workers=workers, queue_limit=queue_limit,
+                              token=token)
+    threading.Thread(target=server.serve_forever, name="assistant-service", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve meal plans, chat and health advice over HTTP/JSON")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="requests handled at the same time")
+    parser.add_argument("--queue-limit", type=int, default=SERVICE_QUEUE_LIMIT,
+                        help="requests that may wait for a worker before new ones get 503")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = serve(args.host, args.port, workers=args.workers, queue_limit=args.queue_limit)
+    server.assistant.warm_up()
+    logger.info("serving on http://%s:%d", *server.server_address[:2])
+    stopped = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopped.set())
+    stopped.wait()
+    logger.info("draining")
+    server.drain()
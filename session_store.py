@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+logger = logging.getLogger("diet_planner")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS conversations (
+        session_key TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        summarized INTEGER NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        session_key TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        meta TEXT,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (session_key, seq)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS plans (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_key TEXT NOT NULL,
+        profile TEXT NOT NULL,
+        result TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS plans_session ON plans (session_key, id);
+    CREATE INDEX IF NOT EXISTS messages_created ON messages (created_at);
+"""
+
+# Fixed statement texts, so sqlite3's statement cache prepares each one once per connection
+INSERT_MESSAGE = ("INSERT OR REPLACE INTO messages (session_key, seq, role, content, meta, created_at) "
+                  "VALUES (?, ?, ?, ?, ?, ?)")
+UPSERT_CONVERSATION = ("INSERT INTO conversations (session_key, summary, summarized, updated_at) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (session_key) DO UPDATE SET summary = excluded.summary, "
+                       "summarized = excluded.summarized, updated_at = excluded.updated_at")
+TOUCH_CONVERSATION = ("INSERT INTO conversations (session_key, summary, summarized, updated_at) VALUES (?, '', 0, ?) "
+                      "ON CONFLICT (session_key) DO UPDATE SET updated_at = excluded.updated_at")
+INSERT_PLAN = "INSERT INTO plans (session_key, profile, result, created_at) VALUES (?, ?, ?, ?)"
+
+
+class SessionStore:
+    """Durable chat histories and generated plans in one SQLite database in WAL mode
+
+    Writes are queued and committed by a single writer thread, many rows per
+    transaction, so a chat turn never waits on the disk. Reads use one
+    connection per thread; WAL lets them run while the writer commits, and
+    lets several worker processes on the host share the database file.
+    Sessions untouched for ``retention`` seconds are deleted on open. A read
+    waits only for the queued writes of its own session.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, flush_interval: float = 0.05,
+                 retention: float = 30 * 86400, plans_per_session: int = 20):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.plans_per_session = plans_per_session
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._queue: "queue.Queue[Optional[Tuple[str, str, tuple]]]" = queue.Queue()
+        # Queued, not yet committed writes per session key
+        self._pending: Dict[str, int] = {}
+        self._committed = threading.Condition()
+
+        db = self._connect()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        self._expire(db, time.time() - retention)
+        self._writer = threading.Thread(target=self._write_loop, name="session-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=64)
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=30000")
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    @staticmethod
+    def _expire(db: sqlite3.Connection, cutoff: float) -> None:
+        with db:
+            stale = "SELECT session_key FROM conversations WHERE updated_at < ?"
+            db.execute(f"DELETE FROM messages WHERE session_key IN ({stale})", (cutoff,))
+            db.execute(f"DELETE FROM plans WHERE session_key IN ({stale})", (cutoff,))
+            db.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,))
+
+    # Writes: queued, batched by the writer thread
+
+    def _write_loop(self) -> None:
+        db = self._connect()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            # Gather whatever else arrives shortly, so a burst becomes one transaction
+            while len(batch) < self.batch_size and item is not None:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(item)
+            writes = [entry for entry in batch if entry is not None]
+            try:
+                with db:
+                    for sql, rows in self._grouped(writes):
+                        db.executemany(sql, rows)
+            except sqlite3.Error:
+                logger.exception("session store write of %d rows failed", len(writes))
+            with self._committed:
+                for session_key, _, _ in writes:
+                    self._pending[session_key] -= 1
+                    if not self._pending[session_key]:
+                        del self._pending[session_key]
+                self._committed.notify_all()
+            for _ in batch:
+                self._queue.task_done()
+            if batch[-1] is None:
+                db.close()
+                return
+
+    @staticmethod
+    def _grouped(writes: List[Tuple[str, str, tuple]]) -> List[Tuple[str, List[tuple]]]:
+        """Consecutive writes of the same statement, for executemany without reordering"""
+        groups: List[Tuple[str, List[tuple]]] = []
+        for _, sql, params in writes:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+        return groups
+
+    def _put(self, session_key: str, *writes: Tuple[str, tuple]) -> None:
+        with self._committed:
+            self._pending[session_key] = self._pending.get(session_key, 0) + len(writes)
+        for sql, params in writes:
+            self._queue.put((session_key, sql, params))
+
+    def add_message(self, session_key: str, seq: int, role: str, content: str, meta: Dict[str, Any] = None) -> None:
+        now = time.time()
+        self._put(session_key,
+                  (INSERT_MESSAGE, (session_key, seq, role, content, json.dumps(meta) if meta else None, now)),
+                  (TOUCH_CONVERSATION, (session_key, now)))
+
+    def save_summary(self, session_key: str, summary: str, summarized: int) -> None:
+        self._put(session_key, (UPSERT_CONVERSATION, (session_key, summary, summarized, time.time())))
+
+    def save_plan(self, session_key: str, profile: Dict[str, Any], result: Dict[str, Any]) -> None:
+        now = time.time()
+        self._put(session_key,
+                  (INSERT_PLAN, (session_key, json.dumps(profile), json.dumps(result), now)),
+                  (TOUCH_CONVERSATION, (session_key, now)),
+                  ("DELETE FROM plans WHERE session_key = ? AND id NOT IN "
+                   "(SELECT id FROM plans WHERE session_key = ? ORDER BY id DESC LIMIT ?)",
+                   (session_key, session_key, self.plans_per_session)))
+
+    def flush(self, session_key: str = None) -> None:
+        """Block until the queued writes of ``session_key`` (default: of every session) are committed"""
+        if session_key is None:
+            self._queue.join()
+            return
+        with self._committed:
+            self._committed.wait_for(lambda: session_key not in self._pending)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join()
+
+    # Reads: lazy, one connection per thread
+
+    def conversation(self, session_key: str) -> Optional[Dict[str, Any]]:
+        """{"summary", "summarized", "total"} for a stored conversation, or None"""
+        self.flush(session_key)
+        db = self._reader()
+        row = db.execute("SELECT summary, summarized FROM conversations WHERE session_key = ?",
+                         (session_key,)).fetchone()
+        if row is None:
+            return None
+        (last,) = db.execute("SELECT MAX(seq) FROM messages WHERE session_key = ?", (session_key,)).fetchone()
+        return {"summary": row[0], "summarized": row[1], "total": 0 if last is None else last + 1}
+
+    def messages(self, session_key: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """Messages ``start <= seq < end`` of a conversation, oldest first"""
+        self.flush(session_key)
+        rows = self._reader().execute(
+            "SELECT role, content, meta FROM messages WHERE session_key = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_key, start, end)).fetchall()
+        return [{"role": role, "content": content, **(json.loads(meta) if meta else {})}
+                for role, content, meta in rows]
+
+    def latest_plan(self, session_key: str) -> Optional[Dict[str, Any]]:
+        """The most recent plan result saved for a session, or None"""
+        self.flush(session_key)
+        row = self._reader().execute(
+            "SELECT profile, result, created_at FROM plans WHERE session_key = ? ORDER BY id DESC LIMIT 1",
+            (session_key,)).fetchone()
+        if row is None:
+            return None
+        return {"profile": json.loads(row[0]), "result": json.loads(row[1]), "created_at": row[2]}
@@ -0,0 +1,132 @@
+import asyncio
+from typing import Dict, List, Any, Callable, Awaitable, AsyncIterator, Optional, Tuple
+import metrics
+
+
+class _Flight:
+    """One shared upstream task plus everything its waiters need"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.chunks: List[str] = []
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        # Wake everyone waiting on the current event; later waits use a fresh one
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so they share one upstream request
+
+    The first caller for a key starts the work as a separate task. Callers
+    that arrive while it runs wait on the same task and get the same result
+    or exception. A waiter that is cancelled or times out leaves on its own.
+    The shared task is cancelled only when its last waiter has gone. Keys
+    are scoped to the running event loop and to the mode: a do() flight
+    records no chunks, so a stream never joins one, nor the other way round.
+    A key is forgotten as soon as its task finishes, so completed results
+    are never served from here.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[asyncio.AbstractEventLoop, str, str], _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _join(self, name: str, key: str, start: Callable[[_Flight], Awaitable[Any]], mode: str) -> _Flight:
+        slot = (asyncio.get_running_loop(), mode, key)
+        flight = self._flights.get(slot)
+        # A flight with no waiters left is being cancelled; start over rather than join it
+        if flight is None or flight.waiters == 0:
+            flight = self._flights[slot] = _Flight(name)
+            flight.task = asyncio.ensure_future(start(flight))
+
+            def forget(task: asyncio.Task) -> None:
+                if self._flights.get(slot) is flight:
+                    del self._flights[slot]
+                flight.notify()
+                if not task.cancelled():
+                    task.exception()  # retrieved by whoever waits; don't log it as unhandled
+            flight.task.add_done_callback(forget)
+            role = "leader"
+        else:
+            role = "follower"
+        metrics.REGISTRY.inc("singleflight_requests_total", call=name, role=role)
+        flight.waiters += 1
+        return flight
+
+    def _leave(self, flight: _Flight) -> None:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+    async def do(self, name: str, key: str, factory: Callable[[], Awaitable[Any]],
+                 timeout: float = None) -> Any:
+        """Await ``factory()`` or an identical call already in flight
+
+        ``timeout`` bounds this caller's wait only. When it expires, the
+        shared call keeps running for the other waiters.
+        """
+        async def start(flight: _Flight) -> Any:
+            return await factory()
+
+        flight = self._join(name, key, start, "do")
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight.task), timeout)
+        finally:
+            self._leave(flight)
+
+    def stream(self, name: str, key: str, open_stream: Callable[[], AsyncIterator[str]],
+               on_complete: Callable[[str], Awaitable[Any]] = None) -> "Subscription":
+        """Share one streamed response among identical requests
+
+        Followers first get the chunks produced so far, then follow live.
+        ``on_complete`` runs once on the full text, and every subscriber
+        receives its result.
+        """
+        async def start(flight: _Flight) -> Any:
+            async for chunk in open_stream():
+                flight.chunks.append(chunk)
+                flight.notify()
+            text = "".join(flight.chunks)
+            return await on_complete(text) if on_complete else text
+
+        return Subscription(self, name, key, start)
+
+
+class Subscription:
+    """A lazily joined shared stream: ``chunks()`` for the text, ``result()`` once it has ended"""
+
+    def __init__(self, group: SingleFlight, name: str, key: str,
+                 start: Callable[[_Flight], Awaitable[Any]]):
+        self._group = group
+        self._name = name
+        self._key = key
+        self._start = start
+        self._flight: Optional[_Flight] = None
+
+    async def chunks(self) -> AsyncIterator[str]:
+        flight = self._flight = self._group._join(self._name, self._key, self._start, "stream")
+        try:
+            position = 0
+            while True:
+                changed = flight.changed
+                if position < len(flight.chunks):
+                    position += 1
+                    yield flight.chunks[position - 1]
+                    continue
+                if flight.task.done():
+                    flight.task.result()  # re-raise the shared failure, if any
+                    return
+                await changed.wait()
+        finally:
+            self._group._leave(flight)
+
+    async def result(self, text: str = None) -> Any:
+        """The shared on_complete result; only valid after chunks() is exhausted"""
+        return self._flight.task.result()
@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food_matcher import FoodMatcher  # noqa: E402
+
+FOODS = ["salmon", "tofu", "beef", "oats", "sweet_potato", "chickpeas", "lentils"]
+
+
+def matched(text):
+    counts = FoodMatcher.from_names(FOODS).count(text)
+    return {FOODS[row]: int(counts[row]) for row in counts.nonzero()[0]}
+
+
+def test_ambiguous_words_do_not_count_another_food():
+    assert matched("grilled salmon steak") == {"salmon": 1}
+    assert matched("tofu steak with cauliflower steak") == {"tofu": 1}
+    assert matched("rice porridge and yam fries") == {}
+
+
+def test_longer_alias_covers_its_words():
+    assert matched("chana dal with rice") == {"chickpeas": 1}
+    assert matched("oatmeal, then lentil soup") == {"oats": 1, "lentils": 1}
+
+
+def test_store_index_keeps_synonyms():
+    index = {"oat": 0, "lentil": 1}
+    counts = FoodMatcher.from_index(index, 2, 1).count("oatmeal, then dhal")
+    assert counts.tolist() == [1, 1]
+
+
+def test_store_scan_matches_window_scan(tmp_path):
+    from nutrition_store import compile_store, NutritionStore
+    source = tmp_path / "foods.csv"
+    source.write_text("name,protein,carbs,fat,fiber,calories\n"
+                      "oats,13,68,7,10,381\nbeef,26,0,12,0,217\n"
+                      "beef chuck roast lean only raw,21,0,6,0,140\nlentils,9,20,0.4,8,116\n")
+    store = NutritionStore(compile_store(str(source), str(tmp_path / "store")))
+    pruned = FoodMatcher.from_index(store.index, len(store), store.max_words, store.starts, store.prefixes)
+    windows = FoodMatcher.from_index(store.index, len(store), store.max_words)
+    plan = "Oatmeal, then beef chuck roast lean only raw with beef chuck and dal. " * 3
+    assert pruned._prefixes is not None
+    assert pruned.count(plan).tolist() == windows.count(plan).tolist() == [3, 3, 3, 3]
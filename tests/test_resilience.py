@@ -0,0 +1,52 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resilience import Resilience  # noqa: E402
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    async def acquire(self, tokens: float = 1) -> None:
+        self.acquired += tokens
+
+
+def test_every_retry_is_charged_to_the_limiter():
+    limiter = CountingLimiter()
+    calls = []
+
+    async def attempt():
+        calls.append(None)
+        if len(calls) < 3:
+            raise ConnectionError("upstream reset")
+        return "ok"
+
+    policy = Resilience(attempts=3, base_delay=0)
+    assert asyncio.run(policy.call("chat", attempt, limiter=limiter)) == "ok"
+    assert limiter.acquired == len(calls) == 3
+
+
+def test_observed_latency_excludes_slot_waits_and_backoff():
+    observed = []
+    calls = []
+
+    async def attempt():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ConnectionError("upstream reset")
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    async def scenario():
+        slot = asyncio.Semaphore(1)
+        await slot.acquire()
+        asyncio.get_running_loop().call_later(0.2, slot.release)
+        policy = Resilience(attempts=2, base_delay=0.2, max_delay=0.2)
+        return await policy.call("chat", attempt, slot=slot, observe=observed.append)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert len(observed) == 1 and observed[0] < 0.1
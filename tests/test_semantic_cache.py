@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache, negations, topics  # noqa: E402
+
+
+def test_negated_question_is_not_served_the_plain_answer():
+    cache = SemanticCache()
+    cache.put("what should I eat before bed", "A small bowl of greek yogurt.")
+    assert cache.get("what should I not eat before bed") is None
+    assert cache.get("what shouldn't I eat before bed") is None
+    assert cache.get("What should I eat before bed?")["answer"] == "A small bowl of greek yogurt."
+
+
+def test_negations_are_normalized():
+    assert negations("Which foods don't raise blood sugar?") == ("not",)
+    assert negations("snacks without nuts, avoiding dairy") == ("avoid", "without")
+    assert negations("how much protein is in an egg") == ()
+
+
+def test_question_about_another_diet_is_not_served_the_cached_answer():
+    cache = SemanticCache()
+    cache.put("Can you suggest a quick vegan high protein dinner that I can make in under half an hour after work",
+              "Tofu and chickpea stir fry.")
+    assert cache.get("Can you suggest a quick vegetarian high protein dinner that I can make in under half an hour "
+                     "after work") is None
+    assert cache.get("can you suggest a quick vegan high protein dinner that I can make in under half an hour "
+                     "after work?")["answer"] == "Tofu and chickpea stir fry."
+
+
+def test_topics_are_singular():
+    assert topics("Vegan meals with lentils for breakfast") == ("breakfast", "lentil", "vegan")
+    assert topics("how should I sleep better") == ()
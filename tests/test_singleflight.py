@@ -0,0 +1,30 @@
+import os
+import sys
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from singleflight import SingleFlight  # noqa: E402
+
+
+def test_stream_does_not_join_a_non_streaming_flight():
+    async def scenario():
+        group = SingleFlight()
+        started = asyncio.Event()
+
+        async def whole():
+            started.set()
+            await asyncio.sleep(0.05)
+            return "advice"
+
+        async def chunks():
+            yield "adv"
+            yield "ice"
+
+        plain = asyncio.ensure_future(group.do("advice", "key", whole))
+        await started.wait()
+        shared = group.stream("advice", "key", chunks)
+        streamed = [chunk async for chunk in shared.chunks()]
+        return await plain, streamed, await shared.result()
+
+    assert asyncio.run(scenario()) == ("advice", ["adv", "ice"], "advice")